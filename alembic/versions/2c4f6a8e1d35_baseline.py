@@ -0,0 +1,150 @@
+"""Baseline: the schema created by create_all before migrations existed
+
+Revision ID: 2c4f6a8e1d35
+Revises:
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+
+from typing import List, Tuple
+
+import sqlalchemy as sa
+from alembic import op
+from fastapi_users_db_sqlalchemy.generics import GUID as UserGUID
+from flashcards_core.guid import GUID
+
+# revision identifiers, used by Alembic.
+revision = "2c4f6a8e1d35"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+#: The associative tables of flashcards_core: (table, owner column, owner
+#: table, related column, related table)
+ASSOCIATIONS = [
+    ("decktags", "deck_id", "decks", "tag_id", "tags"),
+    ("cardtags", "card_id", "cards", "tag_id", "tags"),
+    ("facttags", "fact_id", "facts", "tag_id", "tags"),
+    ("question_contexts", "card_id", "cards", "fact_id", "facts"),
+    ("answer_contexts", "card_id", "cards", "fact_id", "facts"),
+    ("related_cards", "card_id", "cards", "related_id", "cards"),
+    ("related_facts", "fact_id", "facts", "related_id", "facts"),
+]
+
+
+def baseline_tables() -> List[Tuple[str, List[sa.Column]]]:
+    """
+    :returns: the tables of the baseline and their columns, as they were at
+        the time of the baseline, in dependency order.
+    """
+    tables = [
+        (
+            "decks",
+            [
+                sa.Column("id", GUID(), primary_key=True),
+                sa.Column("name", sa.String()),
+                sa.Column("description", sa.String()),
+                sa.Column("algorithm", sa.String()),
+                sa.Column("parameters", sa.JSON()),
+                sa.Column("state", sa.JSON()),
+            ],
+        ),
+        (
+            "facts",
+            [
+                sa.Column("id", GUID(), primary_key=True),
+                sa.Column("value", sa.String()),
+                sa.Column("format", sa.String()),
+            ],
+        ),
+        (
+            "tags",
+            [
+                sa.Column("id", GUID(), primary_key=True),
+                sa.Column("name", sa.String()),
+            ],
+        ),
+        (
+            "cards",
+            [
+                sa.Column("id", GUID(), primary_key=True),
+                sa.Column("deck_id", GUID(), sa.ForeignKey("decks.id")),
+                sa.Column("question_id", GUID(), sa.ForeignKey("facts.id")),
+                sa.Column("answer_id", GUID(), sa.ForeignKey("facts.id")),
+            ],
+        ),
+        (
+            "reviews",
+            [
+                sa.Column("id", GUID(), primary_key=True),
+                sa.Column("card_id", GUID(), sa.ForeignKey("cards.id")),
+                sa.Column("datetime", sa.DateTime()),
+                sa.Column("result", sa.JSON()),
+                sa.Column("algorithm", sa.String()),
+            ],
+        ),
+    ]
+    for table, owner, owner_table, related, related_table in ASSOCIATIONS:
+        tables.append(
+            (
+                table,
+                [
+                    sa.Column(
+                        owner,
+                        GUID(),
+                        sa.ForeignKey(f"{owner_table}.id"),
+                        primary_key=True,
+                    ),
+                    sa.Column(
+                        related,
+                        GUID(),
+                        sa.ForeignKey(f"{related_table}.id"),
+                        primary_key=True,
+                    ),
+                ],
+            )
+        )
+    tables.append(
+        (
+            "users",
+            [
+                sa.Column("id", UserGUID(), primary_key=True),
+                sa.Column("email", sa.String(length=320), nullable=False),
+                sa.Column("hashed_password", sa.String(length=1024), nullable=False),
+                sa.Column("is_active", sa.Boolean(), nullable=False),
+                sa.Column("is_superuser", sa.Boolean(), nullable=False),
+                sa.Column("is_verified", sa.Boolean(), nullable=False),
+            ],
+        )
+    )
+    tables.append(
+        (
+            "deck_owners",
+            [
+                sa.Column(
+                    "deck_id", GUID(), sa.ForeignKey("decks.id"), primary_key=True
+                ),
+                sa.Column(
+                    "owner_id", GUID(), sa.ForeignKey("users.id"), nullable=False
+                ),
+            ],
+        )
+    )
+    return tables
+
+
+def upgrade():
+    # Existing tables are skipped, so databases created by the server at
+    # startup can be upgraded from here too.
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    for table, columns in baseline_tables():
+        if table in existing:
+            continue
+        op.create_table(table, *columns)
+        if table == "users":
+            op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+
+def downgrade():
+    for table, _ in reversed(baseline_tables()):
+        op.drop_table(table)
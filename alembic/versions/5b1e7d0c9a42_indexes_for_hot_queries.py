@@ -0,0 +1,122 @@
+"""Indexes for the hot queries, unique tag names
+
+Revision ID: 5b1e7d0c9a42
+Revises: 2c4f6a8e1d35
+Create Date: 2026-10-18 10:30:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy import func, select
+from sqlalchemy.engine import Connection
+
+# revision identifiers, used by Alembic.
+revision = "5b1e7d0c9a42"
+down_revision = "2c4f6a8e1d35"
+branch_labels = None
+depends_on = None
+
+#: The indexes of this revision: (name, table, columns, unique)
+INDEXES = [
+    ("ix_deck_owners_owner_id_deck_id", "deck_owners", ["owner_id", "deck_id"], False),
+    ("ix_cards_deck_id_id", "cards", ["deck_id", "id"], False),
+    ("ix_reviews_card_id_datetime", "reviews", ["card_id", "datetime"], False),
+    ("uq_tags_name", "tags", ["name"], True),
+    ("ix_cardtags_card_id_tag_id", "cardtags", ["card_id", "tag_id"], False),
+    ("ix_cardtags_tag_id_card_id", "cardtags", ["tag_id", "card_id"], False),
+    (
+        "ix_question_contexts_card_id_fact_id",
+        "question_contexts",
+        ["card_id", "fact_id"],
+        False,
+    ),
+    (
+        "ix_question_contexts_fact_id_card_id",
+        "question_contexts",
+        ["fact_id", "card_id"],
+        False,
+    ),
+    (
+        "ix_answer_contexts_card_id_fact_id",
+        "answer_contexts",
+        ["card_id", "fact_id"],
+        False,
+    ),
+    (
+        "ix_answer_contexts_fact_id_card_id",
+        "answer_contexts",
+        ["fact_id", "card_id"],
+        False,
+    ),
+    ("ix_facttags_fact_id_tag_id", "facttags", ["fact_id", "tag_id"], False),
+    ("ix_facttags_tag_id_fact_id", "facttags", ["tag_id", "fact_id"], False),
+]
+
+#: The tags of the decks, cards and facts: (table, owner column)
+TAG_ASSOCIATIONS = [
+    ("decktags", "deck_id"),
+    ("cardtags", "card_id"),
+    ("facttags", "fact_id"),
+]
+
+
+def merge_duplicate_tags(connection: Connection) -> None:
+    """
+    Tag names were not unique before this revision: keep one tag per name
+    and move the decks, cards and facts of its duplicates onto it.
+    """
+    tags = sa.table("tags", sa.column("id"), sa.column("name"))
+    names = connection.scalars(
+        select(tags.c.name).group_by(tags.c.name).having(func.count() > 1)
+    ).all()
+    for name in names:
+        kept, *duplicates = connection.scalars(
+            select(tags.c.id).where(tags.c.name == name).order_by(tags.c.id)
+        ).all()
+        for table_name, owner in TAG_ASSOCIATIONS:
+            table = sa.table(table_name, sa.column(owner), sa.column("tag_id"))
+            for duplicate in duplicates:
+                already_tagged = select(table.c[owner]).where(table.c.tag_id == kept)
+                connection.execute(
+                    table.delete().where(
+                        table.c.tag_id == duplicate,
+                        table.c[owner].in_(already_tagged),
+                    )
+                )
+                connection.execute(
+                    table.update()
+                    .where(table.c.tag_id == duplicate)
+                    .values(tag_id=kept)
+                )
+        connection.execute(tags.delete().where(tags.c.id.in_(duplicates)))
+
+
+def existing_indexes(connection: Connection) -> set:
+    """
+    :returns: the names of the indexes of the tables of this revision.
+    """
+    inspector = sa.inspect(connection)
+    return {
+        index["name"]
+        for table in {table for _, table, _, _ in INDEXES}
+        for index in inspector.get_indexes(table)
+    }
+
+
+def upgrade():
+    connection = op.get_bind()
+    merge_duplicate_tags(connection)
+    # Databases created at startup after these indexes were declared already
+    # have them.
+    existing = existing_indexes(connection)
+    for name, table, columns, unique in INDEXES:
+        if name not in existing:
+            op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade():
+    existing = existing_indexes(op.get_bind())
+    for name, table, _, _ in INDEXES:
+        if name in existing:
+            op.drop_index(name, table_name=table)
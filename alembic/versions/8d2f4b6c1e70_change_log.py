@@ -0,0 +1,87 @@
+"""Change log for the sync endpoint
+
+Revision ID: 8d2f4b6c1e70
+Revises: 5b1e7d0c9a42
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from flashcards_core.guid import GUID
+from sqlalchemy import false, func, literal, null, select
+from sqlalchemy.engine import Connection
+
+# revision identifiers, used by Alembic.
+revision = "8d2f4b6c1e70"
+down_revision = "5b1e7d0c9a42"
+branch_labels = None
+depends_on = None
+
+change_log = sa.table(
+    "change_log",
+    sa.column("kind"),
+    sa.column("object_id"),
+    sa.column("deck_id"),
+    sa.column("deleted"),
+)
+decks = sa.table("decks", sa.column("id"))
+cards = sa.table("cards", sa.column("id"), sa.column("deck_id"))
+facts = sa.table("facts", sa.column("id"))
+tags = sa.table("tags", sa.column("id"))
+reviews = sa.table("reviews", sa.column("id"), sa.column("card_id"))
+
+
+def log_existing_objects(connection: Connection) -> None:
+    """
+    Log every existing object as a change, so that a first sync (from token
+    0) returns the objects created before this revision too.
+    """
+    if connection.scalar(select(func.count()).select_from(change_log)):
+        return
+    queries = [
+        ("tag", select(tags.c.id, null())),
+        ("fact", select(facts.c.id, null())),
+        ("deck", select(decks.c.id, decks.c.id)),
+        ("card", select(cards.c.id, cards.c.deck_id)),
+        (
+            "review",
+            select(reviews.c.id, cards.c.deck_id).join(
+                cards, cards.c.id == reviews.c.card_id
+            ),
+        ),
+    ]
+    for kind, stmt in queries:
+        connection.execute(
+            change_log.insert().from_select(
+                ["object_id", "deck_id", "kind", "deleted"],
+                stmt.add_columns(literal(kind), false()),
+            )
+        )
+
+
+def upgrade():
+    connection = op.get_bind()
+    # Databases created at startup after this table was declared already
+    # have it.
+    if not sa.inspect(connection).has_table("change_log"):
+        op.create_table(
+            "change_log",
+            # SQLite only autoincrements INTEGER primary keys
+            sa.Column(
+                "id",
+                sa.BigInteger().with_variant(sa.Integer(), "sqlite"),
+                primary_key=True,
+                autoincrement=True,
+            ),
+            sa.Column("kind", sa.String(length=16), nullable=False),
+            sa.Column("object_id", GUID(), nullable=False),
+            sa.Column("deck_id", GUID(), nullable=True),
+            sa.Column("user_id", GUID(), nullable=True),
+            sa.Column("deleted", sa.Boolean(), nullable=False),
+        )
+    log_existing_objects(connection)
+
+
+def downgrade():
+    op.drop_table("change_log")
@@ -0,0 +1,88 @@
+"""Full-text search index of the facts
+
+Revision ID: e4b7c2a9f013
+Revises: 8d2f4b6c1e70
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "e4b7c2a9f013"
+down_revision = "8d2f4b6c1e70"
+branch_labels = None
+depends_on = None
+
+CREATE_INDEX = {
+    "sqlite": [
+        "CREATE TABLE IF NOT EXISTS fact_search_rows ("
+        " rowid INTEGER PRIMARY KEY, fact_id UNIQUE NOT NULL)",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS fact_search USING fts5(value)",
+        "CREATE TRIGGER IF NOT EXISTS fact_search_insert AFTER INSERT ON facts"
+        " BEGIN"
+        " INSERT INTO fact_search_rows (fact_id) VALUES (new.id);"
+        " INSERT INTO fact_search (rowid, value)"
+        " VALUES (last_insert_rowid(), new.value);"
+        " END",
+        "CREATE TRIGGER IF NOT EXISTS fact_search_update AFTER UPDATE OF value ON facts"
+        " BEGIN"
+        " UPDATE fact_search SET value = new.value WHERE rowid ="
+        " (SELECT rowid FROM fact_search_rows WHERE fact_id = old.id);"
+        " END",
+        "CREATE TRIGGER IF NOT EXISTS fact_search_delete AFTER DELETE ON facts"
+        " BEGIN"
+        " DELETE FROM fact_search WHERE rowid ="
+        " (SELECT rowid FROM fact_search_rows WHERE fact_id = old.id);"
+        " DELETE FROM fact_search_rows WHERE fact_id = old.id;"
+        " END",
+        # Index the existing facts
+        "INSERT OR IGNORE INTO fact_search_rows (fact_id) SELECT id FROM facts",
+        "INSERT INTO fact_search (rowid, value) SELECT fact_search_rows.rowid, value"
+        " FROM fact_search_rows JOIN facts ON facts.id = fact_search_rows.fact_id"
+        " WHERE fact_search_rows.rowid NOT IN (SELECT rowid FROM fact_search)",
+    ],
+    "postgresql": [
+        "CREATE INDEX IF NOT EXISTS ix_facts_value_search ON facts"
+        " USING gin (to_tsvector('simple', value))",
+    ],
+}
+
+DROP_INDEX = {
+    "sqlite": [
+        "DROP TRIGGER IF EXISTS fact_search_insert",
+        "DROP TRIGGER IF EXISTS fact_search_update",
+        "DROP TRIGGER IF EXISTS fact_search_delete",
+        "DROP TABLE IF EXISTS fact_search",
+        "DROP TABLE IF EXISTS fact_search_rows",
+    ],
+    "postgresql": ["DROP INDEX IF EXISTS ix_facts_value_search"],
+}
+
+
+def supports_search(bind) -> bool:
+    if bind.dialect.name == "sqlite":
+        return bool(
+            bind.scalar(
+                sa.text(
+                    "SELECT count(*) FROM pragma_compile_options"
+                    " WHERE compile_options = 'ENABLE_FTS5'"
+                )
+            )
+        )
+    return bind.dialect.name in CREATE_INDEX
+
+
+def upgrade():
+    # Databases whose facts table was created by a newer server already have
+    # the index: the statements leave it as it is.
+    bind = op.get_bind()
+    if supports_search(bind):
+        for statement in CREATE_INDEX[bind.dialect.name]:
+            op.execute(statement)
+
+
+def downgrade():
+    for statement in DROP_INDEX.get(op.get_bind().dialect.name, []):
+        op.execute(statement)
@@ -0,0 +1,533 @@
+"""
+Load benchmark of the API: throughput and p50/p95/p99 latency of the study
+loop, card listing, fact search and bulk writes, against a database seeded
+with synthetic users, decks, tagged and related facts, and review histories.
+
+The app is driven in-process through its ASGI interface and, with
+``--uvicorn``, over HTTP through a uvicorn server, by ``--concurrency``
+concurrent clients. The results are printed and saved as JSON along with
+the commit they were measured on: pass the file of an earlier run as
+``--baseline`` to compare them.
+
+Run with::
+
+    python -m benchmarks.bench_api [--users 10] [--cards 1000] [--reviews 3]
+        [--concurrency 10] [--requests 50] [--uvicorn] [--workers 1]
+        [--scenarios study,list_cards,search_facts,bulk_write]
+        [--output benchmark-results.json] [--baseline previous.json]
+
+Set ``FLASHCARDS_BENCHMARK_DATABASE_URL`` to run against PostgreSQL.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from flashcards_server.app import app
+from flashcards_server.bulk import chunked, insert_associations
+from flashcards_server.database import (
+    Card,
+    Deck,
+    DeckOwner,
+    Fact,
+    Review,
+    Tag,
+    User,
+    get_async_session,
+)
+from flashcards_server.users import jwt_strategy
+
+from benchmarks.bench_startup import free_port
+from benchmarks.common import (
+    benchmark_database,
+    create_user,
+    session_maker,
+    summarize,
+)
+
+#: Number of tags, each fact gets one to three of them
+TAGS = 200
+
+#: Number of words the fact values are made of, two per fact
+WORDS = 1000
+
+#: Size of the card and fact pages, and of the bulk writes
+PAGE_SIZE = 100
+
+#: Cards seeded per transaction
+SEED_CHUNK_SIZE = 5000
+
+#: Facts of each deck kept aside to create cards with in ``bulk_write``
+SAMPLE_FACTS = 1000
+
+#: Cards of each deck whose question and answer are related facts
+RELATED_CARDS = 100
+
+
+class BenchmarkUser:
+    """
+    A seeded user, with their deck and an access token.
+    """
+
+    def __init__(self, user: User, deck_id: uuid.UUID, cards: int, token: str):
+        self.user = user
+        self.deck_id = deck_id
+        self.cards = cards
+        self.fact_ids: List[uuid.UUID] = []
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+
+async def seed_cards(
+    session,
+    rng: random.Random,
+    user: BenchmarkUser,
+    count: int,
+    tags: List[dict],
+    reviews: int,
+) -> None:
+    """
+    Insert ``count`` cards in the deck of the user, each with a new question
+    and answer fact, and about ``reviews`` reviews per card spread over the
+    last year.
+    """
+    facts = [
+        {
+            "id": uuid.uuid4(),
+            "value": f"fact {rng.getrandbits(32):08x} "
+            f"word{rng.randrange(WORDS)} word{rng.randrange(WORDS)}",
+            "format": "text",
+        }
+        for _ in range(2 * count)
+    ]
+    cards = [
+        {
+            "id": uuid.uuid4(),
+            "deck_id": user.deck_id,
+            "question_id": question["id"],
+            "answer_id": answer["id"],
+        }
+        for question, answer in zip(facts[::2], facts[1::2])
+    ]
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    history = [
+        {
+            "id": uuid.uuid4(),
+            "card_id": card["id"],
+            "result": rng.random() < 0.8,
+            "algorithm": "random",
+            "datetime": now - timedelta(minutes=rng.randrange(60 * 24 * 365)),
+        }
+        for card in cards
+        for _ in range(rng.randint(0, 2 * reviews))
+    ]
+
+    await session.execute(insert(Fact), facts)
+    await session.execute(insert(Card), cards)
+    if history:
+        await session.execute(insert(Review), history)
+    await insert_associations(
+        session=session,
+        attribute=Fact.tags,
+        pairs=(
+            (fact["id"], tag["id"])
+            for fact in facts
+            for tag in rng.sample(tags, rng.randint(1, 3))
+        ),
+    )
+    await insert_associations(
+        session=session,
+        attribute=Card.tags,
+        pairs=((card["id"], rng.choice(tags)["id"]) for card in cards),
+    )
+    missing = SAMPLE_FACTS - len(user.fact_ids)
+    user.fact_ids.extend(fact["id"] for fact in facts[:missing])
+
+
+async def relate_facts(session, user: BenchmarkUser) -> None:
+    """
+    Relate the question and the answer of the first ``RELATED_CARDS`` cards
+    of the deck. Relationships have a type, so they go through the model
+    rather than a bulk insert.
+    """
+    cards = await session.scalars(
+        select(Card).where(Card.deck_id == user.deck_id).limit(RELATED_CARDS)
+    )
+    for card in cards.all():
+        fact = await Fact.get_one_async(session=session, object_id=card.question_id)
+        await fact.assign_related_fact_async(
+            session=session, fact_id=card.answer_id, relationship="answer"
+        )
+
+
+async def seed(
+    engine: AsyncEngine, rng: random.Random, users: int, cards: int, reviews: int
+) -> List[BenchmarkUser]:
+    """
+    Create the users, each owning one deck of ``cards`` cards.
+
+    :returns: the users, with their deck and token.
+    """
+    seeded = []
+    async with session_maker(engine)() as session:
+        tags = [{"id": uuid.uuid4(), "name": f"tag-{index}"} for index in range(TAGS)]
+        await session.execute(insert(Tag), tags)
+        for _ in range(users):
+            user = await create_user(session)
+            benchmark_user = BenchmarkUser(
+                user=user,
+                deck_id=uuid.uuid4(),
+                cards=cards,
+                token=await jwt_strategy.write_token(user),
+            )
+            await session.execute(
+                insert(Deck),
+                [
+                    {
+                        "id": benchmark_user.deck_id,
+                        "name": "Benchmark",
+                        "description": "benchmark deck",
+                        "algorithm": "random",
+                        "parameters": {},
+                        "state": {},
+                    }
+                ],
+            )
+            await session.execute(
+                DeckOwner.insert(),
+                [{"owner_id": user.id, "deck_id": benchmark_user.deck_id}],
+            )
+            for chunk in chunked(range(cards), SEED_CHUNK_SIZE):
+                await seed_cards(
+                    session, rng, benchmark_user, len(chunk), tags, reviews
+                )
+                await session.commit()
+            await relate_facts(session, benchmark_user)
+            seeded.append(benchmark_user)
+    return seeded
+
+
+#
+# Scenarios: each call makes one request. ``state`` belongs to the client
+# making the calls and holds its random generator.
+#
+
+Scenario = Callable[[httpx.AsyncClient, BenchmarkUser, dict], Awaitable[httpx.Response]]
+
+
+async def study(client: httpx.AsyncClient, user: BenchmarkUser, state: dict):
+    """
+    One step of the study loop: send the result of the last card and get the
+    next one.
+    """
+    if "card_id" not in state:
+        response = await client.get(
+            f"/study/{user.deck_id}/start", headers=user.headers
+        )
+    else:
+        response = await client.post(
+            f"/study/{user.deck_id}/next",
+            json={"card_id": state["card_id"], "result": state["rng"].random() < 0.8},
+            headers=user.headers,
+        )
+    if response.status_code == 200:
+        state["card_id"] = response.json()["id"]
+    return response
+
+
+async def list_cards(client: httpx.AsyncClient, user: BenchmarkUser, state: dict):
+    """
+    A page of cards at a random position in the deck.
+    """
+    return await client.get(
+        f"/decks/{user.deck_id}/cards",
+        params={"offset": state["rng"].randrange(user.cards), "limit": PAGE_SIZE},
+        headers=user.headers,
+    )
+
+
+async def search_facts(client: httpx.AsyncClient, user: BenchmarkUser, state: dict):
+    """
+    The first page of the full-text search of a random word.
+    """
+    return await client.get(
+        "/facts/search",
+        params={"q": f"word{state['rng'].randrange(WORDS)}", "limit": PAGE_SIZE},
+        headers=user.headers,
+    )
+
+
+async def bulk_write(client: httpx.AsyncClient, user: BenchmarkUser, state: dict):
+    """
+    A page of new cards made of existing facts, created in one request.
+    """
+    rng = state["rng"]
+    cards = [
+        {
+            "question_id": str(rng.choice(user.fact_ids)),
+            "answer_id": str(rng.choice(user.fact_ids)),
+            "question_context_facts": [],
+            "answer_context_facts": [],
+            "tags": [{"name": f"tag-{rng.randrange(TAGS)}"}],
+        }
+        for _ in range(PAGE_SIZE)
+    ]
+    return await client.post(
+        f"/decks/{user.deck_id}/cards:bulk", json=cards, headers=user.headers
+    )
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "study": study,
+    "list_cards": list_cards,
+    "search_facts": search_facts,
+    "bulk_write": bulk_write,
+}
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    users: List[BenchmarkUser],
+    concurrency: int,
+    requests: int,
+    seed: int,
+) -> dict:
+    """
+    Run ``concurrency`` clients making ``requests`` calls each, the users
+    being shared round-robin among the clients.
+
+    :returns: the number of requests and errors, the throughput and the
+        latency percentiles.
+    """
+    latencies: List[float] = []
+    errors = 0
+
+    async def run_client(index: int) -> None:
+        nonlocal errors
+        user = users[index % len(users)]
+        state = {"rng": random.Random(seed + index)}
+        for _ in range(requests):
+            start = time.perf_counter()
+            try:
+                response = await scenario(client, user, state)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+            errors += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(index) for index in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        **summarize(latencies),
+    }
+
+
+async def run_scenarios(
+    client: httpx.AsyncClient, users: List[BenchmarkUser], args: argparse.Namespace
+) -> Dict[str, dict]:
+    results = {}
+    for name in args.scenarios.split(","):
+        results[name] = await run_scenario(
+            client=client,
+            scenario=SCENARIOS[name],
+            users=users,
+            concurrency=args.concurrency,
+            requests=args.requests,
+            seed=args.seed,
+        )
+        print(json.dumps({"scenario": name, **results[name]}), file=sys.stderr)
+    return results
+
+
+async def in_process(
+    engine: AsyncEngine, users: List[BenchmarkUser], args: argparse.Namespace
+) -> Dict[str, dict]:
+    """
+    Drive the app through its ASGI interface, on the benchmark database.
+    """
+    make_session = session_maker(engine)
+
+    async def benchmark_session():
+        async with make_session() as session:
+            yield session
+
+    app.dependency_overrides[get_async_session] = benchmark_session
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark"
+        ) as client:
+            return await run_scenarios(client, users, args)
+    finally:
+        app.dependency_overrides = {}
+
+
+async def over_uvicorn(
+    url: str, users: List[BenchmarkUser], args: argparse.Namespace, timeout: float = 60
+) -> Dict[str, dict]:
+    """
+    Drive the app over HTTP, through a uvicorn server on the benchmark
+    database.
+    """
+    port = free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "flashcards_server.app:app",
+            "--port",
+            str(port),
+            "--workers",
+            str(args.workers),
+            "--log-level",
+            "warning",
+        ],
+        env={
+            **os.environ,
+            "FLASHCARDS_DATABASE_URL": url,
+            "FLASHCARDS_SCHEMA_CHECK_ON_STARTUP": "false",
+        },
+    )
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}",
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=args.concurrency),
+        ) as client:
+            start = time.perf_counter()
+            while True:
+                try:
+                    if (await client.get("/")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    if server.poll() is not None:
+                        raise RuntimeError("The server exited before answering")
+                if time.perf_counter() - start > timeout:
+                    raise TimeoutError(
+                        f"The server did not answer in {timeout} seconds"
+                    )
+                await asyncio.sleep(0.05)
+            return await run_scenarios(client, users, args)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def current_commit() -> Optional[str]:
+    """
+    :returns: the commit being benchmarked, if running from a git checkout.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict) -> None:
+    """
+    Print the change in throughput and p95 latency since the baseline run.
+    """
+    print(f"Compared to {baseline.get('commit')} ({baseline.get('date')}):")
+    for mode, scenarios in results["results"].items():
+        for name, current in scenarios.items():
+            previous = baseline.get("results", {}).get(mode, {}).get(name)
+            if not previous:
+                continue
+            changes = [
+                f"{metric} {previous[metric]} -> {current[metric]} "
+                f"({(current[metric] / previous[metric] - 1) * 100:+.1f}%)"
+                for metric in ("throughput_rps", "p95_ms")
+                if previous[metric]
+            ]
+            print(f"  {mode} {name}: " + ", ".join(changes))
+
+
+async def main(args: argparse.Namespace) -> dict:
+    async with benchmark_database() as engine:
+        start = time.perf_counter()
+        users = await seed(
+            engine,
+            rng=random.Random(args.seed),
+            users=args.users,
+            cards=args.cards,
+            reviews=args.reviews,
+        )
+        seed_seconds = time.perf_counter() - start
+
+        results = {"in_process": await in_process(engine, users, args)}
+        if args.uvicorn:
+            results["uvicorn"] = await over_uvicorn(
+                engine.url.render_as_string(hide_password=False), users, args
+            )
+
+        return {
+            "commit": current_commit(),
+            "date": datetime.now(timezone.utc).isoformat(),
+            "database": engine.url.get_backend_name(),
+            "parameters": {
+                name: getattr(args, name)
+                for name in (
+                    "users",
+                    "cards",
+                    "reviews",
+                    "concurrency",
+                    "requests",
+                    "workers",
+                    "seed",
+                )
+            },
+            "seed_seconds": round(seed_seconds, 1),
+            "results": results,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--cards", type=int, default=1000, help="cards per deck")
+    parser.add_argument("--reviews", type=int, default=3, help="reviews per card")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=50, help="per client")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--uvicorn", action="store_true")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline")
+    args = parser.parse_args()
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = asyncio.run(main(args))
+    print(json.dumps(results, indent=2))
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            compare(results, json.load(baseline))
@@ -0,0 +1,93 @@
+"""
+Benchmark for ``User.get_decks``: query count and latency of one page of
+decks for users owning 10, 100 and 1,000 decks.
+
+The previous implementation (one ``Deck.get_one_async`` per owned deck) is
+measured too, for comparison.
+
+Run with::
+
+    python -m benchmarks.bench_deck_listing
+"""
+
+import asyncio
+import json
+from typing import List
+
+from flashcards_core.database import Deck
+
+from flashcards_server.database import DeckOwner, User
+
+from benchmarks.common import (
+    QueryCounter,
+    benchmark_database,
+    create_user,
+    session_maker,
+    summarize,
+    timed,
+)
+
+SIZES = [10, 100, 1000]
+
+
+async def legacy_get_decks(user: User, session, limit: int) -> List[Deck]:
+    """
+    The N+1 implementation of ``User.get_decks``, kept as a baseline.
+    """
+    select = DeckOwner.select().where(DeckOwner.c.owner_id == user.id).limit(limit)
+    pairs = await session.execute(select)
+    return [
+        await Deck.get_one_async(session=session, object_id=pair.deck_id)
+        for pair in pairs
+    ]
+
+
+async def seed_decks(session, user: User, count: int) -> None:
+    decks = [
+        Deck(
+            name=f"Deck {index}",
+            description="benchmark deck",
+            algorithm="random",
+            parameters={},
+            state={},
+        )
+        for index in range(count)
+    ]
+    session.add_all(decks)
+    await session.flush()
+    await session.execute(
+        DeckOwner.insert(), [{"owner_id": user.id, "deck_id": d.id} for d in decks]
+    )
+    await session.commit()
+
+
+async def run_size(count: int) -> dict:
+    async with benchmark_database() as engine:
+        counter = QueryCounter(engine)
+        async with session_maker(engine)() as session:
+            user = await create_user(session)
+            await seed_decks(session, user, count)
+
+        results = {"decks": count}
+        for name, listing in [
+            ("get_decks", lambda s: user.get_decks(session=s, limit=count)),
+            ("legacy", lambda s: legacy_get_decks(user, s, limit=count)),
+        ]:
+            async with session_maker(engine)() as session:
+                counter.reset()
+                decks = await listing(session)
+                assert len(decks) == count
+                queries = counter.count
+            async with session_maker(engine)() as session:
+                durations = await timed(lambda: listing(session), repeat=10)
+            results[name] = {"queries": queries, **summarize(durations)}
+        return results
+
+
+async def main() -> None:
+    for count in SIZES:
+        print(json.dumps(await run_size(count)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+"""
+Benchmark for the streaming importer: throughput and peak memory of
+importing generated facts and cards.
+
+Run with::
+
+    python -m benchmarks.bench_import [--facts 1000000] [--chunk-size 5000]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from typing import AsyncIterator
+
+from flashcards_server.database import DeckOwner
+from flashcards_server.importer import import_lines
+
+from benchmarks.bench_deck_listing import seed_decks
+from benchmarks.common import benchmark_database, create_user, session_maker
+
+
+async def generated_lines(facts: int) -> AsyncIterator[str]:
+    """
+    Half of the lines are facts, the other half cards with two new facts each.
+    """
+    for index in range(facts // 2):
+        yield json.dumps({"value": f"fact {index}", "tags": [f"tag {index % 100}"]})
+    for index in range(facts // 4):
+        yield json.dumps(
+            {
+                "question": {"value": f"question {index}"},
+                "answer": {"value": f"answer {index}"},
+                "tags": [f"tag {index % 100}"],
+            }
+        )
+
+
+async def main(facts: int, chunk_size: int) -> None:
+    async with benchmark_database() as engine:
+        async with session_maker(engine)() as session:
+            user = await create_user(session)
+            await seed_decks(session, user, 1)
+            deck_id = (await session.execute(DeckOwner.select())).first().deck_id
+
+        async with session_maker(engine)() as session:
+            tracemalloc.start()
+            start = time.perf_counter()
+            report = await import_lines(
+                session=session,
+                lines=generated_lines(facts),
+                deck_id=deck_id,
+                chunk_size=chunk_size,
+            )
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+    print(
+        json.dumps(
+            {
+                "lines": report.lines,
+                "facts": report.facts,
+                "cards": report.cards,
+                "seconds": round(elapsed, 2),
+                "lines_per_second": round(report.lines / elapsed),
+                "peak_memory_mb": round(peak / 1024 / 1024, 1),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--facts", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args.facts, args.chunk_size))
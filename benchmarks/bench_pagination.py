@@ -0,0 +1,76 @@
+"""
+Benchmark for cursor pagination: latency of one page of tags at increasing
+depths of a large table, with ``offset`` and with ``cursor``.
+
+``offset`` pages get slower the deeper they are, cursor pages should take
+the same time at any depth.
+
+Run with::
+
+    python -m benchmarks.bench_pagination [--rows 1000000] [--page-size 100]
+"""
+
+import argparse
+import asyncio
+import json
+import uuid
+
+from sqlalchemy import insert, select
+
+from flashcards_server.bulk import chunked
+from flashcards_server.database import Tag
+from flashcards_server.pagination import encode_cursor, keyset_page
+
+from benchmarks.common import benchmark_database, session_maker, summarize, timed
+
+DEPTHS = [0, 0.1, 0.5, 0.99]
+
+
+async def seed_tags(session, rows: int) -> None:
+    for chunk in chunked(range(rows), 50000):
+        await session.execute(
+            insert(Tag), [{"id": uuid.uuid4(), "name": f"tag-{i}"} for i in chunk]
+        )
+    await session.commit()
+
+
+async def fetch_page(session, stmt) -> list:
+    return (await session.scalars(stmt)).all()
+
+
+async def main(rows: int, page_size: int) -> None:
+    async with benchmark_database() as engine:
+        async with session_maker(engine)() as session:
+            await seed_tags(session, rows)
+
+        async with session_maker(engine)() as session:
+            for depth in DEPTHS:
+                position = int(depth * rows)
+                cursor = None
+                if position:
+                    last_id = await session.scalar(
+                        select(Tag.id).order_by(Tag.id).offset(position - 1).limit(1)
+                    )
+                    cursor = encode_cursor(last_id)
+
+                results = {"rows": rows, "position": position}
+                for name, stmt in [
+                    (
+                        "offset",
+                        keyset_page(select(Tag), Tag.id, None, position, page_size),
+                    ),
+                    ("cursor", keyset_page(select(Tag), Tag.id, cursor, 0, page_size)),
+                ]:
+                    durations = await timed(
+                        lambda: fetch_page(session, stmt), repeat=10
+                    )
+                    results[name] = summarize(durations)
+                print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.page_size))
@@ -0,0 +1,88 @@
+"""
+Concurrency benchmark for SQLite: write throughput, p99 latency and
+"database is locked" errors of many concurrent read-then-write
+transactions, with and without the SQLite performance mode. Like the
+writing requests of the API, the transactions read from the writer.
+
+Run with::
+
+    python -m benchmarks.bench_sqlite_writes [--workers 50] [--transactions 20]
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import OperationalError
+
+from flashcards_core.database import Base
+
+from flashcards_server import database
+from flashcards_server.database import Tag, create_session_maker, dispose_engines
+
+
+async def transaction(make_session) -> None:
+    async with make_session() as session:
+        session.info["writer"] = True
+        await session.scalar(select(func.count()).select_from(Tag))
+        await session.execute(
+            insert(Tag), [{"id": uuid.uuid4(), "name": uuid.uuid4().hex}]
+        )
+        await session.commit()
+
+
+async def worker(make_session, transactions: int, latencies: list, errors: list):
+    for _ in range(transactions):
+        start = time.perf_counter()
+        try:
+            await transaction(make_session)
+            latencies.append(time.perf_counter() - start)
+        except OperationalError as exc:
+            errors.append(str(exc.orig))
+
+
+async def run(mode: str, workers: int, transactions: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        url = f"sqlite+aiosqlite:///{tmpdir}/benchmark.db"
+        database.SQLITE_PERFORMANCE_MODE = mode == "performance"
+        engine, make_session = create_session_maker(url)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        latencies, errors = [], []
+        start = time.perf_counter()
+        await asyncio.gather(
+            *[
+                worker(make_session, transactions, latencies, errors)
+                for _ in range(workers)
+            ]
+        )
+        elapsed = time.perf_counter() - start
+        await dispose_engines(engine, make_session)
+
+    latencies.sort()
+    p99 = latencies[int(0.99 * (len(latencies) - 1))] if latencies else None
+    return {
+        "mode": mode,
+        "committed": len(latencies),
+        "errors": len(errors),
+        "writes_per_second": round(len(latencies) / elapsed, 1),
+        "p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+    }
+
+
+async def main(workers: int, transactions: int) -> None:
+    for mode in ["default", "performance"]:
+        print(json.dumps(await run(mode, workers, transactions)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument("--transactions", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.workers, args.transactions))
@@ -0,0 +1,100 @@
+"""
+Startup benchmark: time to import the app and time to first request.
+
+Each run starts a fresh uvicorn process on a new database and polls ``/``
+until it answers. The script fails if the median time to first request is
+above the target.
+
+Run with::
+
+    python -m benchmarks.bench_startup [--runs 5] [--target 3.0]
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+#: Target median time to first request, in seconds
+TARGET_SECONDS = 3.0
+
+IMPORT_APP = "import time; t = time.perf_counter(); import flashcards_server.app; "
+IMPORT_APP += "print(time.perf_counter() - t)"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def import_time(env: dict) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_APP], env=env, check=True, capture_output=True
+    )
+    return float(output.stdout)
+
+
+def time_to_first_request(env: dict, timeout: float = 60) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "flashcards_server.app:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        env=env,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/") as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise TimeoutError(f"The server did not answer in {timeout} seconds")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(runs: int, target: float) -> int:
+    results = {"import_s": [], "first_request_s": []}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        env = {
+            **os.environ,
+            "FLASHCARDS_DATABASE_URL": f"sqlite+aiosqlite:///{tmpdir}/startup.db",
+        }
+        for _ in range(runs):
+            results["import_s"].append(import_time(env))
+            results["first_request_s"].append(time_to_first_request(env))
+
+    summary = {
+        name: round(statistics.median(durations), 3)
+        for name, durations in results.items()
+    }
+    summary["target_s"] = target
+    print(json.dumps(summary))
+    return 0 if summary["first_request_s"] <= target else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target", type=float, default=TARGET_SECONDS)
+    args = parser.parse_args()
+    sys.exit(main(args.runs, args.target))
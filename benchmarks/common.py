@@ -0,0 +1,125 @@
+"""
+Helpers shared by the benchmark scripts.
+
+The benchmarks run against a throwaway database (SQLite in a temporary
+directory by default) and never touch the development database.
+"""
+
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from flashcards_core.database import Base
+
+from flashcards_server.changes import LoggedSession
+from flashcards_server.database import User
+
+
+class QueryCounter:
+    """
+    Counts the SQL statements sent to the database by an engine.
+    """
+
+    def __init__(self, engine: AsyncEngine):
+        self.count = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args, **kwargs) -> None:
+        self.count += 1
+
+    def reset(self) -> None:
+        self.count = 0
+
+
+@asynccontextmanager
+async def benchmark_database(url: str = None) -> AsyncIterator[AsyncEngine]:
+    """
+    Create a fresh database with all the tables, and drop it afterwards.
+
+    :param url: the database URL. Defaults to ``FLASHCARDS_BENCHMARK_DATABASE_URL``
+        or to a SQLite file in a temporary directory.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        url = url or os.getenv(
+            "FLASHCARDS_BENCHMARK_DATABASE_URL",
+            f"sqlite+aiosqlite:///{tmpdir}/benchmark.db",
+        )
+        engine = create_async_engine(url)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        try:
+            yield engine
+        finally:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+            await engine.dispose()
+
+
+def session_maker(engine: AsyncEngine) -> Callable[[], AsyncSession]:
+    return sessionmaker(
+        engine,
+        class_=AsyncSession,
+        sync_session_class=LoggedSession,
+        expire_on_commit=False,
+    )
+
+
+async def create_user(session: AsyncSession, email: str = None) -> User:
+    """
+    Create a user to own the benchmark data.
+    """
+    user = User(
+        id=uuid.uuid4(),
+        email=email or f"{uuid.uuid4().hex}@example.com",
+        hashed_password="benchmark",
+        is_active=True,
+        is_verified=True,
+        is_superuser=False,
+    )
+    session.add(user)
+    await session.commit()
+    return user
+
+
+async def timed(coroutine_function: Callable, repeat: int = 20) -> List[float]:
+    """
+    Await ``coroutine_function()`` ``repeat`` times.
+
+    :returns: the duration of each call, in seconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await coroutine_function()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """
+    :param ordered: the values, sorted.
+    :param fraction: the percentile, like 0.95.
+    :returns: the nearest value at that percentile.
+    """
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(durations: List[float]) -> Dict[str, float]:
+    """
+    :returns: the median, 95th and 99th percentiles of the durations, in
+        milliseconds.
+    """
+    ordered = sorted(durations)
+    return {
+        "p50_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+    }
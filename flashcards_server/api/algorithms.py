@@ -1,11 +1,10 @@
 from typing import List
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from flashcards_core.schedulers import get_available_schedulers
 from flashcards_server.schemas import UserRead
 from flashcards_server.users import current_active_user
 
-
 router = APIRouter(
     prefix="/algorithms",
     tags=["algorithms"],
@@ -16,8 +15,9 @@ router = APIRouter(
 
 @router.get("/", response_model=List[str])
 def get_algorithms(
-    offset: int = 0, 
-    limit: int = 100, 
-    current_user: UserRead = Depends(current_active_user)
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: UserRead = Depends(current_active_user),
 ):
-    return get_available_schedulers()
+    end = offset + limit
+    return list(get_available_schedulers())[offset:end]
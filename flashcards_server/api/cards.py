@@ -1,9 +1,11 @@
+import uuid
 from typing import Any, List, Optional
 from uuid import UUID
 from datetime import datetime
-from fastapi import Depends, HTTPException
-from sqlalchemy import select
-from sqlalchemy.orm import Session, selectinload
+from fastapi import Depends, HTTPException, Query, Request, Response
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.sql import Select
 from pydantic import BaseModel, ConfigDict
 
 from flashcards_server.database import (
@@ -15,6 +17,29 @@ from flashcards_server.database import (
 from flashcards_server.api.decks import router, valid_deck
 from flashcards_server.api.facts import FactRead
 from flashcards_server.api.tags import TagRead, TagCreate
+from flashcards_server.bulk import (
+    existing_ids,
+    insert_associations,
+    load_objects,
+    resolve_tags,
+)
+from flashcards_server.changes import log_changes
+from flashcards_server.due_queue import due_queues
+from flashcards_server.pagination import keyset_page, next_page
+from flashcards_server.response_cache import (
+    FACTS,
+    TAGS,
+    bump,
+    cached_response,
+    deck_version,
+)
+from flashcards_server.tag_filters import (
+    TagFilter,
+    filter_by_tags,
+    get_card_tag_bitmaps,
+    tag_bitmaps,
+    tag_filter,
+)
 from flashcards_server.users import current_active_user
 from flashcards_server.schemas import UserRead
 
@@ -58,6 +83,16 @@ class CardRead(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class CardBulkError(BaseModel):
+    index: int
+    detail: str
+
+
+class CardBulkResult(BaseModel):
+    created: List[UUID]
+    errors: List[CardBulkError]
+
+
 class Review(BaseModel):
     id: UUID
     card_id: UUID
@@ -68,6 +103,55 @@ class Review(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+def with_details(stmt: Select) -> Select:
+    """
+    Eager-load everything ``CardRead`` shows of the cards selected by
+    ``stmt``: their question and answer (joined), and their context facts,
+    tags and related cards, plus the tags and related facts (with their own
+    tags) of every fact.
+
+    The collections are loaded with one ``SELECT ... IN`` per relationship
+    for the whole result, so the number of queries does not depend on how
+    many cards are returned.
+
+    :param stmt: a ``select(CardModel)`` statement.
+    :returns: the statement with the loader options applied.
+    """
+    options = [selectinload(CardModel.tags), selectinload(CardModel.related_cards)]
+    for facts in [CardModel.question, CardModel.answer]:
+        options.append(joinedload(facts).selectinload(FactModel.tags))
+        options.append(
+            joinedload(facts)
+            .selectinload(FactModel.related_facts)
+            .selectinload(FactModel.tags)
+        )
+    for facts in [CardModel.question_context_facts, CardModel.answer_context_facts]:
+        options.append(selectinload(facts).selectinload(FactModel.tags))
+        options.append(
+            selectinload(facts)
+            .selectinload(FactModel.related_facts)
+            .selectinload(FactModel.tags)
+        )
+    return stmt.options(*options).execution_options(populate_existing=True)
+
+
+async def load_cards(session: Session, card_ids: List[UUID]) -> List[CardModel]:
+    """
+    Load a batch of cards with all their details (see ``with_details``).
+
+    :param card_ids: the IDs of the cards to load.
+    :returns: the cards found, in the same order as ``card_ids``. Missing
+        cards are skipped.
+    """
+    cards = {
+        card.id: card
+        for card in await load_objects(
+            session=session, stmt=with_details(select(CardModel)), ids=card_ids
+        )
+    }
+    return [cards[card_id] for card_id in card_ids if card_id in cards]
+
+
 async def valid_card(
     session: Session, user: UserRead, deck_id: UUID, card_id: UUID
 ) -> CardModel:
@@ -88,11 +172,28 @@ async def valid_card(
     return card
 
 
+async def card_details(
+    session: Session, user: UserRead, deck_id: UUID, card_id: UUID
+) -> CardModel:
+    """
+    Load a card with its related cards, after checking it like ``valid_card``.
+    """
+    card = await valid_card(
+        session=session, user=user, deck_id=deck_id, card_id=card_id
+    )
+    card.related = await card.related_cards_async(session)
+    return card
+
+
 @router.get("/{deck_id}/cards", response_model=List[CardRead])
 async def get_cards(
     deck_id: UUID,
+    request: Request,
+    response: Response,
     offset: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
+    tags: TagFilter = Depends(tag_filter),
     current_user: UserRead = Depends(current_active_user),
     session: Session = Depends(get_async_session),
 ):
@@ -102,24 +203,50 @@ async def get_cards(
     :param deck_id: the id of the deck this card belongs to
     :param offset: for pagination, index at which to start returning cards.
     :param limit: for pagination, maximum number of cards to return.
-    :returns: List of cards.
+    :param cursor: for cursor pagination, the ``X-Next-Cursor`` header of
+        the previous page.
+    :param tags: only return the cards with all the tags of ``tags_all``,
+        at least one of ``tags_any`` and none of ``tags_none``.
+    :returns: List of cards, ordered by ID.
     """
     await valid_deck(session=session, user=current_user, deck_id=deck_id)
-    stmt = (
-        select(CardModel)
-        .options(selectinload(CardModel.related_cards))
-        .where(CardModel.deck_id == deck_id)
-        .offset(offset)
-        .limit(limit)
+
+    async def render():
+        stmt = (
+            select(CardModel)
+            .options(selectinload(CardModel.related_cards))
+            .where(CardModel.deck_id == deck_id)
+        )
+        if tags and tag_bitmaps.maxsize:
+            bitmaps = await get_card_tag_bitmaps(session=session, deck_id=deck_id)
+            card_ids = bitmaps.page(tags, cursor=cursor, offset=offset, limit=limit)
+            cards = await load_objects(session=session, stmt=stmt, ids=card_ids)
+            results = sorted(cards, key=lambda card: card.id)
+        else:
+            stmt = filter_by_tags(stmt, CardModel.tags, tags)
+            results = await session.scalars(
+                keyset_page(
+                    stmt, CardModel.id, cursor=cursor, offset=offset, limit=limit
+                )
+            )
+        return next_page(request=request, response=response, items=results, limit=limit)
+
+    return await cached_response(
+        request=request,
+        response=response,
+        user_id=current_user.id,
+        versions=[deck_version(deck_id), FACTS, TAGS],
+        response_model=List[CardRead],
+        render=render,
     )
-    results = await session.scalars(stmt)
-    return results
 
 
 @router.get("/{deck_id}/cards/{card_id}", response_model=CardRead)
 async def get_card(
     deck_id: UUID,
     card_id: UUID,
+    request: Request,
+    response: Response,
     current_user: UserRead = Depends(current_active_user),
     session: Session = Depends(get_async_session),
 ):
@@ -130,11 +257,17 @@ async def get_card(
     :param card_id: the id of the card to get
     :returns: The details of the card.
     """
-    card = await valid_card(
-        session=session, user=current_user, deck_id=deck_id, card_id=card_id
+    await valid_deck(session=session, user=current_user, deck_id=deck_id)
+    return await cached_response(
+        request=request,
+        response=response,
+        user_id=current_user.id,
+        versions=[deck_version(deck_id), FACTS, TAGS],
+        response_model=CardRead,
+        render=lambda: card_details(
+            session=session, user=current_user, deck_id=deck_id, card_id=card_id
+        ),
     )
-    card.related = await card.related_cards_async(session)
-    return card
 
 
 @router.post("/{deck_id}/cards", response_model=CardRead)
@@ -159,6 +292,7 @@ async def create_card(
     question_context = card_data.pop("question_context_facts", [])
     answer_context = card_data.pop("answer_context_facts", [])
     new_card = await CardModel.create_async(session=session, **card_data)
+    due_queues.invalidate(deck_id)
 
     if tags:
         for tag in tags:
@@ -189,9 +323,117 @@ async def create_card(
                 )
             new_card.assign_answer_context(session=session, fact_id=fact)
 
+    await bump(deck_version(deck_id))
     return new_card
 
 
+@router.post("/{deck_id}/cards:bulk", response_model=CardBulkResult)
+async def create_cards_bulk(
+    deck_id: UUID,
+    cards: List[CardCreate],
+    current_user: UserRead = Depends(current_active_user),
+    session: Session = Depends(get_async_session),
+):
+    """
+    Creates many cards at once, in a single transaction.
+
+    All the referenced facts are validated together and all the tags are
+    resolved (or created) together, so the number of queries does not grow
+    with the number of cards. Cards referencing facts that don't exist are
+    skipped and reported in ``errors``.
+
+    :param deck_id: the id of the deck these cards will belong to
+    :param cards: the details of the new cards.
+    :returns: The IDs of the new cards, in order, and the errors by position
+        in the list of cards.
+    """
+    await valid_deck(session=session, user=current_user, deck_id=deck_id)
+
+    def referenced_facts(card: CardCreate) -> List[UUID]:
+        return [
+            card.question_id,
+            card.answer_id,
+            *(card.question_context_facts or []),
+            *(card.answer_context_facts or []),
+        ]
+
+    facts = await existing_ids(
+        session=session,
+        model=FactModel,
+        ids=(fact for card in cards for fact in referenced_facts(card)),
+    )
+
+    errors, valid_cards = [], []
+    for index, card in enumerate(cards):
+        missing = [fact for fact in referenced_facts(card) if fact not in facts]
+        if missing:
+            errors.append(
+                CardBulkError(
+                    index=index, detail=f"Fact with ID '{missing[0]}' not found"
+                )
+            )
+        else:
+            valid_cards.append((uuid.uuid4(), card))
+
+    tags = await resolve_tags(
+        session=session,
+        names=(tag.name for _, card in valid_cards for tag in card.tags or []),
+    )
+    if valid_cards:
+        await session.execute(
+            insert(CardModel),
+            [
+                {
+                    "id": card_id,
+                    "deck_id": deck_id,
+                    "question_id": card.question_id,
+                    "answer_id": card.answer_id,
+                }
+                for card_id, card in valid_cards
+            ],
+        )
+    await insert_associations(
+        session=session,
+        attribute=CardModel.tags,
+        pairs=(
+            (card_id, tags[tag.name])
+            for card_id, card in valid_cards
+            for tag in card.tags or []
+        ),
+    )
+    await insert_associations(
+        session=session,
+        attribute=CardModel.question_context_facts,
+        pairs=(
+            (card_id, fact)
+            for card_id, card in valid_cards
+            for fact in card.question_context_facts or []
+        ),
+    )
+    await insert_associations(
+        session=session,
+        attribute=CardModel.answer_context_facts,
+        pairs=(
+            (card_id, fact)
+            for card_id, card in valid_cards
+            for fact in card.answer_context_facts or []
+        ),
+    )
+    await log_changes(
+        session=session,
+        kind="card",
+        object_ids=[card_id for card_id, _ in valid_cards],
+        deck_id=deck_id,
+    )
+    await session.commit()
+    due_queues.invalidate(deck_id)
+    await bump(deck_version(deck_id))
+
+    return CardBulkResult(
+        created=[card_id for card_id, _ in valid_cards], errors=errors
+    )
+
+
 @router.patch("/{deck_id}/cards/{card_id}", response_model=CardRead)
 async def edit_card(
     deck_id: UUID,
@@ -214,6 +456,7 @@ async def edit_card(
     update_data = new_card_data.model_dump(exclude_none=True)
 
     await CardModel.update_async(session=session, object_id=card_id, **update_data)
+    await bump(deck_version(deck_id))
     return await CardModel.get_one_async(session=session, object_id=card_id)
 
 
@@ -260,6 +503,10 @@ async def assign_tag_to_card(
     if not tag:
         tag = await TagModel.create_async(session=session, name=tag_name)
     card.assign_tag(session=session, tag_id=tag.id)
+    await bump(deck_version(deck_id))
+    return await card_details(
+        session=session, user=current_user, deck_id=deck_id, card_id=card_id
+    )
 
 
 @router.delete("/{deck_id}/cards/{card_id}/tags/{tag_name}", response_model=CardRead)
@@ -285,6 +532,10 @@ async def remove_tag_from_card(
     if not tag:
         raise HTTPException(status_code=404, detail=f"Tag '{tag_name}' doesn't exist.")
     card.remove_tag(session=session, tag_id=tag.id)
+    await bump(deck_version(deck_id))
+    return await card_details(
+        session=session, user=current_user, deck_id=deck_id, card_id=card_id
+    )
 
 
 @router.put(
@@ -314,6 +565,10 @@ async def assign_question_context_to_card(
             status_code=404, detail=f"Fact with ID '{fact_id}' doesn't exist."
         )
     card.assign_question_context(session=session, fact_id=fact.id)
+    await bump(deck_version(deck_id))
+    return await card_details(
+        session=session, user=current_user, deck_id=deck_id, card_id=card_id
+    )
 
 
 @router.delete(
@@ -343,6 +598,10 @@ async def remove_question_context_from_card(
             status_code=404, detail=f"Fact with ID '{fact_id}' doesn't exist."
         )
     card.remove_question_context(session=session, fact_id=fact.id)
+    await bump(deck_version(deck_id))
+    return await card_details(
+        session=session, user=current_user, deck_id=deck_id, card_id=card_id
+    )
 
 
 @router.put(
@@ -372,6 +631,10 @@ async def assign_answer_context_to_card(
             status_code=404, detail=f"Fact with ID '{fact_id}' doesn't exist."
         )
     card.assign_answer_context(session=session, fact_id=fact.id)
+    await bump(deck_version(deck_id))
+    return await card_details(
+        session=session, user=current_user, deck_id=deck_id, card_id=card_id
+    )
 
 
 @router.delete(
@@ -401,6 +664,10 @@ async def remove_answer_context_from_card(
             status_code=404, detail=f"Fact with ID '{fact_id}' doesn't exist."
         )
     card.remove_answer_context(session=session, fact_id=fact.id)
+    await bump(deck_version(deck_id))
+    return await card_details(
+        session=session, user=current_user, deck_id=deck_id, card_id=card_id
+    )
 
 
 @router.put("/{deck_id}/cards/{card_id}/related", response_model=CardRead)
@@ -424,13 +691,13 @@ async def assign_card_to_card(
     card = await valid_card(
         session=session, user=current_user, deck_id=deck_id, card_id=card_id
     )
-    card.assign_related_card_async(
+    await card.assign_related_card_async(
         session=session, card_id=related_card_id, relationship=relationship
     )
-    card = await get_card(
-        deck_id=deck_id, card_id=card_id, current_user=current_user, session=session
+    await bump(deck_version(deck_id))
+    return await card_details(
+        session=session, user=current_user, deck_id=deck_id, card_id=card_id
     )
-    return card
 
 
 @router.delete("/{deck_id}/cards/{card_id}/related", response_model=CardRead)
@@ -454,13 +721,13 @@ async def remove_related_card(
     card = await valid_card(
         session=session, user=current_user, deck_id=deck_id, card_id=card_id
     )
-    card.remove_related_card_async(
+    await card.remove_related_card_async(
         session=session, card_id=related_card_id, relationship=relationship
     )
-    card = await get_card(
-        deck_id=deck_id, card_id=card_id, current_user=current_user, session=session
+    await bump(deck_version(deck_id))
+    return await card_details(
+        session=session, user=current_user, deck_id=deck_id, card_id=card_id
     )
-    return card
 
 
 @router.delete("/{deck_id}/cards/{card_id}")
@@ -481,3 +748,5 @@ async def delete_card(
         session=session, user=current_user, deck_id=deck_id, card_id=card_id
     )
     await CardModel.delete_async(session=session, object_id=card_id)
+    due_queues.invalidate(deck_id)
+    await bump(deck_version(deck_id))
@@ -1,7 +1,7 @@
 from typing import List, Optional
 
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, ConfigDict
 
@@ -10,6 +10,16 @@ from flashcards_server.database import (
     Deck as DeckModel,
     Tag as TagModel,
 )
+from flashcards_server.due_queue import due_queues
+from flashcards_server.pagination import decode_cursor, next_page
+from flashcards_server.response_cache import (
+    TAGS,
+    bump,
+    cached_response,
+    deck_version,
+    decks_version,
+)
+from flashcards_server.schedulers import scheduler_cache
 from flashcards_server.users import current_active_user
 from flashcards_server.schemas import UserRead
 from flashcards_server.api.tags import TagRead, TagCreate
@@ -52,12 +62,17 @@ async def valid_deck(
     """
     Check that the deck actually exists and belongs to the current user.
 
+    The ownership check goes first, because it is usually answered by the
+    ownership cache without querying the database.
+
     :param deck_id: the ID of the deck to test.
     :returns: the deck object, if all checks passes.
     :raises: HTTPException is any check fails.
     """
-    deck = await DeckModel.get_one(session=session, object_id=deck_id)
-    if not deck or not await user.owns_deck(session=session, deck_id=deck_id):
+    deck = None
+    if await user.owns_deck(session=session, deck_id=deck_id):
+        deck = await DeckModel.get_one_async(session=session, object_id=deck_id)
+    if not deck:
         raise HTTPException(
             status_code=404, detail=f"Deck with ID '{deck_id}' not found"
         )
@@ -74,10 +89,39 @@ router = APIRouter(
 
 @router.get("", response_model=List[DeckRead])
 async def get_my_decks(
+    request: Request,
+    response: Response,
+    offset: int = 0,
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
     current_user: UserRead = Depends(current_active_user),
     session: Session = Depends(get_async_session),
 ):
-    return await current_user.get_decks(session=session)
+    """
+    Get all the decks owned by the current user (paginated, if needed).
+
+    :param offset: for pagination, index at which to start returning decks.
+    :param limit: for pagination, maximum number of decks to return.
+    :param cursor: for cursor pagination, the ``X-Next-Cursor`` header of
+        the previous page. Faster than ``offset`` for deep pages.
+    :returns: List of decks, ordered by ID.
+    """
+    after = decode_cursor(cursor) if cursor is not None else None
+
+    async def render():
+        decks = await current_user.get_decks(
+            session=session, offset=offset, limit=limit + 1, after=after
+        )
+        return next_page(request=request, response=response, items=decks, limit=limit)
+
+    return await cached_response(
+        request=request,
+        response=response,
+        user_id=current_user.id,
+        versions=[decks_version(current_user.id), TAGS],
+        response_model=List[DeckRead],
+        render=render,
+    )
 
 
 @router.get("/{deck_id}", response_model=DeckRead)
@@ -119,6 +163,7 @@ async def create_deck(
                 tag_object = await session.run_sync(TagModel.create, name=tag["name"])
             await session.run_sync(new_deck.assign_tag, tag_id=tag_object.id)
 
+    await bump(decks_version(current_user.id))
     return new_deck
 
 
@@ -143,6 +188,7 @@ async def edit_deck(
     new_deck: DeckModel = await DeckModel.update_async(
         session=session, object_id=deck_id, **update_data
     )
+    scheduler_cache.invalidate(deck_id)
 
     if tags:
         for tag in tags:
@@ -151,6 +197,7 @@ async def edit_deck(
                 tag_object = TagModel.create(session=session, name=tag["name"])
             new_deck.assign_tag(session=session, tag_id=tag_object.id)
 
+    await bump(deck_version(deck_id), decks_version(current_user.id))
     return new_deck
 
 
@@ -168,3 +215,6 @@ async def delete_deck(
     """
     await valid_deck(session=session, user=current_user, deck_id=deck_id)
     await current_user.delete_deck(session=session, deck_id=deck_id)
+    scheduler_cache.invalidate(deck_id)
+    due_queues.invalidate(deck_id)
+    await bump(deck_version(deck_id), decks_version(current_user.id))
@@ -0,0 +1,173 @@
+import json
+from typing import Any, AsyncIterator, Mapping
+
+from uuid import UUID
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, union
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from flashcards_server.database import (
+    association,
+    get_async_session,
+    Card as CardModel,
+    Deck as DeckModel,
+    Fact as FactModel,
+    Review as ReviewModel,
+    Tag as TagModel,
+)
+from flashcards_server.api.decks import valid_deck
+from flashcards_server.users import current_active_user
+from flashcards_server.schemas import UserRead
+
+#: How many rows to fetch from the database cursor at a time
+YIELD_PER = 1000
+
+
+router = APIRouter(
+    prefix="/decks",
+    tags=["export"],
+    # dependencies=[Depends(oauth2_scheme)],
+    responses={404: {"description": "Not found"}},
+)
+
+
+def ndjson_line(kind: str, row: Mapping[str, Any]) -> bytes:
+    """
+    Serialize one database row as a line of NDJSON.
+
+    :param kind: the type of the row, usually the name of its table.
+    :param row: the values of the row, by column name.
+    :returns: the encoded line, newline included.
+    """
+    return (json.dumps({"type": kind, "data": dict(row)}, default=str) + "\n").encode()
+
+
+async def stream_rows(
+    session: Session, kind: str, stmt: Select
+) -> AsyncIterator[bytes]:
+    """
+    Run the query on a server-side cursor and serialize the rows as they
+    come, ``YIELD_PER`` at a time.
+
+    :param kind: the type to give to the rows in the output.
+    :param stmt: the query to run.
+    :returns: the NDJSON lines, in chunks.
+    """
+    result = await session.stream(stmt.execution_options(yield_per=YIELD_PER))
+    async for partition in result.partitions():
+        yield b"".join(ndjson_line(kind, row._mapping) for row in partition)
+
+
+async def deck_lines(session: Session, deck_id: UUID) -> AsyncIterator[bytes]:
+    """
+    Export the deck with everything it references: its cards, their facts,
+    the tags of all of them, their relationships and the reviews.
+
+    Every line is an object with a ``type`` (the table name) and the
+    ``data`` of the row. Rows are streamed from the database, so memory use
+    does not depend on the size of the deck.
+
+    :param deck_id: the deck to export.
+    :returns: the NDJSON lines, in chunks.
+    """
+    cards = CardModel.__table__
+    card_ids = select(cards.c.id).where(cards.c.deck_id == deck_id)
+
+    card_tags, card_tags_card, card_tags_tag = association(CardModel.tags)
+    question_contexts, question_card, question_fact = association(
+        CardModel.question_context_facts
+    )
+    answer_contexts, answer_card, answer_fact = association(
+        CardModel.answer_context_facts
+    )
+    related_cards, related_card, _ = association(CardModel.related_cards)
+    deck_tags, deck_tags_deck, deck_tags_tag = association(DeckModel.tags)
+    fact_tags, fact_tags_fact, fact_tags_tag = association(FactModel.tags)
+    related_facts, related_fact, _ = association(FactModel.related_facts)
+
+    fact_ids = union(
+        select(cards.c.question_id).where(cards.c.deck_id == deck_id),
+        select(cards.c.answer_id).where(cards.c.deck_id == deck_id),
+        select(question_contexts.c[question_fact]).where(
+            question_contexts.c[question_card].in_(card_ids)
+        ),
+        select(answer_contexts.c[answer_fact]).where(
+            answer_contexts.c[answer_card].in_(card_ids)
+        ),
+    )
+    tag_ids = union(
+        select(deck_tags.c[deck_tags_tag]).where(
+            deck_tags.c[deck_tags_deck] == deck_id
+        ),
+        select(card_tags.c[card_tags_tag]).where(
+            card_tags.c[card_tags_card].in_(card_ids)
+        ),
+        select(fact_tags.c[fact_tags_tag]).where(
+            fact_tags.c[fact_tags_fact].in_(fact_ids)
+        ),
+    )
+
+    decks = DeckModel.__table__
+    facts = FactModel.__table__
+    tags = TagModel.__table__
+    reviews = ReviewModel.__table__
+    queries = [
+        (decks, select(decks).where(decks.c.id == deck_id)),
+        (tags, select(tags).where(tags.c.id.in_(tag_ids))),
+        (deck_tags, select(deck_tags).where(deck_tags.c[deck_tags_deck] == deck_id)),
+        (facts, select(facts).where(facts.c.id.in_(fact_ids))),
+        (
+            fact_tags,
+            select(fact_tags).where(fact_tags.c[fact_tags_fact].in_(fact_ids)),
+        ),
+        (
+            related_facts,
+            select(related_facts).where(related_facts.c[related_fact].in_(fact_ids)),
+        ),
+        (cards, select(cards).where(cards.c.deck_id == deck_id)),
+        (
+            card_tags,
+            select(card_tags).where(card_tags.c[card_tags_card].in_(card_ids)),
+        ),
+        (
+            question_contexts,
+            select(question_contexts).where(
+                question_contexts.c[question_card].in_(card_ids)
+            ),
+        ),
+        (
+            answer_contexts,
+            select(answer_contexts).where(answer_contexts.c[answer_card].in_(card_ids)),
+        ),
+        (
+            related_cards,
+            select(related_cards).where(related_cards.c[related_card].in_(card_ids)),
+        ),
+        (reviews, select(reviews).where(reviews.c.card_id.in_(card_ids))),
+    ]
+    for table, stmt in queries:
+        async for chunk in stream_rows(session=session, kind=table.name, stmt=stmt):
+            yield chunk
+
+
+@router.get("/{deck_id}/export")
+async def export_deck(
+    deck_id: UUID,
+    current_user: UserRead = Depends(current_active_user),
+    session: Session = Depends(get_async_session),
+):
+    """
+    Export the whole deck as NDJSON: the deck, its cards, their facts, the
+    tags, the relationships and the reviews, one row per line.
+
+    :param deck_id: the id of the deck to export
+    :returns: a stream of NDJSON lines.
+    """
+    await valid_deck(session=session, user=current_user, deck_id=deck_id)
+    return StreamingResponse(
+        deck_lines(session=session, deck_id=deck_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{deck_id}.ndjson"'},
+    )
@@ -1,9 +1,10 @@
-from typing import List, Optional
+from typing import Iterable, List, Optional
 
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.sql import Select
 from pydantic import BaseModel, ConfigDict
 
 from flashcards_server.database import (
@@ -11,6 +12,18 @@ from flashcards_server.database import (
     Fact as FactModel,
     Tag as TagModel,
 )
+from flashcards_server.pagination import keyset_page, next_offset_page, next_page
+from flashcards_server.response_cache import (
+    FACTS,
+    TAGS,
+    bump,
+    cached_response,
+    fact_version,
+    facts_changed,
+    with_related_facts,
+)
+from flashcards_server.search import fact_search
+from flashcards_server.tag_filters import TagFilter, filter_by_tags, tag_filter
 from flashcards_server.users import current_active_user
 from flashcards_server.schemas import UserRead
 from flashcards_server.api.tags import TagRead, TagCreate
@@ -45,6 +58,58 @@ class FactRead(FactBase):
     related_facts: Optional[List[RelatedFact]]
 
 
+def with_related(stmt: Select) -> Select:
+    """
+    Eager-load the tags and the related facts (with their own tags) of the
+    facts selected by ``stmt``.
+
+    The relationships are loaded with one ``SELECT ... IN`` per relationship
+    for the whole result, so the number of queries does not depend on how
+    many facts are returned.
+
+    :param stmt: a ``select(FactModel)`` statement.
+    :returns: the statement with the loader options applied.
+    """
+    return stmt.options(
+        selectinload(FactModel.tags),
+        selectinload(FactModel.related_facts).selectinload(FactModel.tags),
+    ).execution_options(populate_existing=True)
+
+
+async def load_facts(session: Session, fact_ids: Iterable[UUID]) -> List[FactModel]:
+    """
+    Load a batch of facts, with their tags and related facts.
+
+    :param fact_ids: the IDs of the facts to load.
+    :returns: the facts found, in the same order as ``fact_ids``. Missing
+        facts are skipped.
+    """
+    fact_ids = list(fact_ids)
+    if not fact_ids:
+        return []
+    results = await session.scalars(
+        with_related(select(FactModel).where(FactModel.id.in_(fact_ids)))
+    )
+    facts = {fact.id: fact for fact in results}
+    return [facts[fact_id] for fact_id in fact_ids if fact_id in facts]
+
+
+async def valid_fact(session: Session, fact_id: UUID) -> FactModel:
+    """
+    Check that the fact exists, and load it with its tags and related facts.
+
+    :param fact_id: the fact to check
+    :returns: the fact, if it exists.
+    :raises: HTTPException if it doesn't.
+    """
+    db_facts = await load_facts(session=session, fact_ids=[fact_id])
+    if not db_facts:
+        raise HTTPException(
+            status_code=404, detail=f"Fact with ID '{fact_id}' not found"
+        )
+    return db_facts[0]
+
+
 router = APIRouter(
     prefix="/facts",
     tags=["facts"],
@@ -55,29 +120,100 @@ router = APIRouter(
 
 @router.get("/", response_model=List[FactRead])
 async def get_facts(
+    request: Request,
+    response: Response,
     offset: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
+    tags: TagFilter = Depends(tag_filter),
     current_user: UserRead = Depends(current_active_user),  # to protect endpoint
     session: Session = Depends(get_async_session),
 ):
     """
     Get all facts.
 
-    :returns: All the facts, paginated.
+    :param cursor: for cursor pagination, the ``X-Next-Cursor`` header of
+        the previous page.
+    :param tags: only return the facts with all the tags of ``tags_all``,
+        at least one of ``tags_any`` and none of ``tags_none``.
+    :returns: All the facts, paginated and ordered by ID.
+    """
+
+    async def render():
+        stmt = keyset_page(
+            filter_by_tags(with_related(select(FactModel)), FactModel.tags, tags),
+            FactModel.id,
+            cursor=cursor,
+            offset=offset,
+            limit=limit,
+        )
+        results = await session.scalars(stmt)
+        return next_page(request=request, response=response, items=results, limit=limit)
+
+    return await cached_response(
+        request=request,
+        response=response,
+        user_id=current_user.id,
+        versions=[FACTS, TAGS],
+        response_model=List[FactRead],
+        render=render,
+    )
+
+
+@router.get("/search", response_model=List[FactRead])
+async def search_facts(
+    q: str,
+    request: Request,
+    response: Response,
+    offset: int = 0,
+    limit: int = Query(100, ge=1),
+    current_user: UserRead = Depends(current_active_user),  # to protect endpoint
+    session: Session = Depends(get_async_session),
+):
+    """
+    Search the facts whose value contains all the words of ``q``, through
+    the full-text index of the facts.
+
+    :param q: the words to search.
+    :param offset: for pagination, index at which to start returning facts.
+    :param limit: for pagination, maximum number of facts to return.
+    :returns: The matching facts, best matches first. When there are more,
+        the ``Link`` header points to the next page.
     """
-    results: List[FactModel] = await FactModel.get_all_async(
-        session=session, offset=offset, limit=limit
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Search for at least one word")
+    try:
+        stmt = fact_search(dialect=session.get_bind().dialect.name, query=q)
+    except ValueError as exc:
+        raise HTTPException(status_code=501, detail=str(exc))
+
+    async def render():
+        results = await session.scalars(
+            with_related(stmt).offset(offset).limit(limit + 1)
+        )
+        return next_offset_page(
+            request=request,
+            response=response,
+            items=results,
+            offset=offset,
+            limit=limit,
+        )
+
+    return await cached_response(
+        request=request,
+        response=response,
+        user_id=current_user.id,
+        versions=[FACTS, TAGS],
+        response_model=List[FactRead],
+        render=render,
     )
-    db_facts = []
-    for db_fact in results:
-        db_fact.related = await db_fact.related_facts_async(session)
-        db_facts.append(db_fact)
-    return db_facts
 
 
 @router.get("/{fact_id}", response_model=FactRead)
 async def get_fact(
     fact_id: UUID,
+    request: Request,
+    response: Response,
     current_user: UserRead = Depends(current_active_user),  # to protect endpoint
     session: Session = Depends(get_async_session),
 ):
@@ -87,22 +223,24 @@ async def get_fact(
     :param fact_id: the id of the fact to get
     :returns: The details of the fact.
     """
-    db_fact: FactModel = await FactModel.get_one_async(
-        session=session, object_id=fact_id
+    return await cached_response(
+        request=request,
+        response=response,
+        user_id=current_user.id,
+        versions=[fact_version(fact_id), TAGS],
+        response_model=FactRead,
+        render=lambda: valid_fact(session=session, fact_id=fact_id),
     )
-    db_fact.related = await db_fact.related_facts_async(session)
-    if db_fact is None:
-        raise HTTPException(
-            status_code=404, detail=f"Fact with ID '{fact_id}' not found"
-        )
-    return db_fact
 
 
 @router.get("/tag/{tag_name}", response_model=List[FactRead])
 async def get_facts_by_tag(
     tag_name: str,
+    request: Request,
+    response: Response,
     offset: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
     current_user: UserRead = Depends(current_active_user),  # to protect endpoint
     session: Session = Depends(get_async_session),
 ):
@@ -112,20 +250,23 @@ async def get_facts_by_tag(
     :param tag_name: the name of the tag to filter facts on
     :param offset: for pagination, index at which to start returning values.
     :param limit: for pagination, maximum number of elements to return.
-    :returns: The list of facts with this tag.
+    :param cursor: for cursor pagination, the ``X-Next-Cursor`` header of
+        the previous page.
+    :returns: The list of facts with this tag, ordered by ID.
     """
-    stmt = (
-        select(FactModel)
-        .where(FactModel.tags.any(TagModel.name == tag_name))
-        .offset(offset)
-        .limit(limit)
+    stmt = keyset_page(
+        filter_by_tags(
+            with_related(select(FactModel)),
+            FactModel.tags,
+            TagFilter(all_of=[tag_name]),
+        ),
+        FactModel.id,
+        cursor=cursor,
+        offset=offset,
+        limit=limit,
     )
     results = await session.scalars(stmt)
-    db_facts = []
-    for db_fact in results:
-        db_fact.related = await db_fact.related_facts_async(session)
-        db_facts.append(db_fact)
-    return results.all()
+    return next_page(request=request, response=response, items=results, limit=limit)
 
 
 @router.post("/", response_model=FactRead)
@@ -150,6 +291,7 @@ async def create_fact(
         if not tag_object:
             tag_object = await TagModel.create_async(session=session, name=tag["name"])
         await new_fact.assign_tag_async(session=session, tag_id=tag_object.id)
+    await facts_changed(session=session, fact_ids=[new_fact.id])
     return new_fact
 
 
@@ -167,14 +309,15 @@ async def edit_fact(
     :param new_fact_data: the new details of the fact. Can be partial.
     :returns: The modified fact
     """
-    update_data = new_fact_data.dict(exclude_unset=True)
-    original_data = await get_fact(
-        fact_id=fact_id, current_user=current_active_user, session=session
-    )
-    new_model = FactBase(**original_data).copy(update=update_data)
-    new_fact = await FactModel.update(
-        session=session, object_id=fact_id, **new_model.dict()
+    update_data = new_fact_data.model_dump(exclude_unset=True)
+    original_fact = await valid_fact(session=session, fact_id=fact_id)
+    new_model = FactBase.model_validate(original_fact, from_attributes=True)
+    new_fact = await FactModel.update_async(
+        session=session,
+        object_id=fact_id,
+        **new_model.model_copy(update=update_data).model_dump(),
     )
+    await facts_changed(session=session, fact_ids=[fact_id])
     return new_fact
 
 
@@ -198,10 +341,8 @@ async def assign_tag_to_fact(
         tag = await TagModel.create_async(session=session, name=tag_name)
     await fact.assign_tag_async(session=session, tag_id=tag.id)
 
-    fact = await get_fact(
-        fact_id=fact_id, current_user=current_active_user, session=session
-    )
-    return fact
+    await facts_changed(session=session, fact_ids=[fact_id])
+    return await valid_fact(session=session, fact_id=fact_id)
 
 
 @router.delete("/{fact_id}/tags/{tag_name}", response_model=FactRead)
@@ -224,16 +365,14 @@ async def remove_tag_from_fact(
         raise HTTPException(status_code=404, detail=f"Tag '{tag_name}' doesn't exist.")
     await fact.remove_tag_async(session=session, tag_id=tag.id)
 
-    fact = await get_fact(
-        fact_id=fact_id, current_user=current_active_user, session=session
-    )
-    return fact
+    await facts_changed(session=session, fact_ids=[fact_id])
+    return await valid_fact(session=session, fact_id=fact_id)
 
 
 @router.put("/{fact_id}/related/", response_model=FactRead)
 async def assign_related_fact(
     fact_id: UUID,
-    related_fact_id: str,
+    related_fact_id: UUID,
     relationship: str,
     current_user: UserRead = Depends(current_active_user),  # to protect endpoint
     session: Session = Depends(get_async_session),
@@ -250,16 +389,14 @@ async def assign_related_fact(
     await fact.assign_related_fact_async(
         session=session, fact_id=related_fact_id, relationship=relationship
     )
-    fact = await get_fact(
-        fact_id=fact_id, current_user=current_active_user, session=session
-    )
-    return fact
+    await facts_changed(session=session, fact_ids=[fact_id, related_fact_id])
+    return await valid_fact(session=session, fact_id=fact_id)
 
 
 @router.delete("/{fact_id}/related/", response_model=FactRead)
 async def remove_related_fact(
     fact_id: UUID,
-    related_fact_id: str,
+    related_fact_id: UUID,
     relationship: str,
     current_user: UserRead = Depends(current_active_user),  # to protect endpoint
     session: Session = Depends(get_async_session),
@@ -275,19 +412,19 @@ async def remove_related_fact(
     await fact.remove_related_fact_async(
         session=session, fact_id=related_fact_id, relationship=relationship
     )
-    fact = await get_fact(
-        fact_id=fact_id, current_user=current_active_user, session=session
-    )
-    return fact
+    await facts_changed(session=session, fact_ids=[fact_id, related_fact_id])
+    return await valid_fact(session=session, fact_id=fact_id)
 
 
 @router.delete("/{fact_id}")
 async def delete_fact(
-    fact_id: str,
+    fact_id: UUID,
     current_user: UserRead = Depends(current_active_user),  # to protect endpoint
     session: Session = Depends(get_async_session),
 ):
+    fact_ids = await with_related_facts(session=session, fact_ids=[fact_id])
     try:
         await FactModel.delete_async(session=session, object_id=fact_id)
     except ValueError:
         raise HTTPException(status_code=404, detail=f"Fact '{fact_id}' not found")
+    await bump(FACTS, *(fact_version(related_id) for related_id in fact_ids))
@@ -0,0 +1,63 @@
+from typing import Optional
+
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.orm import Session
+
+from flashcards_server.database import get_async_session
+from flashcards_server.api.decks import valid_deck
+from flashcards_server.importer import (
+    DEFAULT_CHUNK_SIZE,
+    ImportReport,
+    import_lines,
+    split_lines,
+)
+from flashcards_server.users import current_active_user
+from flashcards_server.schemas import UserRead
+
+router = APIRouter(
+    prefix="/decks",
+    tags=["import"],
+    # dependencies=[Depends(oauth2_scheme)],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.post("/{deck_id}/import", response_model=ImportReport)
+async def import_into_deck(
+    deck_id: UUID,
+    request: Request,
+    file_format: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    current_user: UserRead = Depends(current_active_user),
+    session: Session = Depends(get_async_session),
+):
+    """
+    Import facts and cards into the deck from the request body, which is
+    read as a stream and written in chunks, one transaction each.
+
+    See ``flashcards_server.importer`` for the accepted formats.
+
+    :param deck_id: the id of the deck to import the cards into
+    :param file_format: ``ndjson`` or ``csv``. Defaults to ``csv`` if the
+        content type of the request is ``text/csv``, ``ndjson`` otherwise.
+    :param chunk_size: how many records to write in each transaction.
+    :returns: how many lines, facts and cards were processed, and the errors.
+    """
+    await valid_deck(session=session, user=current_user, deck_id=deck_id)
+    # Give the connection back before the body is read: it can take long,
+    # and the other writes may be waiting for the writer connection
+    await session.commit()
+    if file_format is None:
+        content_type = request.headers.get("content-type", "")
+        file_format = "csv" if content_type.startswith("text/csv") else "ndjson"
+    try:
+        return await import_lines(
+            session=session,
+            lines=split_lines(request.stream()),
+            deck_id=deck_id,
+            file_format=file_format,
+            chunk_size=max(1, chunk_size),
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
@@ -1,25 +1,63 @@
-from typing import Any
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
 
 from uuid import UUID
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import event, select
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from flashcards_core.schedulers import get_scheduler_for_deck
 
-from flashcards_server.database import get_async_session
+from flashcards_server.bulk import load_objects
+from flashcards_server.database import (
+    deferred_commits,
+    get_async_session,
+    Card as CardModel,
+    Deck as DeckModel,
+    Review as ReviewModel,
+)
 
 # from flashcards_server.auth import oauth2_scheme
 from flashcards_server.api.decks import valid_deck
-from flashcards_server.api.cards import CardRead, valid_card
+from flashcards_server.api.cards import CardRead, load_cards
+from flashcards_server.due_queue import (
+    card_reviewed,
+    get_due_queue,
+    uses_due_queue,
+    utc_naive,
+)
+from flashcards_server.response_cache import bump, decks_version
+from flashcards_server.schedulers import (
+    get_scheduler,
+    scheduler_cache,
+    update_scheduler,
+    using_schedulers,
+)
 from flashcards_server.users import current_active_user
 from flashcards_server.schemas import UserRead
 
+#: Maximum number of test results in a batch
+MAX_BATCH_RESULTS = 1000
+
+#: Maximum number of cards returned by a batch
+MAX_NEXT_CARDS = 100
+
+#: A test result to save: (deck, card, result, when the test was taken)
+Result = Tuple[DeckModel, CardModel, Any, Optional[datetime]]
+
 
 class TestData(BaseModel):
     card_id: UUID
     result: Any
 
 
+class TestResult(TestData):
+    timestamp: Optional[datetime] = None
+
+
+class StudyCard(CardRead):
+    lookahead: Optional[List[CardRead]] = None
+
+
 router = APIRouter(
     prefix="/study",
     tags=["study"],
@@ -28,9 +66,162 @@ router = APIRouter(
 )
 
 
-@router.get("/{deck_id}/start", response_model=CardRead)
-def first_card(
+def _next_card(session: Session, deck: DeckModel) -> CardModel:
+    """
+    Ask the deck scheduler for the next card. Runs in ``session.run_sync()``.
+    """
+    return get_scheduler(session=session, deck=deck).next_card()
+
+
+def _process_result(
+    session: Session, deck: DeckModel, card: CardModel, result: Any
+) -> None:
+    """
+    Feed a test result to the deck scheduler. Runs in ``session.run_sync()``.
+    """
+    scheduler = get_scheduler(session=session, deck=deck)
+    scheduler.process_test_result(card=card, result=result)
+    update_scheduler(deck=deck, scheduler=scheduler)
+
+
+def _process_results(session: Session, results: List[Result]) -> None:
+    """
+    Feed several test results to the deck schedulers, in order, without
+    committing: the caller commits them all at once, or none of them. The
+    reviews of the results with a timestamp are dated with it, whether the
+    scheduler flushed them or only added them to the session. Runs in
+    ``session.run_sync()``.
+    """
+    flushed = []
+
+    def collect_flushed(session: Session, instance: Any) -> None:
+        flushed.append(instance)
+
+    event.listen(session, "pending_to_persistent", collect_flushed)
+    try:
+        with deferred_commits(session):
+            for deck, card, result, timestamp in results:
+                flushed.clear()
+                pending = session.new
+                _process_result(session, deck, card, result)
+                if timestamp is None:
+                    continue
+                # The objects added for this result, flushed or not, but not
+                # the ones of the previous results flushed along with them
+                for instance in [*flushed, *session.new]:
+                    if isinstance(instance, ReviewModel) and instance not in pending:
+                        instance.datetime = utc_naive(timestamp)
+            session.flush()
+    finally:
+        event.remove(session, "pending_to_persistent", collect_flushed)
+
+
+async def save_results(session: Session, user: UserRead, results: List[Result]) -> None:
+    """
+    Feed test results to the deck schedulers, in order, and save them in a
+    single transaction: if one of them fails, none is saved.
+
+    :param user: the owner of the decks.
+    :param results: the results to save, already validated.
+    """
+    deck_ids = {deck.id for deck, *_ in results}
+    async with using_schedulers(deck_ids):
+        try:
+            await session.run_sync(_process_results, results)
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            # The cached schedulers may have processed some of the results
+            for deck_id in deck_ids:
+                scheduler_cache.invalidate(deck_id)
+            raise
+
+    for deck, card, _, timestamp in results:
+        card_reviewed(deck_id=deck.id, card_id=card.id, when=timestamp)
+    if deck_ids:
+        # The cards are unchanged: only the state of the decks is
+        await bump(decks_version(user.id))
+
+
+async def pick_next_card(session: Session, deck: DeckModel) -> CardModel:
+    """
+    Pick the next card to study: from the deck's due queue if the deck
+    algorithm uses one, from the scheduler otherwise.
+
+    :param deck: the deck being studied
+    :returns: the next card to study
+    """
+    if not uses_due_queue(deck):
+        async with using_schedulers([deck.id]):
+            return await session.run_sync(_next_card, deck)
+
+    queue = await get_due_queue(session=session, deck_id=deck.id)
+    card_id = queue.peek()
+    if card_id is None:
+        raise HTTPException(
+            status_code=404, detail=f"Deck with ID '{deck.id}' has no cards"
+        )
+    return await CardModel.get_one_async(session=session, object_id=card_id)
+
+
+async def pick_next_cards(
+    session: Session, deck: DeckModel, count: int
+) -> List[CardModel]:
+    """
+    Pick the next cards to study, like ``pick_next_card``: the first
+    ``count`` cards of the due queue. Schedulers only know the next card
+    until they get its result, so the decks without a due queue get that
+    card only. The cards are loaded with all their details in a fixed number
+    of queries.
+
+    :param deck: the deck being studied
+    :param count: how many cards to pick, if the deck has a due queue
+    :returns: the next cards to study, in order, at least one
+    :raises HTTPException: 404 if the deck has no cards to study
+    """
+    if not uses_due_queue(deck):
+        async with using_schedulers([deck.id]):
+            card_ids = [(await session.run_sync(_next_card, deck)).id]
+    else:
+        queue = await get_due_queue(session=session, deck_id=deck.id)
+        card_ids = queue.smallest(count)
+    cards = await load_cards(session=session, card_ids=card_ids)
+    if not cards:
+        raise HTTPException(
+            status_code=404, detail=f"Deck with ID '{deck.id}' has no cards"
+        )
+    return cards
+
+
+async def study_card(session: Session, deck: DeckModel, lookahead: int) -> CardModel:
+    """
+    Pick the next card to study and, if ``lookahead`` is positive and the
+    deck has a due queue, the cards expected to come after it, in its
+    ``lookahead`` attribute. Schedulers only know the next card until they
+    get its result, so the decks without a due queue get no lookahead.
+
+    The window is computed again on every call, after the last result was
+    processed: clients replace theirs with it, so a result that changes the
+    order of the cards is reflected right away.
+
+    :param deck: the deck being studied
+    :param lookahead: how many cards to predict after the next one, at most
+        ``MAX_NEXT_CARDS``
+    :returns: the next card to study
+    """
+    if lookahead <= 0 or not uses_due_queue(deck):
+        return await pick_next_card(session=session, deck=deck)
+    card, *window = await pick_next_cards(
+        session=session, deck=deck, count=1 + min(lookahead, MAX_NEXT_CARDS)
+    )
+    card.lookahead = window
+    return card
+
+
+@router.get("/{deck_id}/start", response_model=StudyCard)
+async def first_card(
     deck_id: UUID,
+    lookahead: int = 0,
     current_user: UserRead = Depends(current_active_user),
     session: Session = Depends(get_async_session),
 ):
@@ -38,17 +229,19 @@ def first_card(
     Get the first card to study.
 
     :param deck_id: the deck being studied
+    :param lookahead: how many of the following cards to return too, in
+        ``lookahead``, to prefetch them (null if the deck has no due queue)
     :returns: the next card to study
     """
-    deck = valid_deck(session=session, user=current_user, deck_id=deck_id)
-    scheduler = get_scheduler_for_deck(session=session, deck=deck)
-    return scheduler.next_card()
+    deck = await valid_deck(session=session, user=current_user, deck_id=deck_id)
+    return await study_card(session=session, deck=deck, lookahead=lookahead)
 
 
-@router.post("/{deck_id}/next", response_model=CardRead)
-def next_card(
+@router.post("/{deck_id}/next", response_model=StudyCard)
+async def next_card(
     deck_id: UUID,
     test_data: TestData,
+    lookahead: int = 0,
     current_user: UserRead = Depends(current_active_user),
     session: Session = Depends(get_async_session),
 ):
@@ -58,18 +251,88 @@ def next_card(
 
     :param deck_id: the deck being studied
     :param result: the result of the test (algorithm dependent)
+    :param lookahead: how many of the following cards to return too, in
+        ``lookahead``, to prefetch them (null if the deck has no due queue)
     :returns: the next card to study
     """
-    deck = valid_deck(session=session, user=current_user, deck_id=deck_id)
-    scheduler = get_scheduler_for_deck(session=session, deck=deck)
-
+    deck = await valid_deck(session=session, user=current_user, deck_id=deck_id)
     if test_data:
-        card = valid_card(
+        card = await CardModel.get_one_async(
+            session=session, object_id=test_data.card_id
+        )
+        if card is None or card.deck_id != deck_id:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Card with ID '{test_data.card_id}' not found",
+            )
+        async with using_schedulers([deck.id]):
+            await session.run_sync(_process_result, deck, card, test_data.result)
+        card_reviewed(deck_id=deck_id, card_id=card.id)
+        await bump(decks_version(current_user.id))
+
+    return await study_card(session=session, deck=deck, lookahead=lookahead)
+
+
+@router.post("/{deck_id}/next:batch", response_model=List[CardRead])
+async def next_cards(
+    deck_id: UUID,
+    results: List[TestResult],
+    count: int = 1,
+    current_user: UserRead = Depends(current_active_user),
+    session: Session = Depends(get_async_session),
+):
+    """
+    Processes the results of several tests, in the order they were taken,
+    and returns the next cards to study.
+
+    The cards are checked with a single query and the results are saved in
+    a single transaction: if one of them is invalid, none is saved.
+
+    The reviews are dated with the timestamps of the results, but the
+    schedulers process the results as if they were taken now: the timestamps
+    don't change the schedule.
+
+    :param deck_id: the deck being studied
+    :param results: the results of the tests (algorithm dependent), with
+        the time they were taken, if not now
+    :param count: how many cards to return, at most ``MAX_NEXT_CARDS``. Only
+        the decks with a due queue return more than the next card.
+    :returns: the next cards to study, in order
+    """
+    deck = await valid_deck(session=session, user=current_user, deck_id=deck_id)
+    if len(results) > MAX_BATCH_RESULTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Send at most {MAX_BATCH_RESULTS} results at a time",
+        )
+    cards = {
+        card.id: card
+        for card in await load_objects(
             session=session,
-            user=current_user,
-            deck_id=deck_id,
-            card_id=test_data.card_id,
+            stmt=select(CardModel).where(CardModel.deck_id == deck_id),
+            ids=(test_result.card_id for test_result in results),
         )
-        scheduler.process_test_result(card=card, result=test_data.result)
+    }
+    for test_result in results:
+        if test_result.card_id not in cards:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Card with ID '{test_result.card_id}' not found",
+            )
 
-    return scheduler.next_card()
+    await save_results(
+        session=session,
+        user=current_user,
+        results=[
+            (
+                deck,
+                cards[test_result.card_id],
+                test_result.result,
+                test_result.timestamp,
+            )
+            for test_result in results
+        ],
+    )
+    return await pick_next_cards(
+        session=session, deck=deck, count=max(1, min(count, MAX_NEXT_CARDS))
+    )
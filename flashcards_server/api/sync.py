@@ -0,0 +1,206 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session, selectinload
+from pydantic import BaseModel
+
+from flashcards_server.bulk import load_objects
+from flashcards_server.changes import SHARED_KINDS, ChangeLog
+from flashcards_server.database import (
+    DeckOwner,
+    get_async_session,
+    Card as CardModel,
+    Deck as DeckModel,
+    Fact as FactModel,
+    Review as ReviewModel,
+    Tag as TagModel,
+)
+from flashcards_server.api.cards import CardRead, Review
+from flashcards_server.api.decks import DeckRead, valid_deck
+from flashcards_server.api.facts import FactRead, with_related
+from flashcards_server.api.study import save_results
+from flashcards_server.api.tags import TagRead
+from flashcards_server.users import current_active_user
+from flashcards_server.schemas import UserRead
+
+#: Maximum number of reviews in one upload
+MAX_UPLOADED_REVIEWS = 1000
+
+#: For each kind of change: the field of the response and the query
+#: loading the changed objects
+LOADERS = {
+    "tag": ("tags", select(TagModel)),
+    "fact": ("facts", with_related(select(FactModel))),
+    "deck": ("decks", select(DeckModel).options(selectinload(DeckModel.tags))),
+    "card": (
+        "cards",
+        select(CardModel).options(selectinload(CardModel.related_cards)),
+    ),
+    "review": ("reviews", select(ReviewModel)),
+}
+
+
+class Deleted(BaseModel):
+    tags: List[UUID] = []
+    facts: List[UUID] = []
+    decks: List[UUID] = []
+    cards: List[UUID] = []
+    reviews: List[UUID] = []
+
+
+class SyncChanges(BaseModel):
+    token: int
+    more: bool
+    tags: List[TagRead] = []
+    facts: List[FactRead] = []
+    decks: List[DeckRead] = []
+    cards: List[CardRead] = []
+    reviews: List[Review] = []
+    deleted: Deleted = Deleted()
+
+
+class OfflineReview(BaseModel):
+    deck_id: UUID
+    card_id: UUID
+    result: Any
+    timestamp: Optional[datetime] = None
+
+
+class SyncUpload(BaseModel):
+    reviews: List[OfflineReview] = []
+
+
+class SyncUploadResult(BaseModel):
+    reviews: int
+
+
+router = APIRouter(
+    prefix="/sync",
+    tags=["sync"],
+    # dependencies=[Depends(oauth2_scheme)],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.get("", response_model=SyncChanges)
+async def get_changes(
+    since: int = 0,
+    limit: int = 1000,
+    current_user: UserRead = Depends(current_active_user),
+    session: Session = Depends(get_async_session),
+):
+    """
+    Get the tags, facts, decks, cards and reviews that changed since the
+    given token. Only the decks of the current user are included, with their
+    cards and reviews.
+
+    Objects that changed several times are returned once, as they are now.
+    Objects that were deleted are listed by ID in ``deleted``.
+
+    :param since: the ``token`` returned by the previous sync, 0 to get
+        everything.
+    :param limit: maximum number of changes to read. When there are more,
+        ``more`` is true: sync again from the returned token.
+    :returns: the changes, and the token to sync from next time.
+    """
+    owned_decks = select(DeckOwner.c.deck_id).where(
+        DeckOwner.c.owner_id == current_user.id
+    )
+    results = await session.execute(
+        select(
+            ChangeLog.c.id, ChangeLog.c.kind, ChangeLog.c.object_id, ChangeLog.c.deleted
+        )
+        .where(
+            ChangeLog.c.id > since,
+            or_(
+                ChangeLog.c.kind.in_(SHARED_KINDS),
+                ChangeLog.c.deck_id.in_(owned_decks),
+                ChangeLog.c.user_id == current_user.id,
+            ),
+        )
+        .order_by(ChangeLog.c.id)
+        .limit(limit + 1)
+    )
+    rows = results.all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    # The last change of each object wins
+    latest = {(row.kind, row.object_id): row.deleted for row in rows}
+    changed: Dict[str, List[UUID]] = defaultdict(list)
+    deleted: Dict[str, List[UUID]] = defaultdict(list)
+    for (kind, object_id), was_deleted in latest.items():
+        (deleted if was_deleted else changed)[kind].append(object_id)
+
+    changes = {"token": rows[-1].id if rows else since, "more": more, "deleted": {}}
+    for kind, (field, stmt) in LOADERS.items():
+        objects = await load_objects(session=session, stmt=stmt, ids=changed[kind])
+        # Deleted since the change was logged, by a later change or a
+        # statement that bypassed the ORM
+        found = {obj.id for obj in objects}
+        deleted[kind].extend(id_ for id_ in changed[kind] if id_ not in found)
+        changes[field] = objects
+        changes["deleted"][field] = deleted[kind]
+    return changes
+
+
+@router.post("", response_model=SyncUploadResult)
+async def upload_changes(
+    upload: SyncUpload,
+    current_user: UserRead = Depends(current_active_user),
+    session: Session = Depends(get_async_session),
+):
+    """
+    Upload the reviews made offline. They are fed to the deck schedulers in
+    the given order and in a single transaction: if one of them is invalid,
+    none is saved.
+
+    :param upload: the reviews, in the order they were made, with the time
+        they were made.
+    :returns: how many reviews were saved.
+    """
+    reviews = upload.reviews
+    if len(reviews) > MAX_UPLOADED_REVIEWS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Upload at most {MAX_UPLOADED_REVIEWS} reviews at a time",
+        )
+
+    decks = {}
+    for deck_id in dict.fromkeys(review.deck_id for review in reviews):
+        decks[deck_id] = await valid_deck(
+            session=session, user=current_user, deck_id=deck_id
+        )
+    cards = {
+        card.id: card
+        for card in await load_objects(
+            session=session,
+            stmt=select(CardModel),
+            ids=(review.card_id for review in reviews),
+        )
+    }
+    for review in reviews:
+        card = cards.get(review.card_id)
+        if card is None or card.deck_id != review.deck_id:
+            raise HTTPException(
+                status_code=404, detail=f"Card with ID '{review.card_id}' not found"
+            )
+
+    await save_results(
+        session=session,
+        user=current_user,
+        results=[
+            (
+                decks[review.deck_id],
+                cards[review.card_id],
+                review.result,
+                review.timestamp,
+            )
+            for review in reviews
+        ],
+    )
+    return SyncUploadResult(reviews=len(reviews))
@@ -1,14 +1,17 @@
-from typing import List
+from typing import List, Optional
 
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from pydantic import BaseModel, ConfigDict
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from flashcards_server.database import (
     get_async_session,
     Tag as TagModel,
 )
+from flashcards_server.pagination import keyset_page, next_page
+from flashcards_server.response_cache import TAGS, bump
 from flashcards_server.users import current_active_user
 from flashcards_server.schemas import UserRead
 
@@ -37,13 +40,19 @@ router = APIRouter(
 
 @router.get("/", response_model=List[TagRead])
 async def get_tags(
+    request: Request,
+    response: Response,
     offset: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
     current_user: UserRead = Depends(current_active_user),  # to protect endpoint
     session: Session = Depends(get_async_session),
 ):
-    results = await TagModel.get_all_async(session=session, offset=offset, limit=limit)
-    return list(results)
+    stmt = keyset_page(
+        select(TagModel), TagModel.id, cursor=cursor, offset=offset, limit=limit
+    )
+    results = await session.scalars(stmt)
+    return next_page(request=request, response=response, items=results, limit=limit)
 
 
 @router.get("/{tag_id}", response_model=TagRead)
@@ -62,6 +71,7 @@ async def create_tag(
     session: Session = Depends(get_async_session),
 ):
     new_tag = await TagModel.create_async(session=session, **tag.dict())
+    await bump(TAGS)
     return new_tag
 
 
@@ -72,7 +82,11 @@ async def edit_tag(
     current_user: UserRead = Depends(current_active_user),  # to protect endpoint
     session: Session = Depends(get_async_session),
 ):
-    return await TagModel.update_async(session=session, object_id=tag_id, **tag.dict())
+    new_tag = await TagModel.update_async(
+        session=session, object_id=tag_id, **tag.dict()
+    )
+    await bump(TAGS)
+    return new_tag
 
 
 @router.delete("/{tag_id}")
@@ -85,3 +99,4 @@ async def delete_tag(
         await TagModel.delete_async(session=session, object_id=tag_id)
     except ValueError:
         raise HTTPException(status_code=404, detail=f"Tag '{tag_id}' not found")
+    await bump(TAGS)
@@ -1,12 +1,31 @@
+import hmac
 import importlib.metadata
 from contextlib import asynccontextmanager
+from typing import Optional
 
-from fastapi import FastAPI
-from fastapi.routing import APIRoute
+from flashcards_server.constants import (
+    METRICS_ENABLED,
+    METRICS_TOKEN,
+    OPENAPI_SCHEMA_PATH,
+    SCHEMA_CHECK_ON_STARTUP,
+)
+from flashcards_server.startup import startup_profile
+
+with startup_profile.step("import fastapi"):
+    from fastapi import FastAPI, Header, HTTPException
+    from fastapi.responses import PlainTextResponse
+    from fastapi.routing import APIRoute
+
+with startup_profile.step("import flashcards_server.database"):
+    from flashcards_server.database import create_db_and_tables, ownership_cache
+    from flashcards_server.metrics import MetricsMiddleware, metrics
 
-from flashcards_server.database import create_db_and_tables
-from flashcards_server.users import auth_backend, fastapi_users
-from flashcards_server.schemas import UserRead, UserCreate, UserUpdate
+with startup_profile.step("import flashcards_server.openapi"):
+    from flashcards_server.openapi import serve_schema
+
+with startup_profile.step("import flashcards_server.users"):
+    from flashcards_server.users import auth_backend, fastapi_users, jwt_strategy
+    from flashcards_server.schemas import UserRead, UserCreate, UserUpdate
 
 
 __version__ = importlib.metadata.version("flashcards_server")
@@ -14,7 +33,10 @@ __version__ = importlib.metadata.version("flashcards_server")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await create_db_and_tables()
+    if SCHEMA_CHECK_ON_STARTUP:
+        with startup_profile.step("schema check"):
+            await create_db_and_tables()
+    startup_profile.report()
     yield
 
 
@@ -25,37 +47,53 @@ app = FastAPI(
     lifespan=lifespan,
     version=__version__,
 )
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
 
 # Import and include all routers
-from flashcards_server.api.algorithms import (  # noqa: F401, E402
-    router as algorithms_router,
-)
-from flashcards_server.api.cards import router as cards_router  # noqa: F401, E402
-from flashcards_server.api.decks import router as decks_router  # noqa: F401, E402
-from flashcards_server.api.facts import router as facts_router  # noqa: F401, E402
-from flashcards_server.api.tags import router as tags_router  # noqa: F401, E402
-from flashcards_server.api.study import router as study_router  # noqa: F401, E402
-
-app.include_router(algorithms_router)
-app.include_router(cards_router)
-app.include_router(decks_router)
-app.include_router(facts_router)
-app.include_router(tags_router)
-app.include_router(study_router)
-app.include_router(
-    fastapi_users.get_auth_router(auth_backend), prefix="/auth/jwt", tags=["auth"]
-)  # Prefix needed for OpenAPI
-app.include_router(
-    fastapi_users.get_register_router(UserRead, UserCreate), tags=["auth"]
-)
-app.include_router(fastapi_users.get_reset_password_router(), tags=["auth"])
-app.include_router(fastapi_users.get_verify_router(UserRead), tags=["auth"])
-app.include_router(
-    fastapi_users.get_users_router(UserRead, UserUpdate),
-    prefix="/users",
-    tags=["users"],
-)
+with startup_profile.step("import flashcards_server.api.algorithms"):
+    from flashcards_server.api.algorithms import router as algorithms_router
+with startup_profile.step("import flashcards_server.api.cards"):
+    from flashcards_server.api.cards import router as cards_router
+with startup_profile.step("import flashcards_server.api.decks"):
+    from flashcards_server.api.decks import router as decks_router
+with startup_profile.step("import flashcards_server.api.export"):
+    from flashcards_server.api.export import router as export_router
+with startup_profile.step("import flashcards_server.api.imports"):
+    from flashcards_server.api.imports import router as imports_router
+with startup_profile.step("import flashcards_server.api.facts"):
+    from flashcards_server.api.facts import router as facts_router
+with startup_profile.step("import flashcards_server.api.tags"):
+    from flashcards_server.api.tags import router as tags_router
+with startup_profile.step("import flashcards_server.api.study"):
+    from flashcards_server.api.study import router as study_router
+with startup_profile.step("import flashcards_server.api.sync"):
+    from flashcards_server.api.sync import router as sync_router
+
+with startup_profile.step("include routers"):
+    app.include_router(algorithms_router)
+    app.include_router(cards_router)
+    app.include_router(decks_router)
+    app.include_router(export_router)
+    app.include_router(imports_router)
+    app.include_router(facts_router)
+    app.include_router(tags_router)
+    app.include_router(study_router)
+    app.include_router(sync_router)
+    app.include_router(
+        fastapi_users.get_auth_router(auth_backend), prefix="/auth/jwt", tags=["auth"]
+    )  # Prefix needed for OpenAPI
+    app.include_router(
+        fastapi_users.get_register_router(UserRead, UserCreate), tags=["auth"]
+    )
+    app.include_router(fastapi_users.get_reset_password_router(), tags=["auth"])
+    app.include_router(fastapi_users.get_verify_router(UserRead), tags=["auth"])
+    app.include_router(
+        fastapi_users.get_users_router(UserRead, UserUpdate),
+        prefix="/users",
+        tags=["users"],
+    )
 
 
 # Default endpoint
@@ -64,6 +102,38 @@ async def root():
     return {"message": "Hello!"}
 
 
+if METRICS_ENABLED:
+    from flashcards_server.due_queue import due_queues
+    from flashcards_server.schedulers import scheduler_cache
+    from flashcards_server.tag_filters import tag_bitmaps
+
+    @app.get("/metrics", include_in_schema=False)
+    async def get_metrics(authorization: Optional[str] = Header(None)):
+        """
+        The request timings and cache stats of this worker, in the Prometheus
+        text format.
+
+        :param authorization: ``Bearer <token>``, if ``FLASHCARDS_METRICS_TOKEN``
+            is set.
+        """
+        if METRICS_TOKEN and not hmac.compare_digest(
+            (authorization or "").encode(), f"Bearer {METRICS_TOKEN}".encode()
+        ):
+            raise HTTPException(status_code=401, detail="Invalid metrics token")
+        return PlainTextResponse(
+            metrics.render(
+                caches={
+                    "due_queue": due_queues.stats(),
+                    "ownership": ownership_cache.stats(),
+                    "scheduler": scheduler_cache.stats(),
+                    "tag_index": tag_bitmaps.stats(),
+                    "token": jwt_strategy.stats(),
+                }
+            ),
+            media_type="text/plain; version=0.0.4",
+        )
+
+
 def use_route_names_as_operation_ids(app: FastAPI) -> None:
     """
     Simplify operation IDs so that generated API clients have simpler function
@@ -77,3 +147,6 @@ def use_route_names_as_operation_ids(app: FastAPI) -> None:
 
 
 use_route_names_as_operation_ids(app)
+
+with startup_profile.step("load the OpenAPI schema"):
+    serve_schema(app, path=OPENAPI_SCHEMA_PATH)
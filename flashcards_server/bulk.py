@@ -0,0 +1,134 @@
+"""
+Set-based helpers for the endpoints and tools that write many objects at
+once. Each helper issues a fixed number of statements per batch instead of
+one or more statements per object.
+"""
+
+import uuid
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+from uuid import UUID
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import InstrumentedAttribute, Session
+from sqlalchemy.sql import Select
+
+from flashcards_server.changes import log_changes
+from flashcards_server.database import Tag, association
+
+#: Maximum number of bound parameters to put in a single IN clause
+IN_CLAUSE_SIZE = 500
+
+#: The INSERT constructs with an ON CONFLICT clause, by dialect
+UPSERT_INSERT = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    """
+    Split an iterable into lists of at most ``size`` elements.
+    """
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+async def existing_ids(session: Session, model, ids: Iterable[UUID]) -> Set[UUID]:
+    """
+    Find which of the given IDs exist in the table of ``model``.
+
+    :param session: the session (see flashcards_core.database:init_session()).
+    :param model: the model to look the IDs up in, for example ``Fact``.
+    :param ids: the IDs to look for.
+    :returns: the subset of ``ids`` that exist.
+    """
+    found = set()
+    for chunk in chunked(set(ids), IN_CLAUSE_SIZE):
+        results = await session.scalars(select(model.id).where(model.id.in_(chunk)))
+        found.update(results)
+    return found
+
+
+async def load_objects(session: Session, stmt: Select, ids: Iterable[UUID]) -> List:
+    """
+    Load the objects with the given IDs, ``IN_CLAUSE_SIZE`` at a time.
+
+    :param session: the session (see flashcards_core.database:init_session()).
+    :param stmt: the query selecting the objects, like ``select(Card)``.
+    :param ids: the IDs of the objects to load.
+    :returns: the objects found, in no particular order.
+    """
+    model = stmt.column_descriptions[0]["entity"]
+    objects = []
+    for chunk in chunked(set(ids), IN_CLAUSE_SIZE):
+        objects.extend(await session.scalars(stmt.where(model.id.in_(chunk))))
+    return objects
+
+
+async def resolve_tags(session: Session, names: Iterable[str]) -> Dict[str, UUID]:
+    """
+    Find the IDs of the given tags, creating the tags that don't exist yet.
+
+    Does not commit: the new tags are written in the current transaction.
+
+    :param session: the session (see flashcards_core.database:init_session()).
+    :param names: the names of the tags.
+    :returns: a mapping from each tag name to its ID.
+    """
+    names = set(names)
+    rows = [{"id": uuid.uuid4(), "name": name} for name in names]
+    upsert = UPSERT_INSERT.get(session.get_bind().dialect.name)
+    if upsert and rows:
+        # Insert the missing tags first, then read all of them back: a tag
+        # created by a concurrent transaction in between is not inserted twice
+        new_ids = await session.scalars(
+            upsert(Tag)
+            .on_conflict_do_nothing(index_elements=["name"])
+            .returning(Tag.id),
+            rows,
+        )
+        await log_changes(session=session, kind="tag", object_ids=list(new_ids))
+
+    tags = {}
+    for chunk in chunked(names, IN_CLAUSE_SIZE):
+        results = await session.execute(
+            select(Tag.name, Tag.id).where(Tag.name.in_(chunk))
+        )
+        tags.update(dict(results.all()))
+    if upsert:
+        return tags
+
+    new_tags = [row for row in rows if row["name"] not in tags]
+    if new_tags:
+        await session.execute(insert(Tag), new_tags)
+        await log_changes(
+            session=session, kind="tag", object_ids=[tag["id"] for tag in new_tags]
+        )
+        tags.update({tag["name"]: tag["id"] for tag in new_tags})
+    return tags
+
+
+async def insert_associations(
+    session: Session,
+    attribute: InstrumentedAttribute,
+    pairs: Iterable[Tuple[UUID, UUID]],
+) -> None:
+    """
+    Insert the rows of a many-to-many relationship with a single
+    executemany statement.
+
+    Does not commit: the rows are written in the current transaction.
+
+    :param session: the session (see flashcards_core.database:init_session()).
+    :param attribute: the relationship, for example ``Card.tags``.
+    :param pairs: (owner ID, related object ID) pairs. Duplicates are skipped.
+    """
+    table, owner_column, related_column = association(attribute)
+    rows = [
+        {owner_column: owner_id, related_column: related_id}
+        for owner_id, related_id in dict.fromkeys(pairs)
+    ]
+    if rows:
+        await session.execute(table.insert(), rows)
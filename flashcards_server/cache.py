@@ -0,0 +1,116 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+#: Returned by LRUCache.get() when the key is not cached
+MISSING = object()
+
+
+class LRUCache:
+    """
+    A bounded, in-process cache with least-recently-used eviction and an
+    optional time-to-live for its entries.
+
+    It keeps hit and miss counters, so the cache effectiveness can be
+    inspected through ``stats()``. This cache is local to each worker
+    process: values invalidated in one worker are only dropped from the
+    other workers when their TTL expires.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        :param maxsize: maximum number of entries to keep.
+        :param ttl: how many seconds an entry stays valid. None means forever.
+        :param clock: the time source, in seconds.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.peek(key) is not MISSING
+
+    def peek(self, key: Hashable) -> Any:
+        """
+        Like ``get()``, but does not update the counters nor the LRU order.
+        """
+        entry = self._data.get(key)
+        if entry is None or (entry[1] is not None and entry[1] <= self.clock()):
+            return MISSING
+        return entry[0]
+
+    def get(self, key: Hashable) -> Any:
+        """
+        :param key: the key to look up.
+        :returns: the cached value, or ``MISSING`` if the key is not cached or
+            the entry expired.
+        """
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= self.clock():
+            del self._data[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        :param key: the key to store the value under.
+        :param value: the value to cache.
+        :param ttl: overrides the cache TTL for this entry.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires = None if ttl is None else self.clock() + ttl
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Drop the given key from the cache, if present.
+        """
+        self._data.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        """
+        Drop all the keys for which ``predicate(key)`` is true.
+        """
+        for key in [key for key in self._data if predicate(key)]:
+            del self._data[key]
+
+    def clear(self) -> None:
+        """
+        Empty the cache and reset the counters.
+        """
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        :returns: the size of the cache, its hit and miss counters and
+            the hit ratio.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
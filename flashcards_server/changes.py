@@ -0,0 +1,203 @@
+"""
+Change log of the synchronized objects, for the ``/sync`` endpoint.
+
+Every flush of a ``LoggedSession`` (the sessions of the app) notes one row
+per deck, card, fact, tag or review it inserts, updates or deletes. The
+rows are written when the transaction commits. The ID of the row is the
+change token: it only grows, so a client that remembers the last token it
+received can ask for what changed since.
+
+Statements that bypass the ORM (the bulk inserts, for example) must call
+``log_changes()`` themselves.
+
+Tokens must be given in commit order: a client that syncs while a
+transaction holding a lower token is still open would miss it for good.
+SQLite has a single writer, so this holds by itself. On PostgreSQL the
+rows are written under an advisory lock, held until the commit, so that
+one transaction gets its tokens only once the previous one is committed.
+Since the lock is taken last, when all the other changes are written, it
+is held only for the time of the commit.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from uuid import UUID
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    Integer,
+    String,
+    Table,
+    event,
+    insert,
+    select,
+    text,
+)
+from sqlalchemy.orm import Session, SessionTransaction
+
+from flashcards_core.guid import GUID
+from flashcards_core.database import Base, Deck, Card, Tag, Fact, Review
+
+#: The kind of change of each synchronized model
+KINDS = {Deck: "deck", Card: "card", Fact: "fact", Tag: "tag", Review: "review"}
+
+#: Kinds shared by all the users. The others belong to the owner of a deck.
+SHARED_KINDS = {"fact", "tag"}
+
+#: Key of the PostgreSQL advisory lock serializing the writes to the change
+#: log ("flsh")
+CHANGE_LOG_LOCK = 0x666C7368
+
+#: One row per change. ``deck_id`` is the deck of the decks, cards and
+#: reviews, ``user_id`` the owner of the deleted decks (whose ownership is
+#: gone with them).
+ChangeLog = Table(
+    "change_log",
+    Base.metadata,
+    # SQLite only autoincrements INTEGER primary keys
+    Column(
+        "id",
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    ),
+    Column("kind", String(16), nullable=False),
+    Column("object_id", GUID(), nullable=False),
+    Column("deck_id", GUID(), nullable=True),
+    Column("user_id", GUID(), nullable=True),
+    Column("deleted", Boolean, nullable=False, default=False),
+)
+
+
+def change(
+    kind: str,
+    object_id: UUID,
+    deck_id: Optional[UUID] = None,
+    user_id: Optional[UUID] = None,
+    deleted: bool = False,
+) -> Dict:
+    """
+    :returns: the values of a change log row.
+    """
+    return {
+        "kind": kind,
+        "object_id": object_id,
+        "deck_id": deck_id,
+        "user_id": user_id,
+        "deleted": deleted,
+    }
+
+
+class LoggedSession(Session):
+    """
+    Session class of the app: the changes it writes are logged.
+    """
+
+
+def pending_changes(session: Session) -> List[Dict]:
+    """
+    :returns: the change log rows to write when the session commits.
+    """
+    return session.info.setdefault("changes", [])
+
+
+async def log_changes(
+    session: Session,
+    kind: str,
+    object_ids: Iterable[UUID],
+    deck_id: Optional[UUID] = None,
+    user_id: Optional[UUID] = None,
+    deleted: bool = False,
+) -> None:
+    """
+    Log changes made without the ORM. They are written with the current
+    transaction, when it commits.
+
+    :param session: the session (see flashcards_core.database:init_session()).
+    :param kind: the kind of the objects, like ``card``.
+    :param object_ids: the IDs of the objects that changed.
+    :param deck_id: the deck of the objects, for decks, cards and reviews.
+    :param user_id: the owner of the decks, for deleted decks.
+    :param deleted: whether the objects were deleted.
+    """
+    rows = [
+        change(kind, object_id, deck_id=deck_id, user_id=user_id, deleted=deleted)
+        for object_id in object_ids
+    ]
+    pending_changes(session).extend(rows)
+
+
+@event.listens_for(LoggedSession, "after_flush")
+def log_flush(session: Session, flush_context) -> None:
+    """
+    Note the synchronized objects written by the flush, to log them when
+    the transaction commits.
+    """
+    changed = [(obj, False) for obj in session.new]
+    changed += [(obj, False) for obj in session.dirty if session.is_modified(obj)]
+    changed += [(obj, True) for obj in session.deleted]
+
+    rows: List[Dict] = []
+    reviews: List[Tuple[Review, bool]] = []
+    for obj, deleted in changed:
+        kind = KINDS.get(type(obj))
+        if kind is None:
+            continue
+        if kind == "review":
+            reviews.append((obj, deleted))
+        elif kind == "deck":
+            rows.append(change(kind, obj.id, deck_id=obj.id, deleted=deleted))
+        elif kind == "card":
+            rows.append(change(kind, obj.id, deck_id=obj.deck_id, deleted=deleted))
+        else:
+            rows.append(change(kind, obj.id, deleted=deleted))
+
+    if reviews:
+        decks = dict(
+            session.connection()
+            .execute(
+                select(Card.id, Card.deck_id).where(
+                    Card.id.in_({review.card_id for review, _ in reviews})
+                )
+            )
+            .all()
+        )
+        rows.extend(
+            change(
+                "review",
+                review.id,
+                deck_id=decks.get(review.card_id),
+                deleted=deleted,
+            )
+            for review, deleted in reviews
+        )
+    pending_changes(session).extend(rows)
+
+
+@event.listens_for(LoggedSession, "before_commit")
+def write_changes(session: Session) -> None:
+    """
+    Write the changes of the transaction to the change log, last thing
+    before it commits.
+    """
+    # The commit flushes the pending objects after this event: do it first
+    session.flush()
+    rows = session.info.pop("changes", None)
+    if not rows:
+        return
+    connection = session.connection()
+    if connection.dialect.name == "postgresql":
+        connection.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": CHANGE_LOG_LOCK}
+        )
+    connection.execute(insert(ChangeLog), rows)
+
+
+@event.listens_for(LoggedSession, "after_transaction_end")
+def forget_changes(session: Session, transaction: SessionTransaction) -> None:
+    """
+    Forget the changes of a transaction that was rolled back.
+    """
+    if transaction.parent is None:
+        session.info.pop("changes", None)
@@ -1,19 +1,55 @@
-from typing import AsyncGenerator, List
+import logging
+from contextlib import contextmanager
+from typing import AsyncGenerator, Iterator, List, Optional, Tuple, Type
 
 from uuid import UUID
 
-from fastapi import Depends
+from fastapi import Depends, Request
 from fastapi_users.db import SQLAlchemyBaseUserTableUUID, SQLAlchemyUserDatabase
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.engine import Connection, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import Column, ForeignKey, Table, and_
-from sqlalchemy.orm import Session
+from sqlalchemy import (
+    Column,
+    ForeignKey,
+    Index,
+    MetaData,
+    String,
+    Table,
+    and_,
+    event,
+    inspect,
+    select,
+)
+from sqlalchemy.sql import Delete, Insert, Update
+from sqlalchemy.orm import InstrumentedAttribute, Session, selectinload
 
 
 from flashcards_core.guid import GUID
 from flashcards_core.database import Base, Deck, Card, Tag, Fact, Review
 
+from flashcards_server.cache import LRUCache, MISSING
+from flashcards_server.changes import LoggedSession, log_changes
+from flashcards_server.metrics import after_cursor_execute, before_cursor_execute
+from flashcards_server import search  # noqa: F401 (indexes the facts table)
+from flashcards_server.constants import (
+    DATABASE_MAX_OVERFLOW,
+    DATABASE_POOL_PRE_PING,
+    DATABASE_POOL_RECYCLE_SECONDS,
+    DATABASE_POOL_SIZE,
+    DATABASE_STATEMENT_TIMEOUT_MS,
+    DATABASE_URL,
+    OWNERSHIP_CACHE_SIZE,
+    OWNERSHIP_CACHE_TTL_SECONDS,
+    SQLITE_PERFORMANCE_MODE,
+    SQLITE_PRAGMAS,
+    SQLITE_READERS,
+    SQLITE_WRITE_TIMEOUT_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
 
 class User(SQLAlchemyBaseUserTableUUID, Base):
     __tablename__ = "users"
@@ -33,41 +69,58 @@ class User(SQLAlchemyBaseUserTableUUID, Base):
         return session.query(cls).filter(cls.email == email).first()
 
     async def get_decks(
-        self, session: Session, offset: int = 0, limit: int = 100
+        self,
+        session: Session,
+        offset: int = 0,
+        limit: int = 100,
+        after: Optional[UUID] = None,
     ) -> List[Deck]:
         """
-        Returns all the decks owned by this user.
+        Returns all the decks owned by this user, ordered by ID.
+
+        The decks are fetched joining ``deck_owners`` to ``decks``, and their
+        tags are eager-loaded, so the listing costs two statements no matter
+        how many decks are returned.
+
         :param session: the session (see flashcards_core.database:init_session()).
         :param offset: for pagination, index at which to start returning values.
         :param limit: for pagination, maximum number of elements to return.
+        :param after: for keyset pagination, the ID of the last deck of the
+            previous page. Only decks with a greater ID are returned.
         :returns: List of Decks.
         """
-        select = (
-            DeckOwner.select()
+        stmt = (
+            select(Deck)
+            .join(DeckOwner, DeckOwner.c.deck_id == Deck.id)
             .where(DeckOwner.c.owner_id == self.id)
-            .offset(offset)
-            .limit(limit)
-        )
-        deck_owner_pairs = await session.execute(select)
-        return list(
-            [
-                await Deck.get_one_async(session=session, object_id=pair.deck_id)
-                for pair in deck_owner_pairs
-            ]
+            .options(selectinload(Deck.tags))
+            .order_by(Deck.id)
         )
+        if after is not None:
+            stmt = stmt.where(Deck.id > after)
+        results = await session.scalars(stmt.offset(offset).limit(limit))
+        return list(results)
 
     async def owns_deck(self, session: Session, deck_id: UUID) -> bool:
         """
         Verify that the given deck is owned by this user.
+
+        The answer is cached in ``ownership_cache`` for
+        ``OWNERSHIP_CACHE_TTL_SECONDS``.
+
         :param session: the session (see flashcards_core.database:init_session()).
         :param deck_id: the deck to check the ownership of.
         :returns: True if the user is the owner of this deck, False otherwise
         """
-        select = DeckOwner.select().where(
-            and_(DeckOwner.c.owner_id == self.id, DeckOwner.c.deck_id == deck_id)
-        )
-        deck_owner = await session.execute(select)
-        return len(list(deck_owner)) > 0
+        owned = ownership_cache.get((self.id, deck_id))
+        if owned is MISSING:
+            select = DeckOwner.select().where(
+                and_(DeckOwner.c.owner_id == self.id, DeckOwner.c.deck_id == deck_id)
+            )
+            deck_owner = await session.execute(select)
+            owned = deck_owner.first() is not None
+            ownership_cache.set((self.id, deck_id), owned)
+        return owned
 
     async def create_deck(self, session: Session, deck_data: dict) -> Deck:
         """
@@ -80,6 +133,7 @@ class User(SQLAlchemyBaseUserTableUUID, Base):
         await session.execute(insert)
         await session.commit()
         await session.refresh(new_deck)
+        ownership_cache.set((self.id, new_deck.id), True)
         return new_deck
 
     async def delete_deck(self, session: Session, deck_id: UUID) -> None:
@@ -92,7 +146,16 @@ class User(SQLAlchemyBaseUserTableUUID, Base):
         await Deck.delete_async(session=session, object_id=deck_id)
         delete = DeckOwner.delete().where(DeckOwner.c.deck_id == deck_id)
         await session.execute(delete)
+        await log_changes(
+            session=session,
+            kind="deck",
+            object_ids=[deck_id],
+            deck_id=deck_id,
+            user_id=self.id,
+            deleted=True,
+        )
         await session.commit()
+        ownership_cache.invalidate_where(lambda key: key[1] == deck_id)
 
 
 #: Associative table for Decks and Users
@@ -101,21 +164,315 @@ DeckOwner = Table(
     Base.metadata,
     Column("deck_id", GUID(), ForeignKey(Deck.id), primary_key=True),
     Column("owner_id", GUID(), ForeignKey(User.id), nullable=False),
+    Index("ix_deck_owners_owner_id_deck_id", "owner_id", "deck_id"),
+)
+
+
+def association(attribute: InstrumentedAttribute) -> Tuple[Table, str, str]:
+    """
+    Describe the associative table behind a many-to-many relationship, to
+    read or write its rows directly.
+
+    :param attribute: the relationship, for example ``Card.tags``.
+    :returns: the associative table, the name of the column pointing to the
+        owner of the relationship and the name of the column pointing to
+        the related objects.
+    """
+    prop = attribute.property
+    ((_, owner_column),) = prop.synchronize_pairs
+    ((_, related_column),) = prop.secondary_synchronize_pairs
+    return prop.secondary, owner_column.key, related_column.key
+
+
+def association_indexes(attribute: InstrumentedAttribute) -> List[Index]:
+    """
+    Index the associative table of a many-to-many relationship in both
+    directions, to find the related objects of an owner and the owners of a
+    related object.
+
+    :param attribute: the relationship, for example ``Card.tags``.
+    :returns: the indexes, attached to the associative table.
+    """
+    table, owner_column, related_column = association(attribute)
+    return [
+        Index(f"ix_{table.name}_{first}_{second}", table.c[first], table.c[second])
+        for first, second in [
+            (owner_column, related_column),
+            (related_column, owner_column),
+        ]
+    ]
+
+
+#: The indexes of the queries that the API runs the most. They're created by
+#: ``create_all`` on new databases and by the migrations on existing ones.
+SCHEMA_INDEXES: List[Index] = [
+    *DeckOwner.indexes,
+    Index("ix_cards_deck_id_id", Card.__table__.c.deck_id, Card.__table__.c.id),
+    Index(
+        "ix_reviews_card_id_datetime",
+        Review.__table__.c.card_id,
+        Review.__table__.c.datetime,
+    ),
+    Index("uq_tags_name", Tag.__table__.c.name, unique=True),
+    *association_indexes(Card.tags),
+    *association_indexes(Card.question_context_facts),
+    *association_indexes(Card.answer_context_facts),
+    *association_indexes(Fact.tags),
+]
+
+#: The latest revision in ``alembic/versions``
+SCHEMA_HEAD = "e4b7c2a9f013"
+
+#: The table where Alembic stores the revision of the database. Not part of
+#: ``Base.metadata``, so that autogenerate leaves it alone.
+AlembicVersion = Table(
+    "alembic_version",
+    MetaData(),
+    Column("version_num", String(32), primary_key=True),
+)
+
+
+#: The HTTP methods of the requests that don't write to the database, whose
+#: sessions can read from the readers
+READ_ONLY_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+#: Cache of the deck ownership checks, keyed by (user ID, deck ID)
+ownership_cache = LRUCache(
+    maxsize=OWNERSHIP_CACHE_SIZE, ttl=OWNERSHIP_CACHE_TTL_SECONDS
 )
 
 
-DATABASE_URL = "sqlite+aiosqlite:///./test.db"
-engine = create_async_engine(DATABASE_URL)
-async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+def engine_options(url: str) -> dict:
+    """
+    The engine options for the given database, from the settings in
+    ``flashcards_server.constants``.
+
+    SQLite keeps SQLAlchemy's default pool, because in-memory databases
+    need a single connection. PostgreSQL through asyncpg gets a sized pool
+    and an optional statement timeout.
+
+    :param url: the database URL.
+    :returns: the keyword arguments for ``create_async_engine``.
+    """
+    options = {
+        "pool_pre_ping": DATABASE_POOL_PRE_PING,
+        "pool_recycle": DATABASE_POOL_RECYCLE_SECONDS,
+    }
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        return options
+
+    options["pool_size"] = DATABASE_POOL_SIZE
+    options["max_overflow"] = DATABASE_MAX_OVERFLOW
+    if DATABASE_STATEMENT_TIMEOUT_MS and url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {
+            "server_settings": {"statement_timeout": str(DATABASE_STATEMENT_TIMEOUT_MS)}
+        }
+    return options
+
+
+def sqlite_performance_mode(url: str) -> bool:
+    """
+    :returns: True if the database is a SQLite file and the SQLite
+        performance mode is enabled. In-memory databases can't be shared by
+        several connections, so they are excluded.
+    """
+    url = make_url(url)
+    return (
+        SQLITE_PERFORMANCE_MODE
+        and url.get_backend_name() == "sqlite"
+        and url.database not in (None, "", ":memory:")
+    )
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """
+    Apply ``SQLITE_PRAGMAS`` to a new SQLite connection.
+    """
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
+def create_engine(url: str = DATABASE_URL, **options) -> AsyncEngine:
+    """
+    Create an async engine for the given database, configured with
+    ``engine_options()``, whose statements are counted in the request
+    metrics.
+
+    :param url: the database URL. Defaults to ``FLASHCARDS_DATABASE_URL``.
+    :param options: overrides for ``engine_options()``.
+    :returns: the engine.
+    """
+    new_engine = create_async_engine(url, **{**engine_options(url), **options})
+    if sqlite_performance_mode(url):
+        event.listen(new_engine.sync_engine, "connect", set_sqlite_pragmas)
+    # Count the statements and their duration in the request metrics
+    event.listen(new_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(new_engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+    return new_engine
+
+
+def routing_session_class(writer: AsyncEngine, readers: AsyncEngine) -> Type[Session]:
+    """
+    A session class that sends the writes to the ``writer`` engine and the
+    reads to the ``readers`` engine.
+
+    Once a session writes, it keeps using the writer until it's closed, so
+    that it reads its own writes. Sessions with ``info["writer"]`` set use
+    the writer from the start (see ``get_async_session()``).
+
+    :param writer: the engine for the writes.
+    :param readers: the engine for the reads.
+    :returns: the session class, to be used as ``sync_session_class``.
+    """
+
+    class RoutingSession(LoggedSession):
+        #: The engine of the reads, to dispose of it with the writer
+        readers_engine = readers
+
+        def get_bind(self, mapper=None, clause=None, **kwargs):
+            if (
+                self.info.get("writer")
+                or self._flushing
+                or isinstance(clause, (Insert, Update, Delete))
+            ):
+                self.info["writer"] = True
+                return writer.sync_engine
+            return readers.sync_engine
+
+    return RoutingSession
+
+
+def create_session_maker(
+    url: str = DATABASE_URL,
+) -> Tuple[AsyncEngine, sessionmaker]:
+    """
+    Create the engine and the session factory for the given database.
+
+    In SQLite performance mode, the writes go through a single connection:
+    concurrent write transactions queue up for it, in order, instead of
+    failing with "database is locked". The reads are spread on a pool of
+    ``SQLITE_READERS`` connections, which WAL journaling lets run while a
+    write is in progress.
+
+    :param url: the database URL. Defaults to ``FLASHCARDS_DATABASE_URL``.
+    :returns: the engine (the writer, in SQLite performance mode) and the
+        session factory.
+    """
+    if not sqlite_performance_mode(url):
+        new_engine = create_engine(url)
+        return new_engine, sessionmaker(
+            new_engine,
+            class_=AsyncSession,
+            sync_session_class=LoggedSession,
+            expire_on_commit=False,
+        )
+
+    writer = create_engine(
+        url, pool_size=1, max_overflow=0, pool_timeout=SQLITE_WRITE_TIMEOUT_SECONDS
+    )
+    readers = create_engine(url, pool_size=SQLITE_READERS, max_overflow=0)
+    return writer, sessionmaker(
+        class_=AsyncSession,
+        sync_session_class=routing_session_class(writer=writer, readers=readers),
+        expire_on_commit=False,
+    )
+
+
+async def dispose_engines(engine: AsyncEngine, make_session: sessionmaker) -> None:
+    """
+    Close the connections of the engines returned by ``create_session_maker()``:
+    the engine, and the readers in SQLite performance mode.
+    """
+    await engine.dispose()
+    readers = getattr(make_session.kw["sync_session_class"], "readers_engine", None)
+    if readers is not None:
+        await readers.dispose()
+
+
+engine, async_session_maker = create_session_maker()
+
+
+@contextmanager
+def deferred_commits(session: Session) -> Iterator[None]:
+    """
+    Turn the ``commit()`` calls made on the session into flushes, so that
+    code that commits on its own, like the flashcards_core schedulers, can
+    run as part of a larger transaction. The caller commits or rolls back.
+
+    :param session: a synchronous session, for example in ``run_sync()``.
+    """
+    session.commit = session.flush
+    try:
+        yield
+    finally:
+        del session.commit
+
+
+def schema_revision(connection: Connection) -> Optional[str]:
+    """
+    :returns: the Alembic revision of the database, or None if it was never
+        migrated nor stamped.
+    """
+    if not inspect(connection).has_table(AlembicVersion.name):
+        return None
+    return connection.scalar(select(AlembicVersion.c.version_num))
+
+
+def create_schema(connection: Connection) -> None:
+    """
+    Create the missing tables and indexes, and stamp the database with
+    ``SCHEMA_HEAD`` as ``alembic stamp head`` would.
+    """
+    Base.metadata.create_all(connection)
+    for index in SCHEMA_INDEXES:
+        index.create(connection, checkfirst=True)
+    AlembicVersion.create(connection, checkfirst=True)
+    connection.execute(AlembicVersion.insert().values(version_num=SCHEMA_HEAD))
 
 
 async def create_db_and_tables():
+    """
+    Prepare the database at startup.
+
+    Databases at ``SCHEMA_HEAD`` are left untouched. Empty databases get the
+    full schema and are stamped with the head revision. Other databases
+    must be upgraded with ``alembic upgrade head``.
+    """
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        revision = await conn.run_sync(schema_revision)
+        if revision == SCHEMA_HEAD:
+            return
+        if revision is None and not await conn.run_sync(
+            lambda sync_conn: inspect(sync_conn).get_table_names()
+        ):
+            await conn.run_sync(create_schema)
+            return
+
+        logger.warning(
+            "The database schema is at revision %s, but the server expects %s: "
+            "run 'alembic upgrade head'.",
+            revision,
+            SCHEMA_HEAD,
+        )
+        if revision is None:
+            # Created before the migrations: keep creating the missing tables
+            # like older versions of the server did.
+            await conn.run_sync(Base.metadata.create_all)
 
 
-async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+async def get_async_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    The session of a request. The requests that may write use the writer
+    for their whole unit of work, reads included, so that a
+    read-modify-write doesn't read a stale row from a reader.
+    """
     async with async_session_maker() as session:
+        if request.method not in READ_ONLY_METHODS:
+            session.info["writer"] = True
         yield session
 
 
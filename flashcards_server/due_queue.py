@@ -0,0 +1,161 @@
+import heapq
+import itertools
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from uuid import UUID
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from flashcards_server.cache import LRUCache, MISSING
+from flashcards_server.constants import DUE_QUEUE_ALGORITHMS, DUE_QUEUE_CACHE_SIZE
+from flashcards_server.database import Card, Deck, Review
+
+#: Due time of the cards that were never reviewed: they come first.
+NEVER_REVIEWED = datetime.min
+
+
+def utc_naive(moment: Optional[datetime]) -> datetime:
+    """
+    Normalize a datetime to naive UTC, so that database values and values
+    computed by the server can be compared.
+
+    :param moment: the datetime to normalize. None means never.
+    :returns: the naive UTC datetime.
+    """
+    if moment is None:
+        return NEVER_REVIEWED
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+class DueQueue:
+    """
+    The cards of a deck, sorted by due time.
+
+    Backed by a binary heap: updating the due time of a card and finding the
+    next due card are both O(log n). Outdated heap entries are skipped
+    lazily when they reach the top of the heap.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[UUID, datetime]] = ()):
+        """
+        :param entries: (card ID, due time) pairs.
+        """
+        self._counter = itertools.count()
+        self._due: Dict[UUID, datetime] = {
+            card_id: utc_naive(due) for card_id, due in entries
+        }
+        self._heap = [
+            (due, next(self._counter), card_id) for card_id, due in self._due.items()
+        ]
+        heapq.heapify(self._heap)
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def __contains__(self, card_id: UUID) -> bool:
+        return card_id in self._due
+
+    def push(self, card_id: UUID, due: Optional[datetime]) -> None:
+        """
+        Add a card to the queue, or change its due time.
+
+        :param card_id: the card to schedule.
+        :param due: when the card is due. None means it was never reviewed.
+        """
+        due = utc_naive(due)
+        self._due[card_id] = due
+        heapq.heappush(self._heap, (due, next(self._counter), card_id))
+        if len(self._heap) > 2 * len(self._due) + 64:
+            self._compact()
+
+    def remove(self, card_id: UUID) -> None:
+        """
+        Remove a card from the queue, if present.
+        """
+        self._due.pop(card_id, None)
+
+    def peek(self) -> Optional[UUID]:
+        """
+        :returns: the ID of the card that is due first, or None if the queue
+            is empty.
+        """
+        while self._heap:
+            due, _, card_id = self._heap[0]
+            if self._due.get(card_id) == due:
+                return card_id
+            heapq.heappop(self._heap)
+        return None
+
+    def smallest(self, count: int) -> List[UUID]:
+        """
+        :param count: how many cards to return.
+        :returns: the IDs of the ``count`` cards that are due first, in order.
+        """
+        cards = []
+        for due, _, card_id in heapq.nsmallest(
+            count + len(self._heap) - len(self._due), self._heap
+        ):
+            if self._due.get(card_id) == due and card_id not in cards:
+                cards.append(card_id)
+                if len(cards) == count:
+                    break
+        return cards
+
+    def _compact(self) -> None:
+        self._heap = [
+            (due, next(self._counter), card_id) for card_id, due in self._due.items()
+        ]
+        heapq.heapify(self._heap)
+
+
+#: The due queues of the recently studied decks, keyed by deck ID
+due_queues = LRUCache(maxsize=DUE_QUEUE_CACHE_SIZE)
+
+
+def uses_due_queue(deck: Deck) -> bool:
+    """
+    :returns: True if the next card of this deck is picked from its due queue
+        rather than by the scheduler.
+    """
+    return deck.algorithm in DUE_QUEUE_ALGORITHMS
+
+
+async def get_due_queue(session: Session, deck_id: UUID) -> DueQueue:
+    """
+    Returns the due queue of the deck, building it on first access.
+
+    The scheduler does not expose due times, so the cards are ordered by
+    their last review: cards never reviewed come first, then the least
+    recently reviewed ones.
+
+    :param session: the session (see flashcards_core.database:init_session()).
+    :param deck_id: the deck to get the queue of.
+    :returns: the due queue.
+    """
+    queue = due_queues.get(deck_id)
+    if queue is MISSING:
+        stmt = (
+            select(Card.id, func.max(Review.datetime))
+            .outerjoin(Review, Review.card_id == Card.id)
+            .where(Card.deck_id == deck_id)
+            .group_by(Card.id)
+        )
+        queue = DueQueue((card_id, due) for card_id, due in await session.execute(stmt))
+        due_queues.set(deck_id, queue)
+    return queue
+
+
+def card_reviewed(deck_id: UUID, card_id: UUID, when: datetime = None) -> None:
+    """
+    Update the due queue of the deck (if it is built) after a review.
+
+    :param deck_id: the deck of the card.
+    :param card_id: the card that was reviewed.
+    :param when: when the review happened. Defaults to now.
+    """
+    queue = due_queues.peek(deck_id)
+    if queue is not MISSING:
+        queue.push(card_id, when or datetime.now(timezone.utc))
@@ -0,0 +1,326 @@
+"""
+Streaming import of facts and cards from NDJSON or CSV.
+
+The input is read line by line and written in chunks: each chunk is
+deduplicated in memory, written with a fixed number of executemany
+statements and committed on its own, so memory use depends only on the
+chunk size.
+
+NDJSON lines are either facts::
+
+    {"value": "Oxygen", "format": "text", "tags": ["element"]}
+
+or cards::
+
+    {"question": {"value": "O"}, "answer": {"value": "Oxygen"},
+     "question_context": [], "answer_context": [], "tags": ["chemistry"]}
+
+CSV files have a header with the ``question`` and ``answer`` columns, and
+optionally ``format`` and ``tags`` (separated by ``;``). Every row is a card.
+Records can't span more than one line.
+"""
+
+import csv
+import json
+import logging
+import uuid
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from uuid import UUID
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from flashcards_server.bulk import insert_associations, resolve_tags
+from flashcards_server.changes import log_changes
+from flashcards_server.database import Card, Fact
+from flashcards_server.due_queue import due_queues
+from flashcards_server.response_cache import FACTS, bump, deck_version
+
+logger = logging.getLogger(__name__)
+
+
+#: How many records to write in each transaction
+DEFAULT_CHUNK_SIZE = 5000
+
+#: Format of the facts that don't specify one
+DEFAULT_FORMAT = "text"
+
+#: Maximum number of errors listed in the import report
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportedFact(BaseModel):
+    value: str
+    format: str = DEFAULT_FORMAT
+    tags: List[str] = []
+
+
+class ImportedCard(BaseModel):
+    question: ImportedFact
+    answer: ImportedFact
+    question_context: List[ImportedFact] = []
+    answer_context: List[ImportedFact] = []
+    tags: List[str] = []
+
+
+class ImportLineError(BaseModel):
+    line: int
+    detail: str
+
+
+class ImportReport(BaseModel):
+    lines: int = 0
+    facts: int = 0
+    cards: int = 0
+    errors: List[ImportLineError] = []
+    error_count: int = 0
+
+    def add_error(self, line: int, detail: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(ImportLineError(line=line, detail=detail))
+
+
+Record = Union[ImportedFact, ImportedCard]
+
+
+async def split_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """
+    Split a stream of bytes into decoded lines.
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8").rstrip("\r")
+
+
+def parse_ndjson_line(line: str) -> Optional[Record]:
+    """
+    :returns: the fact or card on this line, None for blank lines.
+    :raises ValueError: if the line is not a valid record.
+    """
+    if not line.strip():
+        return None
+    data = json.loads(line)
+    if not isinstance(data, dict):
+        raise ValueError("each line must be a JSON object")
+    if "question" in data:
+        return ImportedCard(**data)
+    return ImportedFact(**data)
+
+
+def csv_line_parser(header: str) -> Callable[[str], Optional[Record]]:
+    """
+    :param header: the first line of the CSV file.
+    :returns: a function parsing the next lines of the file into cards.
+    :raises ValueError: if the header lacks the required columns.
+    """
+    columns = next(csv.reader([header]))
+    if not {"question", "answer"} <= set(columns):
+        raise ValueError("the CSV header must have 'question' and 'answer' columns")
+
+    def parse(line: str) -> Optional[Record]:
+        if not line.strip():
+            return None
+        values = next(csv.reader([line]))
+        if len(values) < len(columns):
+            raise ValueError(
+                f"expected {len(columns)} columns ({', '.join(columns)}), "
+                f"got {len(values)}"
+            )
+        row = dict(zip(columns, values))
+        fact_format = row.get("format") or DEFAULT_FORMAT
+        return ImportedCard(
+            question=ImportedFact(value=row["question"], format=fact_format),
+            answer=ImportedFact(value=row["answer"], format=fact_format),
+            tags=[
+                tag.strip() for tag in (row.get("tags") or "").split(";") if tag.strip()
+            ],
+        )
+
+    return parse
+
+
+async def write_chunk(
+    session: Session,
+    deck_id: Optional[UUID],
+    records: List[Tuple[int, Record]],
+    report: ImportReport,
+) -> None:
+    """
+    Write a chunk of records in one transaction.
+
+    Facts with the same value and format are written only once per chunk,
+    and all the tags of the chunk are resolved together.
+    """
+    facts: Dict[Tuple[str, str], dict] = {}
+    fact_tags: List[Tuple[UUID, str]] = []
+    cards: List[dict] = []
+    card_tags: List[Tuple[UUID, str]] = []
+    question_contexts: List[Tuple[UUID, UUID]] = []
+    answer_contexts: List[Tuple[UUID, UUID]] = []
+
+    def fact_id(fact: ImportedFact) -> UUID:
+        key = (fact.value, fact.format)
+        if key not in facts:
+            facts[key] = {
+                "id": uuid.uuid4(),
+                "value": fact.value,
+                "format": fact.format,
+            }
+        fact_tags.extend((facts[key]["id"], tag) for tag in fact.tags)
+        return facts[key]["id"]
+
+    for line, record in records:
+        if isinstance(record, ImportedFact):
+            fact_id(record)
+            continue
+        if deck_id is None:
+            report.add_error(line=line, detail="cards can only be imported in a deck")
+            continue
+        card_id = uuid.uuid4()
+        cards.append(
+            {
+                "id": card_id,
+                "deck_id": deck_id,
+                "question_id": fact_id(record.question),
+                "answer_id": fact_id(record.answer),
+            }
+        )
+        card_tags.extend((card_id, tag) for tag in record.tags)
+        question_contexts.extend(
+            (card_id, fact_id(fact)) for fact in record.question_context
+        )
+        answer_contexts.extend(
+            (card_id, fact_id(fact)) for fact in record.answer_context
+        )
+
+    tags = await resolve_tags(
+        session=session, names={tag for _, tag in fact_tags + card_tags}
+    )
+    if facts:
+        await session.execute(insert(Fact), list(facts.values()))
+    if cards:
+        await session.execute(insert(Card), cards)
+    await insert_associations(
+        session=session,
+        attribute=Fact.tags,
+        pairs=((fact, tags[tag]) for fact, tag in fact_tags),
+    )
+    await insert_associations(
+        session=session,
+        attribute=Card.tags,
+        pairs=((card, tags[tag]) for card, tag in card_tags),
+    )
+    await insert_associations(
+        session=session, attribute=Card.question_context_facts, pairs=question_contexts
+    )
+    await insert_associations(
+        session=session, attribute=Card.answer_context_facts, pairs=answer_contexts
+    )
+    await log_changes(
+        session=session, kind="fact", object_ids=[fact["id"] for fact in facts.values()]
+    )
+    await log_changes(
+        session=session,
+        kind="card",
+        object_ids=[card["id"] for card in cards],
+        deck_id=deck_id,
+    )
+    await session.commit()
+
+    report.facts += len(facts)
+    report.cards += len(cards)
+
+
+async def parse_lines(
+    lines: AsyncIterable[str], file_format: str, report: ImportReport
+) -> AsyncIterator[Tuple[int, Record]]:
+    """
+    Parse the lines of the file into records, reporting the invalid ones.
+
+    :returns: (line number, record) pairs.
+    :raises ValueError: if the format is unknown or the CSV header is invalid.
+    """
+    if file_format not in ("ndjson", "csv"):
+        raise ValueError(f"Unknown import format '{file_format}'")
+
+    parse = parse_ndjson_line if file_format == "ndjson" else None
+    async for line in lines:
+        report.lines += 1
+        if parse is None:
+            parse = csv_line_parser(line)
+            continue
+        try:
+            record = parse(line)
+        except (ValueError, ValidationError) as exc:
+            report.add_error(line=report.lines, detail=str(exc))
+            continue
+        if record is not None:
+            yield report.lines, record
+
+
+async def import_lines(
+    session: Session,
+    lines: AsyncIterable[str],
+    deck_id: Optional[UUID] = None,
+    file_format: str = "ndjson",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[Callable[[ImportReport], None]] = None,
+) -> ImportReport:
+    """
+    Import facts and cards, one chunk at a time.
+
+    Lines that can't be parsed are skipped and reported; the rest of the
+    file is still imported.
+
+    :param session: the session (see flashcards_core.database:init_session()).
+    :param lines: the lines of the file.
+    :param deck_id: the deck to add the cards to. Without it, only facts can
+        be imported.
+    :param file_format: either ``ndjson`` or ``csv``.
+    :param chunk_size: how many records to write in each transaction.
+    :param progress: called with the report after every chunk.
+    :returns: the import report.
+    :raises ValueError: if the format is unknown or the CSV header is invalid.
+    """
+    report = ImportReport()
+    chunk: List[Tuple[int, Record]] = []
+    async for line, record in parse_lines(lines, file_format, report):
+        chunk.append((line, record))
+        if len(chunk) >= chunk_size:
+            await write_chunk(session, deck_id, chunk, report)
+            chunk = []
+            if progress:
+                progress(report)
+
+    if chunk:
+        await write_chunk(session, deck_id, chunk, report)
+    if progress:
+        progress(report)
+    if deck_id is not None:
+        due_queues.invalidate(deck_id)
+        await bump(deck_version(deck_id))
+    await bump(FACTS)
+    logger.info(
+        "Imported %s facts and %s cards from %s lines (%s errors)",
+        report.facts,
+        report.cards,
+        report.lines,
+        report.error_count,
+    )
+    return report
@@ -0,0 +1,339 @@
+"""
+Request instrumentation: the wall time, database time and number of SQL
+statements of every request, per route, and the time spent serializing the
+responses stored in the response cache.
+
+``MetricsMiddleware`` times the requests and ``metrics`` accumulates the
+timings, served in the Prometheus text format on ``/metrics``. The SQL
+statements are counted by the engine listeners that ``create_engine()``
+installs, the serialization time by the code wrapped in
+``cache_serialization()``: only the cache misses of the routes using
+``cached_response()`` are measured, the responses that FastAPI serializes
+itself are not. Requests slower than ``FLASHCARDS_SLOW_REQUEST_SECONDS`` are
+logged as one JSON object each.
+
+The timings are kept per worker: Prometheus should scrape every worker, or
+the cumulated counters will jump between them.
+"""
+
+import json
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from flashcards_server.constants import SLOW_REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+#: Upper bounds of the request duration histogram buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+#: Route label of the requests that matched no route, so that scanners
+#: can't create one series per URL
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class RequestTimings:
+    """
+    What the current request spent so far, beyond its wall time.
+    """
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.cache_serialization_seconds = 0.0
+
+
+#: The timings of the request being handled, None outside of requests
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "current_timings", default=None
+)
+
+
+def before_cursor_execute(
+    connection, cursor, statement, parameters, context, executemany
+) -> None:
+    """
+    Engine listener: note when the statement started.
+    """
+    if current_timings.get() is not None:
+        connection.info["statement_started"] = time.perf_counter()
+
+
+def after_cursor_execute(
+    connection, cursor, statement, parameters, context, executemany
+) -> None:
+    """
+    Engine listener: count the statement and its duration in the timings of
+    the current request. An ``executemany`` counts as one statement.
+    """
+    timings = current_timings.get()
+    started = connection.info.pop("statement_started", None)
+    if timings is None or started is None:
+        return
+    timings.statements += 1
+    timings.db_seconds += time.perf_counter() - started
+
+
+@contextmanager
+def cache_serialization() -> Iterator[None]:
+    """
+    Count the body of the ``with`` block as time spent serializing a response
+    for the response cache, in the current request.
+    """
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.cache_serialization_seconds += time.perf_counter() - start
+
+
+class RouteMetrics:
+    """
+    The cumulated timings of one route.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = [0] * len(buckets)
+        self.count = 0
+        self.seconds = 0.0
+        self.db_seconds = 0.0
+        self.statements = 0
+        self.cache_serialization_seconds = 0.0
+
+
+def escape(value: str) -> str:
+    """
+    Escape a Prometheus label value.
+    """
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def labels(**values: Any) -> str:
+    """
+    :returns: the labels of a Prometheus sample, like ``{route="/decks"}``.
+    """
+    pairs = (f'{name}="{escape(str(value))}"' for name, value in values.items())
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metrics:
+    """
+    The timings of the requests of this worker, per route.
+    """
+
+    def __init__(
+        self,
+        buckets: Tuple[float, ...] = DURATION_BUCKETS,
+        slow_seconds: float = SLOW_REQUEST_SECONDS,
+    ):
+        """
+        :param buckets: the upper bounds of the duration histogram buckets.
+        :param slow_seconds: log the requests slower than this (0 to log
+            none).
+        """
+        self.bucket_bounds = buckets
+        self.slow_seconds = slow_seconds
+        self.routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        self.responses: Dict[Tuple[str, str, int], int] = defaultdict(int)
+
+    def record(
+        self,
+        method: str,
+        route: str,
+        status: int,
+        seconds: float,
+        timings: RequestTimings,
+    ) -> None:
+        """
+        Add a request to the metrics of its route, and log it if it's slow.
+
+        :param method: the HTTP method.
+        :param route: the path template of the route, like
+            ``/decks/{deck_id}``.
+        :param status: the status code of the response.
+        :param seconds: the wall time of the request.
+        :param timings: what the request spent in the database and in the
+            serialization of the cached responses.
+        """
+        key = (method, route)
+        stats = self.routes.get(key)
+        if stats is None:
+            stats = self.routes[key] = RouteMetrics(self.bucket_bounds)
+        for index, bound in enumerate(self.bucket_bounds):
+            if seconds <= bound:
+                stats.buckets[index] += 1
+                break
+        stats.count += 1
+        stats.seconds += seconds
+        stats.db_seconds += timings.db_seconds
+        stats.statements += timings.statements
+        stats.cache_serialization_seconds += timings.cache_serialization_seconds
+        self.responses[(method, route, status)] += 1
+
+        if self.slow_seconds and seconds >= self.slow_seconds:
+            logger.warning(
+                "Slow request: %s",
+                json.dumps(
+                    {
+                        "method": method,
+                        "route": route,
+                        "status": status,
+                        "seconds": round(seconds, 6),
+                        "db_seconds": round(timings.db_seconds, 6),
+                        "statements": timings.statements,
+                        "cache_serialization_seconds": round(
+                            timings.cache_serialization_seconds, 6
+                        ),
+                    }
+                ),
+            )
+
+    def render(self, caches: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+        """
+        :param caches: the ``stats()`` of the caches to export, by name.
+        :returns: the metrics in the Prometheus text format.
+        """
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        metric("flashcards_http_requests_total", "counter", "Requests, by status.")
+        for (method, route, status), count in sorted(self.responses.items()):
+            lines.append(
+                "flashcards_http_requests_total"
+                f"{labels(method=method, route=route, status=status)} {count}"
+            )
+
+        metric(
+            "flashcards_http_request_duration_seconds",
+            "histogram",
+            "Wall time of the requests.",
+        )
+        for (method, route), stats in sorted(self.routes.items()):
+            cumulated = 0
+            for bound, count in zip(self.bucket_bounds, stats.buckets):
+                cumulated += count
+                lines.append(
+                    "flashcards_http_request_duration_seconds_bucket"
+                    f"{labels(method=method, route=route, le=bound)} {cumulated}"
+                )
+            route_labels = labels(method=method, route=route)
+            lines.append(
+                "flashcards_http_request_duration_seconds_bucket"
+                f'{labels(method=method, route=route, le="+Inf")} {stats.count}'
+            )
+            lines.append(
+                "flashcards_http_request_duration_seconds_sum"
+                f"{route_labels} {stats.seconds}"
+            )
+            lines.append(
+                "flashcards_http_request_duration_seconds_count"
+                f"{route_labels} {stats.count}"
+            )
+
+        for name, attribute, help_text in (
+            (
+                "flashcards_http_request_db_seconds_total",
+                "db_seconds",
+                "Time spent executing SQL statements.",
+            ),
+            (
+                "flashcards_http_request_db_statements_total",
+                "statements",
+                "SQL statements executed.",
+            ),
+            (
+                "flashcards_http_request_cache_serialization_seconds_total",
+                "cache_serialization_seconds",
+                "Time spent serializing the responses stored in the response "
+                "cache, on cache misses only.",
+            ),
+        ):
+            metric(name, "counter", help_text)
+            for (method, route), stats in sorted(self.routes.items()):
+                lines.append(
+                    f"{name}{labels(method=method, route=route)} "
+                    f"{getattr(stats, attribute)}"
+                )
+
+        caches = caches or {}
+        for name, key, kind, help_text in (
+            ("flashcards_cache_hits_total", "hits", "counter", "Cache hits."),
+            ("flashcards_cache_misses_total", "misses", "counter", "Cache misses."),
+            ("flashcards_cache_entries", "size", "gauge", "Cached entries."),
+            (
+                "flashcards_cache_saved_seconds_total",
+                "saved_seconds",
+                "counter",
+                "Estimated time saved by the cache hits.",
+            ),
+        ):
+            samples = [
+                f"{name}{labels(cache=cache)} {stats[key]}"
+                for cache, stats in sorted(caches.items())
+                if key in stats
+            ]
+            if samples:
+                metric(name, kind, help_text)
+                lines.extend(samples)
+
+        return "\n".join(lines) + "\n"
+
+
+#: The metrics of this worker
+metrics = Metrics()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing the HTTP requests into ``metrics``.
+
+    The wall time runs until the response is sent, streamed bodies
+    included.
+    """
+
+    def __init__(self, app, metrics: Metrics = metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_status(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            seconds = time.perf_counter() - start
+            current_timings.reset(token)
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            self.metrics.record(
+                method=scope["method"],
+                route=getattr(route, "path", UNMATCHED_ROUTE),
+                status=status,
+                seconds=seconds,
+                timings=timings,
+            )
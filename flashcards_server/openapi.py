@@ -0,0 +1,191 @@
+"""
+Serving of the OpenAPI schema.
+
+The schema is serialized, compressed and hashed only once per worker and
+served with an ``ETag`` (clients get a 304 when they already have it) and
+gzip, when the client accepts it.
+
+It can also be generated at build time with ``generate-redoc`` and loaded
+from ``spec.json`` at startup (see ``FLASHCARDS_OPENAPI_SCHEMA``), so that
+the workers don't build it at all. The file records a fingerprint of the
+routes and models it was generated from: if they or the version of the app
+changed since, the file is ignored. ``check-openapi`` compares the whole file with the live schema.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from fastapi import FastAPI, Request, Response
+from fastapi.routing import APIRoute
+from pydantic import TypeAdapter
+from starlette.routing import Route
+
+try:
+    from fastapi.routing import iter_route_contexts
+except ImportError:  # Older FastAPI: app.routes lists the included routes too
+
+    def iter_route_contexts(routes):
+        return iter(routes)
+
+
+logger = logging.getLogger(__name__)
+
+#: Key of the routes fingerprint in the generated schema files
+FINGERPRINT_KEY = "x-routes-fingerprint"
+
+
+def api_routes(app: FastAPI) -> Iterator[APIRoute]:
+    """
+    :returns: the API routes of the app, including the routes of the routers
+        it includes, with their prefixes.
+    """
+    for route in iter_route_contexts(app.routes):
+        if isinstance(getattr(route, "original_route", route), APIRoute):
+            yield route
+
+
+def field_schema(field, schemas: Dict[str, dict]) -> Optional[dict]:
+    """
+    :param field: the body or the response field of a route, if any.
+    :param schemas: the JSON schemas already computed, by annotation.
+    :returns: the JSON schema of the field.
+    """
+    if field is None:
+        return None
+    annotation = field.field_info.annotation
+    key = repr(annotation)
+    if key not in schemas:
+        schemas[key] = TypeAdapter(annotation).json_schema()
+    return schemas[key]
+
+
+def parameters(dependant) -> List[Tuple[str, str, bool]]:
+    """
+    :returns: the name, type and whether it's required of every parameter of
+        a route, including the ones of its dependencies.
+    """
+    fields = (
+        dependant.path_params
+        + dependant.query_params
+        + dependant.header_params
+        + dependant.cookie_params
+    )
+    found = [
+        (field.name, repr(field.field_info.annotation), field.field_info.is_required())
+        for field in fields
+    ]
+    for dependency in dependant.dependencies:
+        found.extend(parameters(dependency))
+    return found
+
+
+def routes_fingerprint(app: FastAPI) -> str:
+    """
+    Hash the version of the app and the path, methods, name, parameters and
+    the JSON schemas of the body and the response of every route of the API.
+    Cheap enough to compute at startup, unlike the schema itself: the
+    schemas of the models are computed once each.
+
+    :returns: the fingerprint, as a hex string.
+    """
+    schemas: Dict[str, dict] = {}
+    routes = sorted(
+        (
+            route.path,
+            sorted(route.methods),
+            route.name,
+            sorted(parameters(route.dependant)),
+            field_schema(route.body_field, schemas),
+            field_schema(route.response_field, schemas),
+        )
+        for route in api_routes(app)
+    )
+    fingerprint = json.dumps([app.version, routes], sort_keys=True, default=str)
+    return hashlib.sha256(fingerprint.encode()).hexdigest()
+
+
+def generate_schema(app: FastAPI) -> dict:
+    """
+    :returns: the OpenAPI schema of the app, with the routes fingerprint.
+    """
+    return {**app.openapi(), FINGERPRINT_KEY: routes_fingerprint(app)}
+
+
+def load_schema(app: FastAPI, path: str) -> bool:
+    """
+    Use the schema in the given file instead of generating it.
+
+    :param path: a schema file written by ``generate-redoc``.
+    :returns: True if the schema was loaded, False if the file is missing,
+        isn't valid JSON or was generated from different routes.
+    """
+    try:
+        with open(path) as schema_file:
+            schema = json.load(schema_file)
+    except (OSError, ValueError) as exc:
+        logger.warning("Can't load the OpenAPI schema from %s: %s", path, exc)
+        return False
+    if schema.get(FINGERPRINT_KEY) != routes_fingerprint(app):
+        logger.warning(
+            "The OpenAPI schema in %s is stale, it will be generated again. "
+            "Run 'generate-redoc' to update it.",
+            path,
+        )
+        return False
+    app.openapi_schema = schema
+    return True
+
+
+class OpenAPIDocument:
+    """
+    The OpenAPI schema of an app, serialized and compressed on first use.
+    """
+
+    def __init__(self, app: FastAPI):
+        self.app = app
+        self._body: Optional[bytes] = None
+        self._gzipped: Optional[bytes] = None
+        self._etag: Optional[str] = None
+
+    def _build(self) -> None:
+        self._body = json.dumps(self.app.openapi()).encode()
+        self._gzipped = gzip.compress(self._body)
+        self._etag = f'"{hashlib.sha256(self._body).hexdigest()[:32]}"'
+
+    async def endpoint(self, request: Request) -> Response:
+        if self._body is None:
+            self._build()
+        headers = {"ETag": self._etag, "Vary": "Accept-Encoding"}
+        if self._etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+            body = self._gzipped
+        else:
+            body = self._body
+        return Response(body, media_type="application/json", headers=headers)
+
+
+def serve_schema(app: FastAPI, path: Optional[str] = None) -> None:
+    """
+    Replace the default ``/openapi.json`` route of the app with one that
+    serves the schema with an ETag and gzip.
+
+    Should be called only after all routes have been added.
+
+    :param path: a schema file to load instead of generating the schema.
+    """
+    if path:
+        load_schema(app=app, path=path)
+    document = OpenAPIDocument(app)
+    app.router.routes = [
+        (
+            Route(app.openapi_url, document.endpoint, include_in_schema=False)
+            if isinstance(route, Route) and route.path == app.openapi_url
+            else route
+        )
+        for route in app.router.routes
+    ]
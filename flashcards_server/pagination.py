@@ -0,0 +1,103 @@
+"""
+Cursor (keyset) pagination for the list endpoints.
+
+Lists are ordered by ID. When there is a next page, the response carries an
+opaque cursor in the ``X-Next-Cursor`` header and the URL of the next page in
+the ``Link`` header. Passing the cursor back with ``?cursor=`` filters on the
+ID instead of skipping rows, so every page costs the same no matter how deep
+it is. ``offset`` still works for backwards compatibility.
+
+Lists not ordered by ID, like ranked search results, are paginated with
+``offset`` only: their ``Link`` header points to the next offset.
+"""
+
+import base64
+import binascii
+from typing import List, Optional
+
+from uuid import UUID
+from fastapi import HTTPException, Request, Response
+from sqlalchemy.sql import Select
+
+
+def encode_cursor(last_id: UUID) -> str:
+    """
+    :param last_id: the ID of the last element of the page.
+    :returns: the cursor pointing right after it.
+    """
+    return base64.urlsafe_b64encode(last_id.bytes).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> UUID:
+    """
+    :param cursor: a cursor returned by ``encode_cursor()``.
+    :returns: the ID of the last element of the previous page.
+    :raises: HTTPException if the cursor is not valid.
+    """
+    try:
+        return UUID(bytes=base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail=f"Invalid cursor '{cursor}'")
+
+
+def keyset_page(
+    stmt: Select, column, cursor: Optional[str], offset: int, limit: int
+) -> Select:
+    """
+    Order the query by ``column`` and restrict it to one page.
+
+    One row more than ``limit`` is selected, so that ``next_page()`` can
+    tell whether there is a next page.
+
+    :param stmt: the query to paginate.
+    :param column: the unique column to order by, usually the ID.
+    :param cursor: the cursor of the page, if any.
+    :param offset: how many rows to skip (after the cursor, if any).
+    :param limit: the size of the page.
+    :returns: the query for the page.
+    """
+    if cursor is not None:
+        stmt = stmt.where(column > decode_cursor(cursor))
+    return stmt.order_by(column).offset(offset).limit(limit + 1)
+
+
+def next_page(request: Request, response: Response, items: List, limit: int) -> List:
+    """
+    Trim the extra row selected by ``keyset_page()`` and, if there was one,
+    set the ``X-Next-Cursor`` and ``Link`` headers of the response.
+
+    :param items: the rows returned by the ``keyset_page()`` query.
+    :param limit: the size of the page, at least 1.
+    :returns: the elements of the page.
+    """
+    items = list(items)
+    if limit < len(items):
+        items = items[:limit]
+        cursor = encode_cursor(items[-1].id)
+        url = request.url.remove_query_params("offset").include_query_params(
+            cursor=cursor
+        )
+        response.headers["X-Next-Cursor"] = cursor
+        response.headers["Link"] = f'<{url}>; rel="next"'
+    return items
+
+
+def next_offset_page(
+    request: Request, response: Response, items: List, offset: int, limit: int
+) -> List:
+    """
+    Like ``next_page()``, for lists paginated with ``offset`` only: trim the
+    extra row and, if there was one, point the ``Link`` header to the next
+    offset.
+
+    :param items: the rows of the page, plus one if there is a next page.
+    :param offset: the offset of the page.
+    :param limit: the size of the page, at least 1.
+    :returns: the elements of the page.
+    """
+    items = list(items)
+    if limit < len(items):
+        items = items[:limit]
+        url = request.url.include_query_params(offset=offset + limit)
+        response.headers["Link"] = f'<{url}>; rel="next"'
+    return items
@@ -0,0 +1,323 @@
+"""
+Response cache for the read-heavy endpoints.
+
+Cached responses are keyed by user, by URL and by the version of every
+resource they were built from. Writes never delete cached responses: they
+bump the versions of the resources they change, so that the next lookup
+uses a new key and misses. The stale entries are evicted by the LRU or
+expire with their TTL.
+
+The versions are:
+
+- ``deck:<id>``: the deck, its cards and their reviews.
+- ``decks:<user id>``: the list of decks of the user.
+- ``fact:<id>``: the fact, its tags and its related facts.
+- ``facts``: any fact. Cards embed their facts, so they depend on it.
+- ``tags``: any tag name.
+
+The same key gives the strong ``ETag`` of the response: a client sending
+it back in ``If-None-Match`` gets a 304 as soon as the versions are read,
+before the response is loaded from the cache or the database.
+
+Two backends are available: an in-process LRU (the default) and Redis
+(``FLASHCARDS_RESPONSE_CACHE=redis``, requires the ``redis`` extra). Like
+the other in-process caches, the LRU backend is local to each worker: with
+several workers, a write made in one worker is only seen by the others
+when their entries expire. For the same reason its ETags are specific to
+the worker and change at least every TTL. Redis shares both the versions and
+the responses between all the workers.
+"""
+
+import hashlib
+import itertools
+import json
+import time
+import uuid
+from functools import lru_cache
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from uuid import UUID
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from flashcards_server.cache import LRUCache, MISSING
+from flashcards_server.constants import (
+    RESPONSE_CACHE_BACKEND,
+    RESPONSE_CACHE_REDIS_URL,
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTL_SECONDS,
+)
+from flashcards_server.database import Fact, association
+from flashcards_server.metrics import cache_serialization
+
+#: Version shared by all the facts
+FACTS = "facts"
+
+#: Version shared by all the tags
+TAGS = "tags"
+
+
+def deck_version(deck_id: UUID) -> str:
+    return f"deck:{deck_id}"
+
+
+def decks_version(user_id: UUID) -> str:
+    return f"decks:{user_id}"
+
+
+def fact_version(fact_id: UUID) -> str:
+    return f"fact:{fact_id}"
+
+
+class MemoryBackend:
+    """
+    Stores the responses and the versions in in-process LRU caches.
+
+    The versions are numbers drawn from a single counter, so none is ever
+    given twice: a version evicted from its cache comes back with a new
+    number, as if it was bumped, and the responses built from the old one
+    can't be reached anymore.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float]):
+        self.responses = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.versions = LRUCache(maxsize=maxsize)
+        self.counter = itertools.count(1)
+        self.ttl = ttl
+        self.worker = uuid.uuid4().hex
+
+    def namespace(self) -> str:
+        """
+        The versions of a worker don't see the writes made in the others, so
+        its keys must not match theirs, and must not outlive the TTL.
+        """
+        if not self.ttl:
+            return self.worker
+        return f"{self.worker}.{int(time.time() // self.ttl)}"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = self.responses.get(key)
+        return None if value is MISSING else value
+
+    async def set(self, key: str, value: bytes) -> None:
+        self.responses.set(key, value)
+
+    async def get_versions(self, names: List[str]) -> List[int]:
+        numbers = []
+        for name in names:
+            number = self.versions.get(name)
+            if number is MISSING:
+                number = next(self.counter)
+                self.versions.set(name, number)
+            numbers.append(number)
+        return numbers
+
+    async def bump(self, names: Iterable[str]) -> None:
+        for name in names:
+            self.versions.set(name, next(self.counter))
+
+    async def clear(self) -> None:
+        self.responses.clear()
+        self.versions.clear()
+
+
+class RedisBackend:
+    """
+    Stores the responses and the versions in Redis, or in any server
+    speaking its protocol.
+    """
+
+    def __init__(self, url: str, ttl: Optional[float]):
+        import redis.asyncio
+
+        self.redis = redis.asyncio.from_url(url)
+        self.ttl = int(ttl) if ttl else None
+
+    def namespace(self) -> str:
+        return ""
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.redis.get(f"flashcards:response:{key}")
+
+    async def set(self, key: str, value: bytes) -> None:
+        await self.redis.set(f"flashcards:response:{key}", value, ex=self.ttl)
+
+    async def get_versions(self, names: List[str]) -> List[int]:
+        values = await self.redis.mget([f"flashcards:version:{n}" for n in names])
+        return [int(value or 0) for value in values]
+
+    async def bump(self, names: Iterable[str]) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for name in names:
+                pipe.incr(f"flashcards:version:{name}")
+            await pipe.execute()
+
+    async def clear(self) -> None:
+        for pattern in ["flashcards:response:*", "flashcards:version:*"]:
+            async for key in self.redis.scan_iter(match=pattern):
+                await self.redis.delete(key)
+
+
+def create_backend(name: str = RESPONSE_CACHE_BACKEND):
+    """
+    :param name: ``memory`` or ``redis``.
+    :returns: the response cache backend.
+    """
+    if name == "redis":
+        return RedisBackend(
+            url=RESPONSE_CACHE_REDIS_URL, ttl=RESPONSE_CACHE_TTL_SECONDS
+        )
+    if name == "memory":
+        return MemoryBackend(
+            maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL_SECONDS
+        )
+    raise ValueError(f"Unknown response cache backend '{name}'")
+
+
+#: The response cache of this worker
+backend = create_backend()
+
+
+async def bump(*names: str) -> None:
+    """
+    Mark the given resources as changed, making the responses built from
+    them unreachable.
+
+    :param names: the versions to bump, like ``deck_version(deck_id)``.
+    """
+    await backend.bump(names)
+
+
+async def with_related_facts(session: Session, fact_ids: Iterable[UUID]) -> Set[UUID]:
+    """
+    :param session: the session (see flashcards_core.database:init_session()).
+    :param fact_ids: some facts.
+    :returns: the IDs of these facts and of the facts related to them.
+    """
+    fact_ids = set(fact_ids)
+    table, owner_column, related_column = association(Fact.related_facts)
+    pairs = await session.execute(
+        select(table.c[owner_column], table.c[related_column]).where(
+            or_(
+                table.c[owner_column].in_(fact_ids),
+                table.c[related_column].in_(fact_ids),
+            )
+        )
+    )
+    fact_ids.update(fact_id for pair in pairs for fact_id in pair)
+    return fact_ids
+
+
+async def facts_changed(session: Session, fact_ids: Iterable[UUID]) -> None:
+    """
+    Bump the versions of the given facts, of the facts related to them
+    (which embed them) and of all the facts.
+
+    :param session: the session (see flashcards_core.database:init_session()).
+    :param fact_ids: the facts that changed.
+    """
+    fact_ids = await with_related_facts(session=session, fact_ids=fact_ids)
+    await bump(FACTS, *(fact_version(fact_id) for fact_id in fact_ids))
+
+
+@lru_cache(maxsize=None)
+def type_adapter(response_model: Any) -> TypeAdapter:
+    return TypeAdapter(response_model)
+
+
+def encode(body: bytes, headers: Dict[str, str]) -> bytes:
+    return json.dumps(headers).encode() + b"\n" + body
+
+
+def decode(value: bytes) -> Tuple[bytes, Dict[str, str]]:
+    headers, body = value.split(b"\n", 1)
+    return body, json.loads(headers)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    :param etag: the current ETag of the resource.
+    :returns: True if the ``If-None-Match`` header of the request lists it.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+async def cached_response(
+    request: Request,
+    response: Response,
+    user_id: UUID,
+    versions: List[str],
+    response_model: Any,
+    render: Callable[[], Awaitable[Any]],
+) -> Response:
+    """
+    Return the cached response for this user and URL if the given versions
+    did not change since it was cached, otherwise render it and cache it.
+
+    The response has an ``ETag`` derived from the same versions. If the
+    request already has it in ``If-None-Match``, an empty 304 is returned
+    without looking up the cache or calling ``render``.
+
+    With the ``memory`` backend the versions are local to the worker: after
+    a write handled by another worker, this one may serve the previous
+    response (and 304s for its ETag) for up to ``RESPONSE_CACHE_TTL_SECONDS``.
+    Use the ``redis`` backend to run several workers without stale
+    responses.
+
+    :param request: the request, for its URL and conditional headers.
+    :param response: the response injected in the endpoint. The headers
+        ``render`` sets on it (like pagination links) are cached too.
+    :param user_id: the user the response is for.
+    :param versions: the versions of the resources the response is built
+        from.
+    :param response_model: the type of the response, like ``List[CardRead]``.
+    :param render: loads the data of the response. Exceptions are not cached.
+    :returns: the JSON response, or a 304.
+    """
+    numbers = await backend.get_versions(versions)
+    key = (
+        f"{backend.namespace()}:{user_id}:{request.url.path}?{request.url.query}:"
+        + ",".join(f"{name}={number}" for name, number in zip(versions, numbers))
+    )
+    validators = {
+        "ETag": f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"',
+        "Cache-Control": "private, no-cache",
+    }
+    if etag_matches(request=request, etag=validators["ETag"]):
+        return Response(status_code=304, headers=validators)
+
+    value = await backend.get(key)
+    if value is not None:
+        body, headers = decode(value)
+    else:
+        adapter = type_adapter(response_model)
+        data = await render()
+        with cache_serialization():
+            body = adapter.dump_json(
+                adapter.validate_python(data, from_attributes=True)
+            )
+        headers = {
+            name: value
+            for name, value in response.headers.items()
+            if name != "content-length"
+        }
+        await backend.set(key, encode(body, headers))
+    return Response(
+        content=body, media_type="application/json", headers={**headers, **validators}
+    )
@@ -0,0 +1,92 @@
+import asyncio
+import json
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Iterable
+from uuid import UUID
+from weakref import WeakValueDictionary
+
+from sqlalchemy.orm import Session
+from flashcards_core.schedulers import get_scheduler_for_deck
+
+from flashcards_server.cache import LRUCache, MISSING
+from flashcards_server.constants import SCHEDULER_CACHE_SIZE
+from flashcards_server.database import Deck
+
+#: Schedulers of the recently studied decks, keyed by deck ID.
+#: Values are (deck fingerprint, scheduler) pairs.
+scheduler_cache = LRUCache(maxsize=SCHEDULER_CACHE_SIZE)
+
+#: Locks of the decks whose scheduler is in use, keyed by deck ID. A lock is
+#: dropped as soon as no request holds or waits for it.
+scheduler_locks: "WeakValueDictionary[UUID, asyncio.Lock]" = WeakValueDictionary()
+
+
+@asynccontextmanager
+async def using_schedulers(deck_ids: Iterable[UUID]) -> AsyncIterator[None]:
+    """
+    Give the ``with`` block exclusive use of the cached schedulers of these
+    decks. ``get_scheduler()`` binds the cached scheduler to the session of
+    the request, and the scheduler yields to the event loop at every query:
+    without the lock, two requests on the same deck would run their queries
+    on each other's session.
+
+    :param deck_ids: the decks whose schedulers the block uses.
+    """
+    async with AsyncExitStack() as stack:
+        # Always in the same order, so that two requests can't deadlock
+        for deck_id in sorted(set(deck_ids)):
+            lock = scheduler_locks.get(deck_id)
+            if lock is None:
+                lock = scheduler_locks[deck_id] = asyncio.Lock()
+            await stack.enter_async_context(lock)
+        yield
+
+
+def deck_fingerprint(deck: Deck) -> str:
+    """
+    Summarizes everything a scheduler is built from: when the fingerprint
+    of a deck changes, its cached scheduler must be rebuilt.
+
+    :param deck: the deck to fingerprint.
+    :returns: a string that changes when the algorithm, the parameters or
+        the state of the deck change.
+    """
+    return json.dumps(
+        [deck.algorithm, deck.parameters, deck.state], sort_keys=True, default=str
+    )
+
+
+def get_scheduler(session: Session, deck: Deck) -> Any:
+    """
+    Returns the scheduler for this deck, reusing the cached one if the
+    deck did not change since it was built.
+
+    Must be called with a synchronous session, for example through
+    ``AsyncSession.run_sync()``, inside ``using_schedulers()``.
+
+    :param session: the session (see flashcards_core.database:init_session()).
+    :param deck: the deck to get the scheduler for.
+    :returns: the scheduler, bound to the given session and deck.
+    """
+    fingerprint = deck_fingerprint(deck)
+    cached = scheduler_cache.get(deck.id)
+    if cached is not MISSING and cached[0] == fingerprint:
+        scheduler = cached[1]
+        scheduler.session = session
+        scheduler.deck = deck
+        return scheduler
+
+    scheduler = get_scheduler_for_deck(session=session, deck=deck)
+    scheduler_cache.set(deck.id, (fingerprint, scheduler))
+    return scheduler
+
+
+def update_scheduler(deck: Deck, scheduler: Any) -> None:
+    """
+    Store the scheduler again after it changed the deck state, so that the
+    next request does not rebuild it.
+
+    :param deck: the deck the scheduler belongs to.
+    :param scheduler: the scheduler to keep.
+    """
+    scheduler_cache.set(deck.id, (deck_fingerprint(deck), scheduler))
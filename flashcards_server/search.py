@@ -0,0 +1,183 @@
+"""
+Full-text search over the values of the facts.
+
+On SQLite the values are indexed in ``fact_search``, an FTS5 table. The
+``facts`` table has no integer primary key, so its rowids may change on
+``VACUUM``: ``fact_search_rows`` gives every fact a stable rowid in the
+index instead. On PostgreSQL, a GIN index on the ``tsvector`` of the
+values serves the searches.
+
+Either way the database keeps the index up to date (through triggers on
+SQLite), so every path that writes facts, bulk imports included, is
+covered. Both use the language-independent ``simple`` tokenization: words
+match whole, without stemming.
+
+The index is created along with the ``facts`` table, and by the migration
+for existing databases.
+"""
+
+import logging
+
+from sqlalchemy import column, event, func, literal_column, select, table, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import Select
+
+from flashcards_core.database import Fact
+
+logger = logging.getLogger(__name__)
+
+#: Text search configuration of the PostgreSQL index. Queries must use the
+#: same literal for the index to be used.
+POSTGRES_CONFIG = literal_column("'simple'")
+
+#: The SQLite index (``rank`` orders by relevance) and the rowid of each
+#: fact in it
+SearchIndex = table("fact_search", column("rowid"), column("rank"))
+SearchRows = table("fact_search_rows", column("rowid"), column("fact_id"))
+
+#: Prefix of the SQLite tables of the index: ``fact_search_rows``, the FTS5
+#: table and its shadow tables (``fact_search_data``...)
+SQLITE_TABLES_PREFIX = "fact_search"
+
+#: Name of the PostgreSQL index
+POSTGRES_INDEX = "ix_facts_value_search"
+
+#: Statements creating the index, by dialect
+CREATE_INDEX = {
+    "sqlite": [
+        "CREATE TABLE IF NOT EXISTS fact_search_rows ("
+        " rowid INTEGER PRIMARY KEY, fact_id UNIQUE NOT NULL)",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS fact_search USING fts5(value)",
+        "CREATE TRIGGER IF NOT EXISTS fact_search_insert AFTER INSERT ON facts"
+        " BEGIN"
+        " INSERT INTO fact_search_rows (fact_id) VALUES (new.id);"
+        " INSERT INTO fact_search (rowid, value)"
+        " VALUES (last_insert_rowid(), new.value);"
+        " END",
+        "CREATE TRIGGER IF NOT EXISTS fact_search_update AFTER UPDATE OF value ON facts"
+        " BEGIN"
+        " UPDATE fact_search SET value = new.value WHERE rowid ="
+        " (SELECT rowid FROM fact_search_rows WHERE fact_id = old.id);"
+        " END",
+        "CREATE TRIGGER IF NOT EXISTS fact_search_delete AFTER DELETE ON facts"
+        " BEGIN"
+        " DELETE FROM fact_search WHERE rowid ="
+        " (SELECT rowid FROM fact_search_rows WHERE fact_id = old.id);"
+        " DELETE FROM fact_search_rows WHERE fact_id = old.id;"
+        " END",
+        # Index the facts that already exist, if not indexed yet
+        "INSERT OR IGNORE INTO fact_search_rows (fact_id) SELECT id FROM facts",
+        "INSERT INTO fact_search (rowid, value) SELECT fact_search_rows.rowid, value"
+        " FROM fact_search_rows JOIN facts ON facts.id = fact_search_rows.fact_id"
+        " WHERE fact_search_rows.rowid NOT IN (SELECT rowid FROM fact_search)",
+    ],
+    "postgresql": [
+        f"CREATE INDEX IF NOT EXISTS {POSTGRES_INDEX} ON facts"
+        " USING gin (to_tsvector('simple', value))",
+    ],
+}
+
+#: Statements dropping the index, by dialect
+DROP_INDEX = {
+    "sqlite": [
+        "DROP TRIGGER IF EXISTS fact_search_insert",
+        "DROP TRIGGER IF EXISTS fact_search_update",
+        "DROP TRIGGER IF EXISTS fact_search_delete",
+        "DROP TABLE IF EXISTS fact_search",
+        "DROP TABLE IF EXISTS fact_search_rows",
+    ],
+    "postgresql": [f"DROP INDEX IF EXISTS {POSTGRES_INDEX}"],
+}
+
+
+def is_search_object(name: str, type_: str) -> bool:
+    """
+    Tell the objects of the index, which are not in the metadata, apart
+    from the others: Alembic's autogenerate must not drop them.
+
+    :param name: the name of a table or index of the database.
+    :param type_: its type, like ``table`` or ``index``.
+    """
+    if type_ == "table":
+        return name.startswith(SQLITE_TABLES_PREFIX)
+    return type_ == "index" and name == POSTGRES_INDEX
+
+
+def supports_search(connection: Connection) -> bool:
+    """
+    :returns: True if the database can have a full-text index: PostgreSQL,
+        and SQLite when built with FTS5.
+    """
+    if connection.dialect.name == "sqlite":
+        return bool(
+            connection.scalar(
+                text(
+                    "SELECT count(*) FROM pragma_compile_options"
+                    " WHERE compile_options = 'ENABLE_FTS5'"
+                )
+            )
+        )
+    return connection.dialect.name in CREATE_INDEX
+
+
+@event.listens_for(Fact.__table__, "after_create")
+def create_search_index(target, connection: Connection, **kwargs) -> None:
+    """
+    Create the search index of the facts, and index the existing ones. Can
+    run again on an indexed database. Databases without full-text search
+    support get no index.
+    """
+    if not supports_search(connection):
+        logger.warning(
+            "No full-text search on this %s database", connection.dialect.name
+        )
+        return
+    for statement in CREATE_INDEX[connection.dialect.name]:
+        connection.execute(text(statement))
+
+
+@event.listens_for(Fact.__table__, "before_drop")
+def drop_search_index(target, connection: Connection, **kwargs) -> None:
+    """
+    Drop the search index of the facts.
+    """
+    for statement in DROP_INDEX.get(connection.dialect.name, []):
+        connection.execute(text(statement))
+
+
+def sqlite_match(query: str) -> str:
+    """
+    Turn a user query into an FTS5 query matching all of its words, so that
+    quotes and operators in the query are searched for rather than parsed.
+
+    :param query: the words to search.
+    :returns: the FTS5 query.
+    """
+    return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+
+def fact_search(dialect: str, query: str) -> Select:
+    """
+    Build the search of the facts matching all the words of ``query``.
+
+    :param dialect: the name of the database dialect, like ``sqlite``.
+    :param query: the words to search.
+    :returns: a ``select(Fact)`` of the matching facts, best matches first.
+    :raises ValueError: if the database doesn't support full-text search.
+    """
+    if dialect == "sqlite":
+        stmt = (
+            select(Fact)
+            .join(SearchRows, SearchRows.c.fact_id == Fact.id)
+            .join(SearchIndex, SearchIndex.c.rowid == SearchRows.c.rowid)
+            .where(literal_column("fact_search").op("MATCH")(sqlite_match(query)))
+        )
+        return stmt.order_by(SearchIndex.c.rank, Fact.id)
+
+    if dialect == "postgresql":
+        vector = func.to_tsvector(POSTGRES_CONFIG, Fact.value)
+        tsquery = func.websearch_to_tsquery(POSTGRES_CONFIG, query)
+        stmt = select(Fact).where(vector.op("@@")(tsquery))
+        return stmt.order_by(func.ts_rank(vector, tsquery).desc(), Fact.id)
+
+    raise ValueError(f"Full-text search is not supported on {dialect}")
@@ -0,0 +1,56 @@
+"""
+Startup profiling: how long the imports and the startup steps of the
+server take.
+
+Enabled with ``FLASHCARDS_PROFILE_STARTUP=true``. For a breakdown of every
+single module import, run the server with ``python -X importtime``.
+"""
+
+import sys
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+
+from flashcards_server.constants import PROFILE_STARTUP
+
+
+class StartupProfile:
+    """
+    Records the duration of named startup steps and prints them on stderr
+    once the server is ready.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.steps: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        """
+        Time the body of the ``with`` block as the step ``name``.
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, time.perf_counter() - start))
+
+    def report(self) -> None:
+        """
+        Print the duration of each step, slowest first, and the total time
+        since this profile was created.
+        """
+        if not self.enabled:
+            return
+        for name, duration in sorted(self.steps, key=lambda step: -step[1]):
+            print(f"Startup: {duration * 1000:8.1f} ms  {name}", file=sys.stderr)
+        total = time.perf_counter() - self.started
+        print(f"Startup: {total * 1000:8.1f} ms  total", file=sys.stderr)
+
+
+#: The profile of the current process
+startup_profile = StartupProfile(enabled=PROFILE_STARTUP)
@@ -0,0 +1,235 @@
+"""
+Filter the cards and the facts by tags: the results must have all the tags
+of ``tags_all``, at least one of ``tags_any`` and none of ``tags_none``.
+
+In the database, the filter is one join with the owners of the wanted tags,
+grouped by owner, plus one anti-join for the excluded tags, whatever the
+number of tags. Both go through the indexes of the associative tables.
+
+The cards of a deck can also be filtered in memory, on a bitmap per tag
+built from a single query and kept in ``tag_bitmaps``. The bitmaps of a
+deck stay valid as long as the versions of the deck and of the tags in the
+response cache don't change: any change to its cards or to a tag rebuilds
+them.
+"""
+
+from bisect import bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from uuid import UUID
+from fastapi import Query
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import InstrumentedAttribute, Session
+from sqlalchemy.sql import Select
+
+from flashcards_server import response_cache
+from flashcards_server.cache import LRUCache, MISSING
+from flashcards_server.constants import (
+    RESPONSE_CACHE_TTL_SECONDS,
+    TAG_INDEX_CACHE_SIZE,
+)
+from flashcards_server.database import Card, Tag, association
+from flashcards_server.pagination import decode_cursor
+from flashcards_server.response_cache import TAGS, deck_version
+
+
+class TagFilter:
+    """
+    The tags the results must all have, may have any of, and must not have.
+    """
+
+    def __init__(
+        self,
+        all_of: Iterable[str] = (),
+        any_of: Iterable[str] = (),
+        none_of: Iterable[str] = (),
+    ):
+        self.all_of: Set[str] = set(all_of)
+        self.any_of: Set[str] = set(any_of)
+        self.none_of: Set[str] = set(none_of)
+
+    def __bool__(self) -> bool:
+        return bool(self.all_of or self.any_of or self.none_of)
+
+
+def tag_filter(
+    tags_all: List[str] = Query([]),
+    tags_any: List[str] = Query([]),
+    tags_none: List[str] = Query([]),
+) -> TagFilter:
+    """
+    Dependency reading the tag filter from the query string, like
+    ``?tags_all=chemistry&tags_any=gas&tags_any=metal&tags_none=hard``.
+
+    :param tags_all: the results must have all these tags.
+    :param tags_any: the results must have at least one of these tags.
+    :param tags_none: the results must have none of these tags.
+    """
+    return TagFilter(all_of=tags_all, any_of=tags_any, none_of=tags_none)
+
+
+def filter_by_tags(
+    stmt: Select, attribute: InstrumentedAttribute, tags: TagFilter
+) -> Select:
+    """
+    Restrict a query to the objects matching the tag filter.
+
+    :param stmt: the query, like ``select(Card)``.
+    :param attribute: the tags of the queried objects, like ``Card.tags``.
+    :param tags: the filter.
+    :returns: the filtered query.
+    """
+    table, owner_column, tag_column = association(attribute)
+    owner = table.c[owner_column]
+    object_id = attribute.class_.id
+
+    if tags.all_of or tags.any_of:
+        # An object has each tag at most once: counting the rows of the
+        # group counts its distinct tags
+        matches = (
+            select(owner)
+            .join(Tag, Tag.id == table.c[tag_column])
+            .where(Tag.name.in_(tags.all_of | tags.any_of))
+            .group_by(owner)
+        )
+        if tags.all_of:
+            matches = matches.having(
+                func.count(case((Tag.name.in_(tags.all_of), 1))) == len(tags.all_of)
+            )
+        if tags.any_of:
+            matches = matches.having(
+                func.count(case((Tag.name.in_(tags.any_of), 1))) > 0
+            )
+        matches = matches.subquery()
+        stmt = stmt.join(matches, matches.c[owner_column] == object_id)
+
+    if tags.none_of:
+        excluded = (
+            select(owner)
+            .join(Tag, Tag.id == table.c[tag_column])
+            .where(Tag.name.in_(tags.none_of))
+        )
+        stmt = stmt.where(object_id.not_in(excluded))
+
+    return stmt
+
+
+class TagBitmaps:
+    """
+    The tags of a set of objects, as one bitmap per tag: bit ``n`` of the
+    bitmap of a tag is set if the ``n``-th object (by ID) has the tag.
+    """
+
+    def __init__(self, pairs: Iterable[Tuple[UUID, Optional[str]]]):
+        """
+        :param pairs: (object ID, tag name) pairs. The objects without tags
+            are listed once with None.
+        """
+        tags_by_id: Dict[UUID, List[str]] = {}
+        for object_id, name in pairs:
+            names = tags_by_id.setdefault(object_id, [])
+            if name is not None:
+                names.append(name)
+        self.ids: List[UUID] = sorted(tags_by_id)
+
+        bits: Dict[str, bytearray] = {}
+        size = (len(self.ids) + 7) // 8
+        for position, object_id in enumerate(self.ids):
+            for name in tags_by_id[object_id]:
+                bitmap = bits.setdefault(name, bytearray(size))
+                bitmap[position // 8] |= 1 << (position % 8)
+        self.bitmaps: Dict[str, int] = {
+            name: int.from_bytes(bitmap, "little") for name, bitmap in bits.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def match(self, tags: TagFilter) -> int:
+        """
+        :param tags: the filter.
+        :returns: the bitmap of the objects matching it.
+        """
+        result = (1 << len(self.ids)) - 1
+        for name in tags.all_of:
+            result &= self.bitmaps.get(name, 0)
+        if tags.any_of:
+            either = 0
+            for name in tags.any_of:
+                either |= self.bitmaps.get(name, 0)
+            result &= either
+        for name in tags.none_of:
+            result &= ~self.bitmaps.get(name, 0)
+        return result
+
+    def positions(self, bitmap: int, start: int = 0) -> Iterator[int]:
+        """
+        :param bitmap: a bitmap returned by ``match()``.
+        :param start: the first position to consider.
+        :returns: the positions of the set bits, in order.
+        """
+        data = (bitmap >> start).to_bytes(
+            max(len(self.ids) - start + 7, 0) // 8, "little"
+        )
+        for index, byte in enumerate(data):
+            while byte:
+                low = byte & -byte
+                yield start + index * 8 + low.bit_length() - 1
+                byte ^= low
+
+    def page(
+        self, tags: TagFilter, cursor: Optional[str], offset: int, limit: int
+    ) -> List[UUID]:
+        """
+        Select a page of the matching objects, like ``keyset_page()``: one
+        more than ``limit``, so that ``next_page()`` can tell whether there
+        is a next page.
+
+        :param tags: the filter.
+        :param cursor: the cursor of the page, if any.
+        :param offset: how many matching objects to skip (after the cursor,
+            if any).
+        :param limit: the size of the page.
+        :returns: the IDs of the objects of the page, in order.
+        """
+        start = 0 if cursor is None else bisect_right(self.ids, decode_cursor(cursor))
+        page = []
+        for index, position in enumerate(self.positions(self.match(tags), start)):
+            if index >= offset + limit + 1:
+                break
+            if index >= offset:
+                page.append(self.ids[position])
+        return page
+
+
+#: The tag bitmaps of the cards of the recently filtered decks, keyed by deck
+#: ID, with the versions they were built at
+tag_bitmaps = LRUCache(maxsize=TAG_INDEX_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL_SECONDS)
+
+
+async def get_card_tag_bitmaps(session: Session, deck_id: UUID) -> TagBitmaps:
+    """
+    Returns the tag bitmaps of the cards of the deck, building them on first
+    access and whenever the deck or the tags changed since.
+
+    :param session: the session (see flashcards_core.database:init_session()).
+    :param deck_id: the deck to get the bitmaps of.
+    :returns: the tag bitmaps.
+    """
+    versions = tuple(
+        await response_cache.backend.get_versions([deck_version(deck_id), TAGS])
+    )
+    entry = tag_bitmaps.get(deck_id)
+    if entry is not MISSING and entry[0] == versions:
+        return entry[1]
+
+    table, owner_column, tag_column = association(Card.tags)
+    stmt = (
+        select(Card.id, Tag.name)
+        .outerjoin(table, table.c[owner_column] == Card.id)
+        .outerjoin(Tag, Tag.id == table.c[tag_column])
+        .where(Card.deck_id == deck_id)
+    )
+    bitmaps = TagBitmaps(await session.execute(stmt))
+    tag_bitmaps.set(deck_id, (versions, bitmaps))
+    return bitmaps
@@ -1,6 +1,8 @@
+import time
 import uuid
-from typing import Optional
+from typing import Any, Dict, Optional
 
+import jwt
 from fastapi import Depends, Request
 from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin
 from fastapi_users.authentication import (
@@ -9,12 +11,101 @@ from fastapi_users.authentication import (
     JWTStrategy,
 )
 from fastapi_users.db import SQLAlchemyUserDatabase
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
 
+from flashcards_server.cache import LRUCache, MISSING
+from flashcards_server.constants import TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL_SECONDS
 from flashcards_server.database import User, get_user_db
 
 SECRET = "SECRET"
 
 
+class CachedJWTStrategy(JWTStrategy):
+    """
+    A JWT strategy that caches the verified tokens with their user, so that
+    most requests neither decode the token nor load the user.
+
+    Entries expire after ``ttl`` seconds, or when the token does. The user
+    manager drops the tokens of a user when the user changes, and logging
+    out drops the token (the JWT itself stays valid until it expires).
+    Like the other in-process caches, the cache is local to each worker.
+    """
+
+    def __init__(self, *args, ttl: float, maxsize: int, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    def _user_id(self, token: str) -> Optional[uuid.UUID]:
+        entry = self.cache.peek(token)
+        return None if entry is MISSING else entry[0]
+
+    async def read_token(
+        self, token: Optional[str], user_manager: BaseUserManager
+    ) -> Optional[User]:
+        if token is None or not self.cache.ttl:
+            return await super().read_token(token, user_manager)
+
+        start = time.perf_counter()
+        entry = self.cache.get(token)
+        if entry is not MISSING:
+            # Every request gets its own copy: the user may be added to the
+            # request session, which a shared instance can't be.
+            user = User(**entry[1])
+            make_transient_to_detached(user)
+            self.hit_seconds += time.perf_counter() - start
+            return user
+
+        user = await super().read_token(token, user_manager)
+        if user is not None:
+            expires = jwt.decode(token, options={"verify_signature": False}).get("exp")
+            ttl = self.cache.ttl if expires is None else expires - time.time()
+            values = {
+                attribute.key: getattr(user, attribute.key)
+                for attribute in inspect(User).column_attrs
+            }
+            self.cache.set(token, (user.id, values), ttl=min(self.cache.ttl, ttl))
+        self.miss_seconds += time.perf_counter() - start
+        return user
+
+    async def destroy_token(self, token: str, user: User) -> None:
+        self.cache.invalidate(token)
+        await super().destroy_token(token, user)
+
+    def forget_user(self, user_id: uuid.UUID) -> None:
+        """
+        Drop the cached tokens of the given user, so that the next requests
+        load it again.
+        """
+        self.cache.invalidate_where(lambda token: self._user_id(token) == user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        :returns: the cache stats, the time spent on hits and misses, and an
+            estimate of the time saved by the hits.
+        """
+        stats = self.cache.stats()
+        miss_average = self.miss_seconds / stats["misses"] if stats["misses"] else 0.0
+        hit_average = self.hit_seconds / stats["hits"] if stats["hits"] else 0.0
+        return {
+            **stats,
+            "hit_seconds": self.hit_seconds,
+            "miss_seconds": self.miss_seconds,
+            "saved_seconds": max(0.0, miss_average - hit_average) * stats["hits"],
+        }
+
+
+#: The strategy of all the requests, which holds the token cache
+jwt_strategy = CachedJWTStrategy(
+    secret=SECRET,
+    lifetime_seconds=3600,
+    ttl=TOKEN_CACHE_TTL_SECONDS,
+    maxsize=TOKEN_CACHE_SIZE,
+)
+
+
 class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     reset_password_token_secret = SECRET
     verification_token_secret = SECRET
@@ -32,6 +123,22 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     ):
         print(f"Verification requested for user {user.id}. Verification token: {token}")
 
+    async def on_after_update(
+        self, user: User, update_dict: Dict[str, Any], request: Optional[Request] = None
+    ):
+        jwt_strategy.forget_user(user.id)
+
+    async def on_after_verify(self, user: User, request: Optional[Request] = None):
+        jwt_strategy.forget_user(user.id)
+
+    async def on_after_reset_password(
+        self, user: User, request: Optional[Request] = None
+    ):
+        jwt_strategy.forget_user(user.id)
+
+    async def on_after_delete(self, user: User, request: Optional[Request] = None):
+        jwt_strategy.forget_user(user.id)
+
 
 async def get_user_manager(user_db: SQLAlchemyUserDatabase = Depends(get_user_db)):
     yield UserManager(user_db)
@@ -41,7 +148,7 @@ bearer_transport = BearerTransport(tokenUrl="auth/jwt/login")
 
 
 def get_jwt_strategy() -> JWTStrategy:
-    return JWTStrategy(secret=SECRET, lifetime_seconds=3600)
+    return jwt_strategy
 
 
 auth_backend = AuthenticationBackend(
@@ -52,4 +159,4 @@ auth_backend = AuthenticationBackend(
 
 fastapi_users = FastAPIUsers[User, uuid.UUID](get_user_manager, [auth_backend])
 
-current_active_user: User = fastapi_users.current_user(active=True)
\ No newline at end of file
+current_active_user: User = fastapi_users.current_user(active=True)
@@ -0,0 +1,18 @@
+import json
+import sys
+
+from flashcards_server.app import app
+from flashcards_server.openapi import generate_schema
+
+
+def check_openapi():
+    """
+    Exit with an error if ``spec.json`` (or the file given as argument) is
+    not the current OpenAPI schema of the API.
+    """
+    path = sys.argv[1] if len(sys.argv) > 1 else "spec.json"
+    with open(path) as fd:
+        schema = json.load(fd)
+    if schema != json.loads(json.dumps(generate_schema(app))):
+        sys.exit(f"{path} is stale: run 'generate-redoc' to update it.")
+    print(f"{path} is up to date.")
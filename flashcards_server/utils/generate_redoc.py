@@ -1,6 +1,6 @@
 import json
 from flashcards_server.app import app
-
+from flashcards_server.openapi import generate_schema
 
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -33,9 +33,11 @@ HTML_TEMPLATE = """
 
 def generate_redoc():
     """
-    Export the ReDoc documentation page into a standalone HTML file.
+    Export the ReDoc documentation page into a standalone HTML file, and the
+    OpenAPI schema into ``spec.json`` (see ``FLASHCARDS_OPENAPI_SCHEMA``).
     """
+    spec = json.dumps(generate_schema(app))
     with open("redoc.html", "w") as fd:
-        fd.write(HTML_TEMPLATE.format(json.dumps(app.openapi())))
+        fd.write(HTML_TEMPLATE.format(spec))
     with open("spec.json", "w") as fd:
-        json.dump(app.openapi(), fd)
+        fd.write(spec)
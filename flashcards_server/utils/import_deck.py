@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import sys
+import time
+from typing import AsyncIterator
+
+from uuid import UUID
+
+from flashcards_server.database import async_session_maker
+from flashcards_server.importer import DEFAULT_CHUNK_SIZE, ImportReport, import_lines
+
+
+async def read_lines(path: str) -> AsyncIterator[str]:
+    """
+    Read a file line by line, without loading it in memory.
+    """
+    with open(path, encoding="utf-8") as fd:
+        for line in fd:
+            yield line.rstrip("\r\n")
+
+
+async def run_import(args: argparse.Namespace) -> ImportReport:
+    start = time.perf_counter()
+
+    def progress(report: ImportReport) -> None:
+        elapsed = time.perf_counter() - start
+        print(
+            f"{report.lines} lines, {report.facts} facts, {report.cards} cards, "
+            f"{report.error_count} errors ({report.lines / elapsed:.0f} lines/s)",
+            file=sys.stderr,
+        )
+
+    async with async_session_maker() as session:
+        # Read from the writer too, like the writing requests of the API
+        session.info["writer"] = True
+        return await import_lines(
+            session=session,
+            lines=read_lines(args.path),
+            deck_id=args.deck,
+            file_format=args.format,
+            chunk_size=args.chunk_size,
+            progress=progress,
+        )
+
+
+def import_deck():
+    """
+    Import facts and cards from an NDJSON or CSV file into the database
+    configured for the server.
+    """
+    parser = argparse.ArgumentParser(description=import_deck.__doc__)
+    parser.add_argument("path", help="the file to import")
+    parser.add_argument(
+        "--deck", type=UUID, help="the deck to add the cards to (required for cards)"
+    )
+    parser.add_argument(
+        "--format",
+        choices=["ndjson", "csv"],
+        help="format of the file (defaults to the file extension)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="how many records to write in each transaction",
+    )
+    args = parser.parse_args()
+    if args.format is None:
+        args.format = "csv" if args.path.lower().endswith(".csv") else "ndjson"
+
+    report = asyncio.run(run_import(args))
+    for error in report.errors:
+        print(f"line {error.line}: {error.detail}", file=sys.stderr)
+    sys.exit(1 if report.error_count else 0)
@@ -13,3 +13,9 @@ def test_get_algorithms(monkeypatch, client: TestClient):
     response = client.get("/algorithms")
     assert response.status_code == 200
     assert response.json() == list(fake_algorithms.keys())
+
+
+def test_get_algorithms_bad_page(client: TestClient):
+    assert client.get("/algorithms", params={"offset": -1}).status_code == 422
+    assert client.get("/algorithms", params={"limit": 0}).status_code == 422
+    assert client.get("/algorithms", params={"limit": 1001}).status_code == 422
@@ -0,0 +1,60 @@
+from flashcards_server.cache import LRUCache, MISSING
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = LRUCache(ttl=10, clock=clock)
+    cache.set("a", 1)
+    clock.now = 9.9
+    assert cache.get("a") == 1
+    clock.now = 10
+    assert cache.get("a") is MISSING
+    assert len(cache) == 0
+
+
+def test_falsy_values_are_cached():
+    cache = LRUCache()
+    cache.set("a", False)
+    assert cache.get("a") is False
+
+
+def test_invalidation():
+    cache = LRUCache()
+    cache.set(("user", "deck-1"), True)
+    cache.set(("user", "deck-2"), True)
+    cache.invalidate(("user", "deck-1"))
+    assert ("user", "deck-1") not in cache
+    cache.invalidate_where(lambda key: key[1] == "deck-2")
+    assert len(cache) == 0
+
+
+def test_stats():
+    cache = LRUCache()
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("a")
+    cache.get("a")
+    cache.get("b")
+    stats = cache.stats()
+    assert stats["hits"] == 3
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.75
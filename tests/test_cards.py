@@ -1,8 +1,15 @@
+import uuid
+
+import pytest
 from fastapi.testclient import TestClient
 from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
 from flashcards_server.api import cards
+from flashcards_server.bulk import resolve_tags
+from flashcards_server.changes import pending_changes
+from flashcards_server.database import Tag
 
 
 def test_get_cards_logged_out(
@@ -103,3 +110,68 @@ def test_delete_card_logged_out(
             f"/decks/{chemistry_deck.id}/cards/{carbon_card.id}"
         ).status_code
     )
+
+
+def test_create_cards_bulk(
+    session: Session, client: TestClient, chemistry_deck, fact, fact_carbon
+):
+    new_cards = [
+        cards.CardCreate(
+            question_id=fact.id,
+            answer_id=fact_carbon.id,
+            question_context_facts=[fact_carbon.id],
+            answer_context_facts=[],
+            tags=[{"name": "element"}, {"name": "gas"}],
+        ),
+        cards.CardCreate(
+            question_id=fact.id,
+            answer_id=uuid.uuid4(),
+            question_context_facts=[],
+            answer_context_facts=[],
+            tags=[],
+        ),
+        cards.CardCreate(
+            question_id=fact_carbon.id,
+            answer_id=fact.id,
+            question_context_facts=[],
+            answer_context_facts=[fact.id],
+            tags=[{"name": "element"}],
+        ),
+    ]
+    response = client.post(
+        f"/decks/{chemistry_deck.id}/cards:bulk", json=jsonable_encoder(new_cards)
+    )
+    assert response.status_code == 200
+    assert len(response.json()["created"]) == 2
+    assert [error["index"] for error in response.json()["errors"]] == [1]
+
+    response = client.get(f"/decks/{chemistry_deck.id}/cards")
+    assert response.status_code == 200
+    created = {card["id"]: card for card in response.json()}
+    assert len(created) == 2
+    tags = {tag["name"] for card in created.values() for tag in card["tags"]}
+    assert tags == {"element", "gas"}
+
+
+@pytest.mark.asyncio
+async def test_resolve_tags_creates_only_the_missing_tags(session: Session):
+    element = Tag(id=uuid.uuid4(), name="element")
+    session.add(element)
+    await session.commit()
+
+    tags = await resolve_tags(session, ["element", "gas", "gas"])
+    assert tags["element"] == element.id
+    assert set(tags) == {"element", "gas"}
+    assert await session.scalar(select(func.count()).select_from(Tag)) == 2
+    assert [change["object_id"] for change in pending_changes(session)] == [tags["gas"]]
+
+    session.info.pop("changes")
+    assert await resolve_tags(session, ["gas", "element"]) == tags
+    assert pending_changes(session) == []
+
+
+def test_create_cards_bulk_not_owned(
+    session: Session, another_client: TestClient, chemistry_deck
+):
+    response = another_client.post(f"/decks/{chemistry_deck.id}/cards:bulk", json=[])
+    assert response.status_code == 404
@@ -0,0 +1,64 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi import Request
+from sqlalchemy import func, insert, select, text
+
+from flashcards_core.database import Base
+
+from flashcards_server import database
+from flashcards_server.database import (
+    Tag,
+    create_session_maker,
+    dispose_engines,
+    get_async_session,
+    sqlite_performance_mode,
+)
+
+
+def test_sqlite_performance_mode():
+    assert sqlite_performance_mode("sqlite+aiosqlite:///./test.db")
+    assert not sqlite_performance_mode("sqlite+aiosqlite://")
+    assert not sqlite_performance_mode("sqlite+aiosqlite:///:memory:")
+    assert not sqlite_performance_mode("postgresql+asyncpg://localhost/flashcards")
+
+
+@pytest.mark.asyncio
+async def test_sqlite_concurrent_writes(tmpdir):
+    engine, make_session = create_session_maker(f"sqlite+aiosqlite:///{tmpdir}/w.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async def write():
+        async with make_session() as session:
+            await session.scalar(select(func.count()).select_from(Tag))
+            await session.execute(
+                insert(Tag), [{"id": uuid.uuid4(), "name": uuid.uuid4().hex}]
+            )
+            await session.commit()
+
+    await asyncio.gather(*[write() for _ in range(50)])
+
+    async with make_session() as session:
+        assert await session.scalar(select(func.count()).select_from(Tag)) == 50
+        assert (await session.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+    await dispose_engines(engine, make_session)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "method, writer",
+    [("GET", False), ("POST", True), ("PATCH", True), ("DELETE", True)],
+)
+async def test_requests_that_may_write_use_the_writer(
+    monkeypatch, tmpdir, method, writer
+):
+    engine, make_session = create_session_maker(f"sqlite+aiosqlite:///{tmpdir}/r.db")
+    monkeypatch.setattr(database, "async_session_maker", make_session)
+
+    request = Request({"type": "http", "method": method, "headers": []})
+    async for session in get_async_session(request):
+        # Before any write, the reads go to the writer only if the request may write
+        assert (session.get_bind() is engine.sync_engine) == writer
+    await dispose_engines(engine, make_session)
@@ -1,7 +1,11 @@
+import uuid
+
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 
 from flashcards_server.api import decks
+from flashcards_server.database import ownership_cache
+from flashcards_server.pagination import encode_cursor
 
 
 def test_endpoints_are_protected(logged_out_client: TestClient):
@@ -92,3 +96,71 @@ def test_delete_deck_logged_out(
     session: Session, logged_out_client: TestClient, chemistry_deck
 ):
     assert 401 == logged_out_client.delete(f"/decks/{chemistry_deck.id}").status_code
+
+
+def test_get_decks_paginated(
+    session: Session, client: TestClient, chemistry_deck, biology_deck
+):
+    response = client.get("/decks", params={"limit": 1})
+    assert response.status_code == 200
+    first_page = response.json()
+    assert len(first_page) == 1
+
+    response = client.get(
+        "/decks", params={"limit": 1, "cursor": response.headers["X-Next-Cursor"]}
+    )
+    assert response.status_code == 200
+    second_page = response.json()
+    assert len(second_page) == 1
+    assert second_page[0]["id"] != first_page[0]["id"]
+    assert {first_page[0]["id"], second_page[0]["id"]} == {
+        str(chemistry_deck.id),
+        str(biology_deck.id),
+    }
+
+    last_id = uuid.UUID(max(first_page[0]["id"], second_page[0]["id"]))
+    response = client.get("/decks", params={"cursor": encode_cursor(last_id)})
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_ownership_is_cached(session: Session, client: TestClient, chemistry_deck):
+    ownership_cache.clear()
+    for _ in range(5):
+        assert client.get(f"/decks/{chemistry_deck.id}").status_code == 200
+    assert ownership_cache.stats()["misses"] == 1
+    assert ownership_cache.stats()["hits"] == 4
+
+
+def test_ownership_cache_invalidated_on_delete(
+    session: Session, client: TestClient, chemistry_deck, user
+):
+    assert client.get(f"/decks/{chemistry_deck.id}").status_code == 200
+    assert (user.id, chemistry_deck.id) in ownership_cache
+
+    assert client.delete(f"/decks/{chemistry_deck.id}").status_code == 200
+    assert (user.id, chemistry_deck.id) not in ownership_cache
+    assert client.get(f"/decks/{chemistry_deck.id}").status_code == 404
+
+
+def test_get_decks_cursor(
+    session: Session, client: TestClient, chemistry_deck, biology_deck
+):
+    response = client.get("/decks", params={"limit": 1})
+    assert response.status_code == 200
+    first_page = response.json()
+    cursor = response.headers["X-Next-Cursor"]
+    assert "cursor=" in response.headers["Link"]
+
+    response = client.get("/decks", params={"limit": 1, "cursor": cursor})
+    assert response.status_code == 200
+    second_page = response.json()
+    assert "X-Next-Cursor" not in response.headers
+    assert {first_page[0]["id"], second_page[0]["id"]} == {
+        str(chemistry_deck.id),
+        str(biology_deck.id),
+    }
+
+
+def test_get_decks_invalid_cursor(session: Session, client: TestClient):
+    assert client.get("/decks", params={"cursor": "!"}).status_code == 400
@@ -0,0 +1,46 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from flashcards_server.due_queue import DueQueue
+
+
+def test_never_reviewed_cards_come_first():
+    reviewed, new = uuid.uuid4(), uuid.uuid4()
+    queue = DueQueue([(reviewed, datetime(2021, 1, 1)), (new, None)])
+    assert queue.peek() == new
+
+
+def test_push_reorders():
+    first, second = uuid.uuid4(), uuid.uuid4()
+    queue = DueQueue([(first, datetime(2021, 1, 1)), (second, datetime(2021, 1, 2))])
+    assert queue.peek() == first
+
+    queue.push(first, datetime(2021, 1, 3))
+    assert queue.peek() == second
+    assert queue.smallest(5) == [second, first]
+    assert len(queue) == 2
+
+
+def test_remove():
+    card = uuid.uuid4()
+    queue = DueQueue([(card, None)])
+    queue.remove(card)
+    assert queue.peek() is None
+    assert card not in queue
+
+
+def test_aware_and_naive_datetimes_compare():
+    naive, aware = uuid.uuid4(), uuid.uuid4()
+    now = datetime.now(timezone.utc)
+    queue = DueQueue([(naive, now.replace(tzinfo=None) - timedelta(hours=1))])
+    queue.push(aware, now)
+    assert queue.smallest(2) == [naive, aware]
+
+
+def test_stale_entries_are_compacted():
+    card = uuid.uuid4()
+    queue = DueQueue([(card, None)])
+    for day in range(1, 200):
+        queue.push(card, datetime(2021, 1, 1) + timedelta(days=day))
+    assert len(queue._heap) < 200
+    assert queue.smallest(3) == [card]
@@ -0,0 +1,76 @@
+import json
+import tracemalloc
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from flashcards_server.api.export import deck_lines
+from flashcards_server.database import Card
+
+
+def test_export_logged_out(
+    session: Session, logged_out_client: TestClient, chemistry_deck
+):
+    response = logged_out_client.get(f"/decks/{chemistry_deck.id}/export")
+    assert response.status_code == 401
+
+
+def test_export_not_owned(session: Session, another_client: TestClient, chemistry_deck):
+    response = another_client.get(f"/decks/{chemistry_deck.id}/export")
+    assert response.status_code == 404
+
+
+def test_export(
+    session: Session, client: TestClient, chemistry_deck, chemistry_cards, fact
+):
+    response = client.get(f"/decks/{chemistry_deck.id}/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["type"] == "decks"
+    assert lines[0]["data"]["id"] == str(chemistry_deck.id)
+
+    by_type = {}
+    for line in lines:
+        by_type.setdefault(line["type"], []).append(line["data"])
+    assert {card["id"] for card in by_type["cards"]} == {
+        str(card.id) for card in chemistry_cards
+    }
+    assert [f["id"] for f in by_type["facts"]] == [str(fact.id)]
+
+
+@pytest.mark.asyncio
+async def test_export_memory_is_bounded(session: Session, chemistry_deck, fact):
+    card_count = 100_000
+    for start in range(0, card_count, 10_000):
+        await session.execute(
+            insert(Card),
+            [
+                {
+                    "id": uuid.uuid4(),
+                    "deck_id": chemistry_deck.id,
+                    "question_id": fact.id,
+                    "answer_id": fact.id,
+                }
+                for _ in range(start, start + 10_000)
+            ],
+        )
+    await session.commit()
+
+    exported_cards = 0
+    tracemalloc.start()
+    try:
+        async for chunk in deck_lines(session=session, deck_id=chemistry_deck.id):
+            exported_cards += chunk.count(b'"type": "cards"')
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert exported_cards == card_count
+    # The whole export is about 20MB: streaming must keep only a few
+    # batches of rows in memory at any time.
+    assert peak < 8 * 1024 * 1024
@@ -0,0 +1,128 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+
+def test_endpoints_are_protected(logged_out_client: TestClient):
+    assert 401 == logged_out_client.get("/facts/").status_code
+
+
+def test_get_facts(session: Session, client: TestClient, fact, fact_carbon):
+    response = client.get("/facts/")
+    assert response.status_code == 200
+    assert {f["id"] for f in response.json()} == {str(fact.id), str(fact_carbon.id)}
+
+
+def test_get_fact(session: Session, client: TestClient, fact):
+    response = client.get(f"/facts/{fact.id}")
+    assert response.status_code == 200
+    assert response.json()["value"] == fact.value
+
+
+def test_get_fact_not_found(session: Session, client: TestClient):
+    response = client.get(f"/facts/{uuid.uuid4()}")
+    assert response.status_code == 404
+
+
+def test_get_facts_by_tag(session: Session, client: TestClient, fact, fact_carbon):
+    response = client.put(f"/facts/{fact.id}/tags/element")
+    assert response.status_code == 200
+    assert [tag["name"] for tag in response.json()["tags"]] == ["element"]
+
+    response = client.get("/facts/tag/element")
+    assert response.status_code == 200
+    assert [f["id"] for f in response.json()] == [str(fact.id)]
+
+
+def test_get_facts_cursor(session: Session, client: TestClient, fact, fact_carbon):
+    response = client.get("/facts/", params={"limit": 1})
+    assert response.status_code == 200
+    first_page = response.json()
+    next_url = response.headers["Link"].split(">")[0].lstrip("<")
+
+    response = client.get(next_url)
+    assert response.status_code == 200
+    second_page = response.json()
+    assert "Link" not in response.headers
+    assert {first_page[0]["id"], second_page[0]["id"]} == {
+        str(fact.id),
+        str(fact_carbon.id),
+    }
+
+
+@pytest.mark.parametrize("path", ["/facts/", "/facts/search?q=oxygen", "/tags/"])
+def test_empty_pages_are_rejected(session: Session, client: TestClient, fact, path):
+    response = client.get(path, params={"limit": 0})
+    assert response.status_code == 422
+
+
+def search(client: TestClient, query: str, **params) -> list:
+    response = client.get("/facts/search", params={"q": query, **params})
+    assert response.status_code == 200
+    return [f["value"] for f in response.json()]
+
+
+def add_fact(client: TestClient, value: str) -> str:
+    response = client.post(
+        "/facts/",
+        json={"value": value, "format": "text", "tags": [], "related": []},
+    )
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def test_search_facts(session: Session, client: TestClient):
+    add_fact(client, "Oxygen is a gas")
+    add_fact(client, "Oxygen, oxygen and more oxygen")
+    add_fact(client, "Carbon is a solid")
+    # All the words must match, the most relevant facts first
+    assert search(client, "oxygen") == [
+        "Oxygen, oxygen and more oxygen",
+        "Oxygen is a gas",
+    ]
+    assert search(client, "is oxygen") == ["Oxygen is a gas"]
+    assert search(client, "nitrogen") == []
+
+
+def test_search_facts_follows_changes(session: Session, client: TestClient):
+    fact_id = add_fact(client, "Oxygen")
+    assert search(client, "oxygen") == ["Oxygen"]
+
+    response = client.patch(
+        f"/facts/{fact_id}", json={"value": "Nitrogen", "format": "text"}
+    )
+    assert response.status_code == 200
+    assert search(client, "oxygen") == []
+    assert search(client, "nitrogen") == ["Nitrogen"]
+
+    assert client.delete(f"/facts/{fact_id}").status_code == 200
+    assert search(client, "nitrogen") == []
+
+
+def test_search_facts_syntax_is_not_parsed(session: Session, client: TestClient):
+    add_fact(client, 'The "noble" gases')
+    assert search(client, '"noble') == ['The "noble" gases']
+    assert search(client, "noble OR NOT * (") == []
+    assert search(client, "!!!") == []
+
+
+def test_search_facts_pages(session: Session, client: TestClient):
+    for index in range(3):
+        add_fact(client, f"Oxygen {index}")
+    response = client.get("/facts/search", params={"q": "oxygen", "limit": 2})
+    assert len(response.json()) == 2
+    next_url = response.headers["Link"].split(">")[0].lstrip("<")
+
+    response = client.get(next_url)
+    assert len(response.json()) == 1
+    assert "Link" not in response.headers
+
+
+def test_search_facts_needs_a_word(session: Session, client: TestClient):
+    assert client.get("/facts/search", params={"q": " "}).status_code == 400
+
+
+def test_search_facts_is_protected(logged_out_client: TestClient):
+    assert logged_out_client.get("/facts/search?q=oxygen").status_code == 401
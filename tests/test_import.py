@@ -0,0 +1,101 @@
+import json
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+
+def test_import_logged_out(
+    session: Session, logged_out_client: TestClient, chemistry_deck
+):
+    response = logged_out_client.post(f"/decks/{chemistry_deck.id}/import", content="")
+    assert response.status_code == 401
+
+
+def test_import_not_owned(session: Session, another_client: TestClient, chemistry_deck):
+    response = another_client.post(f"/decks/{chemistry_deck.id}/import", content="")
+    assert response.status_code == 404
+
+
+def test_import_ndjson(session: Session, client: TestClient, chemistry_deck):
+    lines = [
+        {"value": "Helium", "tags": ["element"]},
+        {
+            "question": {"value": "H"},
+            "answer": {"value": "Hydrogen", "tags": ["element"]},
+            "tags": ["symbols"],
+        },
+        {"question": {"value": "He"}, "answer": {"value": "Helium"}},
+        "not an object",
+    ]
+    body = "\n".join(json.dumps(line) for line in lines) + "\nnot json\n"
+
+    response = client.post(
+        f"/decks/{chemistry_deck.id}/import", params={"chunk_size": 2}, content=body
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert report["lines"] == 5
+    assert report["cards"] == 2
+    assert [error["line"] for error in report["errors"]] == [4, 5]
+
+    response = client.get(f"/decks/{chemistry_deck.id}/cards")
+    assert response.status_code == 200
+    questions = {card["question"]["value"] for card in response.json()}
+    assert questions == {"H", "He"}
+
+    response = client.get("/facts/tag/element")
+    assert {fact["value"] for fact in response.json()} == {"Helium", "Hydrogen"}
+
+
+def test_import_csv(session: Session, client: TestClient, chemistry_deck):
+    body = "question,answer,tags\nO,Oxygen,element;gas\nC,Carbon,\n"
+    response = client.post(
+        f"/decks/{chemistry_deck.id}/import",
+        content=body,
+        headers={"content-type": "text/csv"},
+    )
+    assert response.status_code == 200
+    assert response.json()["cards"] == 2
+    assert response.json()["facts"] == 4
+
+    response = client.get(f"/decks/{chemistry_deck.id}/cards")
+    tags = {tag["name"] for card in response.json() for tag in card["tags"]}
+    assert tags == {"element", "gas"}
+
+
+def test_import_csv_bad_header(session: Session, client: TestClient, chemistry_deck):
+    response = client.post(
+        f"/decks/{chemistry_deck.id}/import",
+        params={"file_format": "csv"},
+        content="front,back\na,b\n",
+    )
+    assert response.status_code == 400
+
+
+def test_import_csv_short_row(session: Session, client: TestClient, chemistry_deck):
+    body = "question,answer,tags\nO,Oxygen,gas\nC\nN,Nitrogen,gas\n"
+    response = client.post(
+        f"/decks/{chemistry_deck.id}/import",
+        params={"chunk_size": 1},
+        content=body,
+        headers={"content-type": "text/csv"},
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert report["cards"] == 2
+    assert [error["line"] for error in report["errors"]] == [3]
+
+
+def test_import_ends_the_transaction_before_reading_the_body(
+    session: Session, client: TestClient, chemistry_deck
+):
+    in_transaction = []
+
+    def body():
+        # The deck was checked, but no connection is held while uploading
+        in_transaction.append(session.in_transaction())
+        yield json.dumps({"value": "Helium"}).encode() + b"\n"
+
+    response = client.post(f"/decks/{chemistry_deck.id}/import", content=body())
+    assert response.status_code == 200
+    assert in_transaction == [False]
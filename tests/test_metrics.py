@@ -0,0 +1,100 @@
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from flashcards_server import app as app_module
+from flashcards_server.metrics import (
+    Metrics,
+    RequestTimings,
+    after_cursor_execute,
+    before_cursor_execute,
+    current_timings,
+    cache_serialization,
+)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.info = {}
+
+
+def test_statements_are_counted_in_the_current_request():
+    connection = FakeConnection()
+    before_cursor_execute(connection, None, "SELECT 1", (), None, False)
+    after_cursor_execute(connection, None, "SELECT 1", (), None, False)
+
+    timings = RequestTimings()
+    token = current_timings.set(timings)
+    try:
+        for _ in range(3):
+            before_cursor_execute(connection, None, "SELECT 1", (), None, False)
+            after_cursor_execute(connection, None, "SELECT 1", (), None, False)
+        with cache_serialization():
+            pass
+    finally:
+        current_timings.reset(token)
+    assert timings.statements == 3
+    assert timings.db_seconds > 0
+    assert timings.cache_serialization_seconds > 0
+
+
+def test_render():
+    metrics = Metrics(buckets=(0.1, 1.0), slow_seconds=0)
+    timings = RequestTimings()
+    timings.statements = 2
+    metrics.record("GET", "/decks/{deck_id}", 200, 0.05, timings)
+    metrics.record("GET", "/decks/{deck_id}", 404, 0.5, timings)
+
+    text = metrics.render(caches={"token": {"hits": 3, "misses": 1, "size": 1}})
+    labels = 'method="GET",route="/decks/{deck_id}"'
+    assert f'flashcards_http_requests_total{{{labels},status="404"}} 1' in text
+    assert (
+        f'flashcards_http_request_duration_seconds_bucket{{{labels},le="0.1"}} 1'
+        in text
+    )
+    assert (
+        f'flashcards_http_request_duration_seconds_bucket{{{labels},le="1.0"}} 2'
+        in text
+    )
+    assert f"flashcards_http_request_duration_seconds_count{{{labels}}} 2" in text
+    assert f"flashcards_http_request_db_statements_total{{{labels}}} 4" in text
+    assert 'flashcards_cache_hits_total{cache="token"} 3' in text
+    assert "flashcards_cache_saved_seconds_total" not in text
+
+
+def test_slow_requests_are_logged(caplog: pytest.LogCaptureFixture):
+    metrics = Metrics(slow_seconds=1)
+    with caplog.at_level(logging.WARNING, logger="flashcards_server.metrics"):
+        metrics.record("GET", "/facts", 200, 0.5, RequestTimings())
+        metrics.record("GET", "/facts", 200, 2, RequestTimings())
+    assert len(caplog.records) == 1
+    assert '"route": "/facts"' in caplog.records[0].getMessage()
+
+
+def test_metrics_endpoint(session: Session, client: TestClient, chemistry_deck):
+    assert client.get(f"/decks/{chemistry_deck.id}").status_code == 200
+    client.get("/no/such/route")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'route="/decks/{deck_id}",status="200"' in text
+    assert 'route="<unmatched>",status="404"' in text
+    assert 'flashcards_cache_hits_total{cache="token"}' in text
+    assert "# TYPE flashcards_http_request_cache_serialization_seconds_total" in text
+
+
+def test_metrics_token(monkeypatch, session: Session, logged_out_client: TestClient):
+    monkeypatch.setattr(app_module, "METRICS_TOKEN", "secret")
+    assert logged_out_client.get("/metrics").status_code == 401
+    response = logged_out_client.get(
+        "/metrics", headers={"Authorization": "Bearer wrong"}
+    )
+    assert response.status_code == 401
+    response = logged_out_client.get(
+        "/metrics", headers={"Authorization": "Bearer secret"}
+    )
+    assert response.status_code == 200
@@ -0,0 +1,139 @@
+import uuid
+from argparse import Namespace
+
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, inspect, text
+
+from flashcards_server.database import (
+    SCHEMA_HEAD,
+    Base,
+    SCHEMA_INDEXES,
+    create_schema,
+    schema_revision,
+)
+from flashcards_server.search import is_search_object
+
+
+def alembic_config(url: str) -> Config:
+    return Config("alembic.ini", cmd_opts=Namespace(x=[f"url={url}"]))
+
+
+def index_names(connection) -> set:
+    inspector = inspect(connection)
+    return {
+        index["name"]
+        for table in inspector.get_table_names()
+        for index in inspector.get_indexes(table)
+    }
+
+
+def test_schema_head_is_the_latest_revision():
+    script = ScriptDirectory.from_config(Config("alembic.ini"))
+    assert script.get_current_head() == SCHEMA_HEAD
+
+
+def test_create_schema_stamps_head(tmpdir):
+    engine = create_engine(f"sqlite:///{tmpdir}/schema.db")
+    with engine.begin() as connection:
+        assert schema_revision(connection) is None
+        create_schema(connection)
+    with engine.connect() as connection:
+        assert schema_revision(connection) == SCHEMA_HEAD
+        assert {index.name for index in SCHEMA_INDEXES} <= index_names(connection)
+
+
+@pytest.mark.parametrize("revision", ["base", "head"])
+def test_upgrade_and_downgrade(tmpdir, revision):
+    url = f"sqlite+aiosqlite:///{tmpdir}/migrations.db"
+    config = alembic_config(url)
+    command.upgrade(config, "head")
+    command.downgrade(config, revision)
+    command.upgrade(config, "head")
+
+    engine = create_engine(f"sqlite:///{tmpdir}/migrations.db")
+    with engine.connect() as connection:
+        assert schema_revision(connection) == SCHEMA_HEAD
+        assert {index.name for index in SCHEMA_INDEXES} <= index_names(connection)
+
+
+def test_autogenerate_keeps_the_search_index(tmpdir):
+    command.upgrade(alembic_config(f"sqlite+aiosqlite:///{tmpdir}/search.db"), "head")
+    engine = create_engine(f"sqlite:///{tmpdir}/search.db")
+    with engine.connect() as connection:
+        assert "fact_search" in inspect(connection).get_table_names()
+        context = MigrationContext.configure(
+            connection,
+            opts={
+                "include_name": lambda name, type_, parents: not is_search_object(
+                    name, type_
+                )
+            },
+        )
+        diff = compare_metadata(context, Base.metadata)
+    assert not [change for change in diff if "fact_search" in str(change)]
+
+
+def test_baseline_creates_the_baseline_tables_only(tmpdir):
+    command.upgrade(
+        alembic_config(f"sqlite+aiosqlite:///{tmpdir}/base.db"), "2c4f6a8e1d35"
+    )
+    engine = create_engine(f"sqlite:///{tmpdir}/base.db")
+    with engine.connect() as connection:
+        tables = set(inspect(connection).get_table_names())
+        assert {
+            "decks",
+            "cards",
+            "facts",
+            "tags",
+            "reviews",
+            "users",
+            "deck_owners",
+        } <= tables
+        assert "change_log" not in tables
+        assert not [table for table in tables if is_search_object(table, "table")]
+        assert not {index.name for index in SCHEMA_INDEXES} & index_names(connection)
+
+
+def test_migrations_match_the_models(tmpdir):
+    # The migrations are frozen: a change to the models needs a new revision
+    command.upgrade(alembic_config(f"sqlite+aiosqlite:///{tmpdir}/models.db"), "head")
+    engine = create_engine(f"sqlite:///{tmpdir}/models.db")
+    with engine.connect() as connection:
+        context = MigrationContext.configure(
+            connection,
+            opts={
+                "include_name": lambda name, type_, parents: not is_search_object(
+                    name, type_
+                )
+                and name != "alembic_version"
+            },
+        )
+        assert compare_metadata(context, Base.metadata) == []
+
+
+def test_change_log_of_existing_objects(tmpdir):
+    url = f"sqlite+aiosqlite:///{tmpdir}/changes.db"
+    command.upgrade(alembic_config(url), "5b1e7d0c9a42")
+    engine = create_engine(f"sqlite:///{tmpdir}/changes.db")
+    deck_id, card_id = uuid.uuid4().hex, uuid.uuid4().hex
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO decks (id) VALUES (:id)"), {"id": deck_id})
+        connection.execute(
+            text("INSERT INTO cards (id, deck_id) VALUES (:id, :deck_id)"),
+            {"id": card_id, "deck_id": deck_id},
+        )
+
+    command.upgrade(alembic_config(url), "head")
+    with engine.connect() as connection:
+        rows = connection.execute(
+            text("SELECT kind, object_id, deck_id, deleted FROM change_log")
+        ).all()
+    assert sorted(rows) == [
+        ("card", card_id, deck_id, 0),
+        ("deck", deck_id, deck_id, 0),
+    ]
@@ -0,0 +1,103 @@
+import json
+from typing import List
+
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from flashcards_server.openapi import (
+    FINGERPRINT_KEY,
+    generate_schema,
+    load_schema,
+    routes_fingerprint,
+    serve_schema,
+)
+
+
+def small_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items")
+    def get_items():
+        return []
+
+    return app
+
+
+def test_openapi_etag_and_gzip(client: TestClient):
+    response = client.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "paths" in response.json()
+
+    etag = response.headers["ETag"]
+    response = client.get("/openapi.json", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_load_schema(tmpdir):
+    app = small_app()
+    path = tmpdir / "spec.json"
+    path.write_text(json.dumps(generate_schema(app)), "utf-8")
+
+    assert load_schema(app=app, path=str(path))
+    assert app.openapi()[FINGERPRINT_KEY] == routes_fingerprint(app)
+
+
+def test_load_stale_schema(tmpdir):
+    app = small_app()
+    path = tmpdir / "spec.json"
+    path.write_text(json.dumps(generate_schema(app)), "utf-8")
+
+    @app.get("/other-items")
+    def get_other_items():
+        return []
+
+    assert not load_schema(app=app, path=str(path))
+    assert not load_schema(app=app, path=str(tmpdir / "missing.json"))
+
+
+def test_load_invalid_schema(tmpdir):
+    app = small_app()
+    path = tmpdir / "spec.json"
+    path.write_text('{"openapi": "3.1.0", "paths": {', "utf-8")
+
+    # Generated again on first use
+    assert not load_schema(app=app, path=str(path))
+    assert app.openapi_schema is None
+
+
+def test_fingerprint_of_the_models():
+    class Item(BaseModel):
+        name: str
+
+    class ItemWithPrice(BaseModel):
+        name: str
+        price: float
+
+    def app_with(model, version: str = "1.0") -> FastAPI:
+        router = APIRouter(prefix="/items")
+
+        @router.get("/", response_model=List[model])
+        def get_items():
+            return []
+
+        app = FastAPI(version=version)
+        app.include_router(router)
+        return app
+
+    fingerprint = routes_fingerprint(app_with(Item))
+    assert routes_fingerprint(app_with(Item)) == fingerprint
+    assert routes_fingerprint(app_with(ItemWithPrice)) != fingerprint
+    assert routes_fingerprint(app_with(Item, version="1.1")) != fingerprint
+
+
+def test_serve_loaded_schema(tmpdir):
+    app = small_app()
+    path = tmpdir / "spec.json"
+    path.write_text(json.dumps(generate_schema(app)), "utf-8")
+    serve_schema(app, path=str(path))
+
+    response = TestClient(app).get("/openapi.json")
+    assert response.status_code == 200
+    assert FINGERPRINT_KEY in response.json()
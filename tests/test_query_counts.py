@@ -0,0 +1,146 @@
+"""
+The list endpoints must issue a fixed number of SQL statements, whatever
+the number of rows they return: eager-load the relationships instead of
+querying them row by row.
+"""
+
+import uuid
+from typing import Callable, List
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from flashcards_server import response_cache
+from flashcards_server.database import ownership_cache
+
+#: Loose ceiling on the statements of a list endpoint. The real guard is
+#: that the count doesn't grow with the number of rows.
+MAX_LIST_QUERIES = 12
+
+
+def list_statements(client: TestClient, queries, url: str) -> List[str]:
+    """
+    :returns: the statements issued by ``GET url``, with cold caches.
+    """
+    response_cache.backend.responses.clear()
+    ownership_cache.clear()
+    with queries.count() as statements:
+        response = client.get(url)
+    assert response.status_code == 200
+    return statements
+
+
+def assert_constant_queries(
+    client: TestClient, queries, url: str, add_rows: Callable[[int], None]
+) -> None:
+    """
+    Check that ``GET url`` issues as many statements for 6 rows as for 1.
+
+    :param add_rows: creates the given number of rows listed by ``url``.
+    """
+    add_rows(1)
+    few = list_statements(client=client, queries=queries, url=url)
+    add_rows(5)
+    many = list_statements(client=client, queries=queries, url=url)
+    assert len(many) <= len(few), "\n".join(many)
+    assert len(many) <= MAX_LIST_QUERIES, "\n".join(many)
+
+
+def add_facts(client: TestClient, count: int) -> List[str]:
+    ids = []
+    for _ in range(count):
+        response = client.post(
+            "/facts/",
+            json={
+                "value": "Oxygen",
+                "format": "text",
+                "tags": [{"name": "element"}, {"name": uuid.uuid4().hex}],
+                "related": [{"value": "O", "format": "text"}],
+            },
+        )
+        assert response.status_code == 200
+        ids.append(response.json()["id"])
+    return ids
+
+
+def relate_facts(client: TestClient, fact_id: str, related_id: str) -> None:
+    response = client.put(
+        f"/facts/{fact_id}/related/",
+        params={"related_fact_id": related_id, "relationship": "symbol"},
+    )
+    assert response.status_code == 200
+
+
+def test_query_counter(session: Session, client: TestClient, queries, chemistry_deck):
+    response_cache.backend.responses.clear()
+    with queries.count() as outer:
+        with queries.count() as inner:
+            client.get("/decks")
+        client.get(f"/decks/{chemistry_deck.id}/cards")
+    assert 0 < len(inner) < len(outer)
+
+
+def test_decks(session: Session, client: TestClient, queries):
+    def add_decks(count: int) -> None:
+        for _ in range(count):
+            response = client.post(
+                "/decks/",
+                json={
+                    "name": "Chemistry",
+                    "description": "Chemistry cards",
+                    "algorithm": "random",
+                    "parameters": {},
+                    "tags": [{"name": "science"}],
+                },
+            )
+            assert response.status_code == 200
+
+    assert_constant_queries(client, queries, "/decks", add_decks)
+
+
+def test_cards(session: Session, client: TestClient, queries, chemistry_deck):
+    def add_cards(count: int) -> None:
+        for question_id, answer_id in zip(
+            add_facts(client, count), add_facts(client, count)
+        ):
+            relate_facts(client, question_id, answer_id)
+            response = client.post(
+                f"/decks/{chemistry_deck.id}/cards",
+                json={
+                    "question_id": question_id,
+                    "answer_id": answer_id,
+                    "question_context_facts": [answer_id],
+                    "answer_context_facts": [question_id],
+                    "tags": [{"name": "chemistry"}],
+                },
+            )
+            assert response.status_code == 200
+
+    assert_constant_queries(
+        client, queries, f"/decks/{chemistry_deck.id}/cards", add_cards
+    )
+
+
+@pytest.mark.parametrize("url", ["/facts/", "/facts/tag/element", "/tags/"])
+def test_facts_and_tags(session: Session, client: TestClient, queries, url: str):
+    assert_constant_queries(
+        client, queries, url, lambda count: add_facts(client, count)
+    )
+
+
+def test_related_facts(session: Session, client: TestClient, queries):
+    def add_related_facts(count: int) -> None:
+        for fact_id, related_id in zip(
+            add_facts(client, count), add_facts(client, count)
+        ):
+            relate_facts(client, fact_id, related_id)
+
+    assert_constant_queries(client, queries, "/facts/", add_related_facts)
+    related = [
+        related
+        for fact in client.get("/facts/").json()
+        for related in fact["related_facts"]
+    ]
+    assert len(related) == 6
+    assert all("element" in {tag["name"] for tag in fact["tags"]} for fact in related)
@@ -0,0 +1,125 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from flashcards_server import response_cache
+from flashcards_server.response_cache import MemoryBackend
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_versions():
+    backend = MemoryBackend(maxsize=10, ttl=None)
+    deck, facts = await backend.get_versions(["deck:1", "facts"])
+    assert deck != facts
+    assert await backend.get_versions(["deck:1", "facts"]) == [deck, facts]
+    await backend.bump(["deck:1"])
+    await backend.bump(["deck:1", "facts"])
+    new_deck, new_facts = await backend.get_versions(["deck:1", "facts"])
+    assert len({deck, facts, new_deck, new_facts}) == 4
+
+    # The versions are bounded: an evicted version gets a new number
+    await backend.get_versions([f"deck:{index}" for index in range(2, 12)])
+    assert len(backend.versions) == 10
+    assert await backend.get_versions(["deck:1"]) != [new_deck]
+
+    await backend.set("key", b"value")
+    assert await backend.get("key") == b"value"
+    assert await backend.get("other") is None
+
+
+def test_get_cards_is_cached(
+    session: Session, client: TestClient, chemistry_deck, chemistry_cards
+):
+    responses = response_cache.backend.responses
+    url = f"/decks/{chemistry_deck.id}/cards"
+
+    first = client.get(url)
+    hits = responses.hits
+    second = client.get(url)
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert responses.hits == hits + 1
+
+
+def test_get_card_cache_invalidated_on_tag(
+    session: Session, client: TestClient, chemistry_deck, carbon_card
+):
+    url = f"/decks/{chemistry_deck.id}/cards/{carbon_card.id}"
+    assert client.get(url).json()["tags"] == []
+
+    assert client.put(f"{url}/tags/element").status_code == 200
+    assert [tag["name"] for tag in client.get(url).json()["tags"]] == ["element"]
+
+
+def test_get_fact_cache_invalidated_on_tag(session: Session, client: TestClient, fact):
+    assert client.get(f"/facts/{fact.id}").json()["tags"] == []
+
+    assert client.put(f"/facts/{fact.id}/tags/element").status_code == 200
+    response = client.get(f"/facts/{fact.id}")
+    assert [tag["name"] for tag in response.json()["tags"]] == ["element"]
+
+
+def test_get_card_not_found_is_not_cached(
+    session: Session, client: TestClient, chemistry_deck, carbon_card
+):
+    url = f"/decks/{chemistry_deck.id}/cards/{carbon_card.id}"
+    assert client.delete(url).status_code == 200
+    assert client.get(url).status_code == 404
+
+
+def test_get_decks_not_modified(session: Session, client: TestClient, chemistry_deck):
+    first = client.get("/decks")
+    etag = first.headers["etag"]
+    second = client.get("/decks", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.headers["etag"] == etag
+    assert not second.content
+
+    assert (
+        client.patch(
+            f"/decks/{chemistry_deck.id}", json={"description": "changed"}
+        ).status_code
+        == 200
+    )
+    third = client.get("/decks", headers={"If-None-Match": etag})
+    assert third.status_code == 200
+    assert third.headers["etag"] != etag
+
+
+def test_get_cards_not_modified_skips_render(
+    session: Session, client: TestClient, chemistry_deck, chemistry_cards
+):
+    responses = response_cache.backend.responses
+    url = f"/decks/{chemistry_deck.id}/cards"
+    etag = client.get(url).headers["etag"]
+
+    hits, misses = responses.hits, responses.misses
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert (responses.hits, responses.misses) == (hits, misses)
+
+
+def test_get_facts_etag_changes_on_write(session: Session, client: TestClient, fact):
+    etag = client.get("/facts/").headers["etag"]
+    assert client.get("/facts/", headers={"If-None-Match": etag}).status_code == 304
+
+    assert client.put(f"/facts/{fact.id}/tags/element").status_code == 200
+    assert client.get("/facts/", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_study_results_keep_the_cards_cached(
+    session: Session, client: TestClient, chemistry_deck, chemistry_cards
+):
+    url = f"/decks/{chemistry_deck.id}/cards"
+    cards_etag = client.get(url).headers["etag"]
+    decks_etag = client.get("/decks").headers["etag"]
+
+    card_id = client.get(f"/study/{chemistry_deck.id}/start").json()["id"]
+    response = client.post(
+        f"/study/{chemistry_deck.id}/next", json={"card_id": card_id, "result": True}
+    )
+    assert response.status_code == 200
+    assert client.get(url, headers={"If-None-Match": cards_etag}).status_code == 304
+    # The state of the deck changed
+    assert (
+        client.get("/decks", headers={"If-None-Match": decks_etag}).status_code == 200
+    )
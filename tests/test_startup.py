@@ -0,0 +1,20 @@
+from flashcards_server.startup import StartupProfile
+
+
+def test_startup_profile_report(capsys):
+    profile = StartupProfile(enabled=True)
+    with profile.step("import something"):
+        pass
+    profile.report()
+    output = capsys.readouterr().err
+    assert "import something" in output
+    assert "total" in output
+
+
+def test_startup_profile_disabled(capsys):
+    profile = StartupProfile(enabled=False)
+    with profile.step("import something"):
+        pass
+    profile.report()
+    assert profile.steps == []
+    assert capsys.readouterr().err == ""
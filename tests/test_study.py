@@ -0,0 +1,238 @@
+import asyncio
+import uuid
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from flashcards_server import due_queue
+from flashcards_server.api import study
+from flashcards_server.database import Review
+from flashcards_server.schedulers import scheduler_cache, using_schedulers
+
+
+def test_endpoints_are_protected(
+    session: Session, logged_out_client: TestClient, chemistry_deck
+):
+    response = logged_out_client.get(f"/study/{chemistry_deck.id}/start")
+    assert response.status_code == 401
+
+
+def test_first_card(
+    session: Session, client: TestClient, chemistry_deck, chemistry_cards
+):
+    response = client.get(f"/study/{chemistry_deck.id}/start")
+    assert response.status_code == 200
+    assert response.json()["id"] in [str(card.id) for card in chemistry_cards]
+
+
+def test_first_card_not_owned(
+    session: Session, another_client: TestClient, chemistry_deck, chemistry_cards
+):
+    response = another_client.get(f"/study/{chemistry_deck.id}/start")
+    assert response.status_code == 404
+
+
+def test_next_card(
+    session: Session, client: TestClient, chemistry_deck, chemistry_cards
+):
+    card_id = client.get(f"/study/{chemistry_deck.id}/start").json()["id"]
+    response = client.post(
+        f"/study/{chemistry_deck.id}/next", json={"card_id": card_id, "result": True}
+    )
+    assert response.status_code == 200
+    assert response.json()["id"] in [str(card.id) for card in chemistry_cards]
+
+
+def test_next_card_wrong_card(
+    session: Session, client: TestClient, chemistry_deck, chemistry_cards
+):
+    response = client.post(
+        f"/study/{chemistry_deck.id}/next",
+        json={"card_id": str(uuid.uuid4()), "result": True},
+    )
+    assert response.status_code == 404
+
+
+def test_scheduler_is_cached(
+    session: Session, client: TestClient, chemistry_deck, chemistry_cards
+):
+    client.get(f"/study/{chemistry_deck.id}/start")
+    _, scheduler = scheduler_cache.peek(chemistry_deck.id)
+
+    client.get(f"/study/{chemistry_deck.id}/start")
+    assert scheduler_cache.peek(chemistry_deck.id)[1] is scheduler
+
+    client.patch(f"/decks/{chemistry_deck.id}", json={"parameters": {"a": 1}})
+    assert chemistry_deck.id not in scheduler_cache
+
+
+def test_study_with_due_queue(
+    monkeypatch, session: Session, client: TestClient, chemistry_deck, chemistry_cards
+):
+    monkeypatch.setattr(due_queue, "DUE_QUEUE_ALGORITHMS", {"random"})
+
+    first_id = client.get(f"/study/{chemistry_deck.id}/start").json()["id"]
+    assert chemistry_deck.id in due_queue.due_queues
+
+    response = client.post(
+        f"/study/{chemistry_deck.id}/next", json={"card_id": first_id, "result": True}
+    )
+    assert response.status_code == 200
+    second_id = response.json()["id"]
+    assert second_id != first_id
+
+    response = client.post(
+        f"/study/{chemistry_deck.id}/next", json={"card_id": second_id, "result": True}
+    )
+    assert response.json()["id"] == first_id
+
+
+def test_next_cards_batch(
+    session: Session, client: TestClient, chemistry_deck, chemistry_cards
+):
+    results = [
+        {"card_id": str(card.id), "result": True, "timestamp": "2024-05-01T12:00:00Z"}
+        for card in chemistry_cards
+    ]
+    response = client.post(
+        f"/study/{chemistry_deck.id}/next:batch", params={"count": 2}, json=results
+    )
+    assert response.status_code == 200
+    # Without a due queue, the scheduler only knows the next card
+    card_ids = [card["id"] for card in response.json()]
+    assert len(card_ids) == 1
+    assert set(card_ids) <= {str(card.id) for card in chemistry_cards}
+
+    # The client shares the session of the test: forget the reviews loaded
+    # with the cards before the results
+    urls = [
+        f"/decks/{chemistry_deck.id}/cards/{card.id}/reviews"
+        for card in chemistry_cards
+    ]
+    session.expire_all()
+    for url in urls:
+        reviews = client.get(url).json()
+        assert [review["datetime"] for review in reviews] == ["2024-05-01T12:00:00"]
+
+
+def test_next_cards_batch_wrong_card(
+    session: Session, client: TestClient, chemistry_deck, chemistry_cards
+):
+    results = [
+        {"card_id": str(chemistry_cards[0].id), "result": True},
+        {"card_id": str(uuid.uuid4()), "result": True},
+    ]
+    response = client.post(f"/study/{chemistry_deck.id}/next:batch", json=results)
+    assert response.status_code == 404
+
+    reviews = client.get(
+        f"/decks/{chemistry_deck.id}/cards/{chemistry_cards[0].id}/reviews"
+    ).json()
+    assert reviews == []
+
+
+def test_next_cards_batch_with_due_queue(
+    monkeypatch, session: Session, client: TestClient, chemistry_deck, chemistry_cards
+):
+    monkeypatch.setattr(due_queue, "DUE_QUEUE_ALGORITHMS", {"random"})
+    first_id = client.get(f"/study/{chemistry_deck.id}/start").json()["id"]
+
+    response = client.post(
+        f"/study/{chemistry_deck.id}/next:batch",
+        params={"count": 2},
+        json=[{"card_id": first_id, "result": True}],
+    )
+    assert [card["id"] for card in response.json()][-1] == first_id
+
+
+def test_first_card_without_lookahead(
+    session: Session, client: TestClient, chemistry_deck, chemistry_cards
+):
+    response = client.get(f"/study/{chemistry_deck.id}/start")
+    assert response.json()["lookahead"] is None
+
+
+def test_lookahead_with_due_queue(
+    monkeypatch, session: Session, client: TestClient, chemistry_deck, chemistry_cards
+):
+    monkeypatch.setattr(due_queue, "DUE_QUEUE_ALGORITHMS", {"random"})
+
+    first = client.get(
+        f"/study/{chemistry_deck.id}/start", params={"lookahead": 5}
+    ).json()
+    assert len(first["lookahead"]) == 1
+    assert first["lookahead"][0]["question"]["value"] == "Oxygen"
+
+    second = client.post(
+        f"/study/{chemistry_deck.id}/next",
+        params={"lookahead": 5},
+        json={"card_id": first["id"], "result": True},
+    ).json()
+    assert second["id"] == first["lookahead"][0]["id"]
+    assert [card["id"] for card in second["lookahead"]] == [first["id"]]
+
+
+def test_no_lookahead_without_due_queue(
+    session: Session, client: TestClient, chemistry_deck, chemistry_cards
+):
+    response = client.get(f"/study/{chemistry_deck.id}/start", params={"lookahead": 5})
+    assert response.status_code == 200
+    assert response.json()["lookahead"] is None
+
+
+def test_lookahead_of_empty_deck(
+    monkeypatch, session: Session, client: TestClient, chemistry_deck
+):
+    monkeypatch.setattr(due_queue, "DUE_QUEUE_ALGORITHMS", {"random"})
+    response = client.get(f"/study/{chemistry_deck.id}/start", params={"lookahead": 5})
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_schedulers_are_used_one_request_at_a_time():
+    deck_id, other_deck_id = uuid.uuid4(), uuid.uuid4()
+    events = []
+
+    async def study(name: str, deck_ids):
+        async with using_schedulers(deck_ids):
+            events.append(f"{name} start")
+            await asyncio.sleep(0.01)
+            events.append(f"{name} end")
+
+    await asyncio.gather(
+        study("first", [deck_id]),
+        study("second", [deck_id, other_deck_id]),
+    )
+    assert events == ["first start", "first end", "second start", "second end"]
+
+    # Other decks are not blocked
+    events.clear()
+    await asyncio.gather(study("first", [deck_id]), study("other", [other_deck_id]))
+    assert events[:2] == ["first start", "other start"]
+
+
+@pytest.mark.asyncio
+async def test_save_results_dates_added_reviews(
+    monkeypatch, session: Session, user, chemistry_deck, chemistry_cards
+):
+    def add_review(session: Session, deck, card, result) -> None:
+        # Added to the session, not flushed
+        session.add(Review(card_id=card.id, result=result, algorithm="random"))
+
+    monkeypatch.setattr(study, "_process_result", add_review)
+    timestamps = [datetime(2024, 5, 1, 12), datetime(2024, 5, 2, 12)]
+    await study.save_results(
+        session=session,
+        user=user,
+        results=[
+            (chemistry_deck, card, True, timestamp)
+            for card, timestamp in zip(chemistry_cards, timestamps)
+        ],
+    )
+    reviews = (await session.scalars(select(Review))).all()
+    assert {(review.card_id, review.datetime) for review in reviews} == {
+        (card.id, timestamp) for card, timestamp in zip(chemistry_cards, timestamps)
+    }
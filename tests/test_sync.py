@@ -0,0 +1,116 @@
+import uuid
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+
+def test_endpoints_are_protected(session: Session, logged_out_client: TestClient):
+    assert logged_out_client.get("/sync").status_code == 401
+    assert logged_out_client.post("/sync", json={"reviews": []}).status_code == 401
+
+
+def test_full_sync(session: Session, client: TestClient, chemistry_deck, carbon_card):
+    response = client.get("/sync")
+    assert response.status_code == 200
+    changes = response.json()
+    assert [deck["id"] for deck in changes["decks"]] == [str(chemistry_deck.id)]
+    assert [card["id"] for card in changes["cards"]] == [str(carbon_card.id)]
+    assert [fact["value"] for fact in changes["facts"]] == ["Oxygen"]
+    assert not changes["more"]
+
+    response = client.get("/sync", params={"since": changes["token"]})
+    assert response.json()["token"] == changes["token"]
+    assert response.json()["cards"] == []
+
+
+def test_sync_since_token(
+    session: Session, client: TestClient, chemistry_deck, chemistry_cards
+):
+    token = client.get("/sync").json()["token"]
+    carbon_card, oxygen_card = chemistry_cards
+    client.put(f"/decks/{chemistry_deck.id}/cards/{carbon_card.id}/tags/element")
+    client.delete(f"/decks/{chemistry_deck.id}/cards/{oxygen_card.id}")
+
+    changes = client.get("/sync", params={"since": token}).json()
+    assert changes["token"] > token
+    assert [card["id"] for card in changes["cards"]] == [str(carbon_card.id)]
+    assert [tag["name"] for tag in changes["tags"]] == ["element"]
+    assert changes["deleted"]["cards"] == [str(oxygen_card.id)]
+
+
+def test_sync_pages(session: Session, client: TestClient, chemistry_deck, carbon_card):
+    changes = client.get("/sync", params={"limit": 1}).json()
+    assert changes["more"]
+    next_changes = client.get(
+        "/sync", params={"since": changes["token"], "limit": 1}
+    ).json()
+    assert next_changes["token"] > changes["token"]
+
+
+def test_sync_of_another_user(
+    session: Session,
+    client: TestClient,
+    another_client: TestClient,
+    chemistry_deck,
+    carbon_card,
+):
+    changes = another_client.get("/sync").json()
+    assert changes["decks"] == []
+    assert changes["cards"] == []
+
+    client.delete(f"/decks/{chemistry_deck.id}")
+    assert another_client.get("/sync").json()["deleted"]["decks"] == []
+    assert client.get("/sync").json()["deleted"]["decks"] == [str(chemistry_deck.id)]
+
+
+def test_upload_reviews(
+    session: Session, client: TestClient, chemistry_deck, chemistry_cards
+):
+    token = client.get("/sync").json()["token"]
+    reviews = [
+        {"deck_id": str(chemistry_deck.id), "card_id": str(card.id), "result": True}
+        for card in chemistry_cards
+    ]
+    response = client.post("/sync", json={"reviews": reviews})
+    assert response.status_code == 200
+    assert response.json() == {"reviews": 2}
+
+    changes = client.get("/sync", params={"since": token}).json()
+    assert sorted(review["card_id"] for review in changes["reviews"]) == sorted(
+        str(card.id) for card in chemistry_cards
+    )
+
+
+def test_upload_reviews_is_atomic(
+    session: Session, client: TestClient, chemistry_deck, carbon_card
+):
+    token = client.get("/sync").json()["token"]
+    reviews = [
+        {
+            "deck_id": str(chemistry_deck.id),
+            "card_id": str(carbon_card.id),
+            "result": True,
+        },
+        {
+            "deck_id": str(chemistry_deck.id),
+            "card_id": str(uuid.uuid4()),
+            "result": True,
+        },
+    ]
+    response = client.post("/sync", json={"reviews": reviews})
+    assert response.status_code == 404
+    assert client.get("/sync", params={"since": token}).json()["reviews"] == []
+
+
+def test_upload_reviews_not_owned(
+    session: Session, another_client: TestClient, chemistry_deck, carbon_card
+):
+    reviews = [
+        {
+            "deck_id": str(chemistry_deck.id),
+            "card_id": str(carbon_card.id),
+            "result": True,
+        }
+    ]
+    response = another_client.post("/sync", json={"reviews": reviews})
+    assert response.status_code == 404
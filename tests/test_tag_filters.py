@@ -0,0 +1,149 @@
+import uuid
+from typing import Dict, List, Tuple
+
+import pytest
+from fastapi.testclient import TestClient
+from uuid import UUID
+from sqlalchemy.orm import Session
+
+from flashcards_server.pagination import encode_cursor
+from flashcards_server.tag_filters import TagBitmaps, TagFilter, tag_bitmaps
+
+
+def make_bitmaps(tags: Dict[str, List[str]]) -> Tuple[TagBitmaps, Dict[UUID, str]]:
+    """
+    :param tags: the tags of some objects, by name, in ID order.
+    :returns: the bitmaps of the objects, and their names by ID.
+    """
+    names = dict(zip(sorted(uuid.uuid4() for _ in tags), tags))
+    pairs = [
+        (object_id, tag)
+        for object_id, name in names.items()
+        for tag in tags[name] or [None]
+    ]
+    return TagBitmaps(pairs), names
+
+
+def test_tag_bitmaps():
+    bitmaps, names = make_bitmaps(
+        {
+            "oxygen": ["gas", "element"],
+            "iron": ["metal", "element"],
+            "water": ["liquid"],
+            "nothing": [],
+        }
+    )
+
+    def matching(**filters) -> List[str]:
+        page = bitmaps.page(TagFilter(**filters), cursor=None, offset=0, limit=100)
+        return [names[object_id] for object_id in page]
+
+    assert matching() == ["oxygen", "iron", "water", "nothing"]
+    assert matching(all_of=["element", "gas"]) == ["oxygen"]
+    assert matching(any_of=["gas", "liquid"]) == ["oxygen", "water"]
+    assert matching(none_of=["element"]) == ["water", "nothing"]
+    assert matching(all_of=["element"], none_of=["metal"]) == ["oxygen"]
+    assert matching(all_of=["unknown"]) == []
+
+
+def test_tag_bitmaps_pages():
+    bitmaps, names = make_bitmaps(
+        {str(index): ["even"] if index % 2 == 0 else [] for index in range(40)}
+    )
+    even = TagFilter(all_of=["even"])
+    expected = [object_id for object_id, name in names.items() if int(name) % 2 == 0]
+
+    # One more than the limit, to tell that there is a next page
+    first = bitmaps.page(even, cursor=None, offset=0, limit=15)
+    assert first == expected[:16]
+    second = bitmaps.page(even, cursor=encode_cursor(first[14]), offset=0, limit=15)
+    assert second == expected[15:]
+    assert bitmaps.page(even, cursor=None, offset=18, limit=15) == expected[18:]
+
+
+def add_fact(client: TestClient, value: str, tags: List[str]) -> str:
+    response = client.post(
+        "/facts/",
+        json={
+            "value": value,
+            "format": "text",
+            "tags": [{"name": name} for name in tags],
+            "related": [],
+        },
+    )
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def test_filter_facts(session: Session, client: TestClient):
+    add_fact(client, "Oxygen", ["gas", "element"])
+    add_fact(client, "Iron", ["metal", "element"])
+    add_fact(client, "Water", ["liquid"])
+
+    def values(**params) -> List[str]:
+        response = client.get("/facts/", params=params)
+        assert response.status_code == 200
+        return sorted(fact["value"] for fact in response.json())
+
+    assert values(tags_all=["element", "gas"]) == ["Oxygen"]
+    assert values(tags_any=["gas", "liquid"]) == ["Oxygen", "Water"]
+    assert values(tags_none=["element"]) == ["Water"]
+    assert values(tags_all="element", tags_any=["metal", "liquid"]) == ["Iron"]
+    assert values(tags_all=["element", "unknown"]) == []
+
+
+@pytest.mark.parametrize("bitmaps", [True, False], ids=["bitmaps", "database"])
+def test_filter_cards(
+    session: Session, client: TestClient, chemistry_deck, monkeypatch, bitmaps: bool
+):
+    if not bitmaps:
+        monkeypatch.setattr(tag_bitmaps, "maxsize", 0)
+    fact_id = add_fact(client, "Oxygen", [])
+    cards = {
+        "gas": ["element", "gas"],
+        "metal": ["element", "metal"],
+        "untagged": [],
+    }
+    response = client.post(
+        f"/decks/{chemistry_deck.id}/cards:bulk",
+        json=[
+            {
+                "question_id": fact_id,
+                "answer_id": fact_id,
+                "question_context_facts": [],
+                "answer_context_facts": [],
+                "tags": [{"name": tag} for tag in tags],
+            }
+            for tags in cards.values()
+        ],
+    )
+    assert response.status_code == 200
+    card_ids = dict(zip(response.json()["created"], cards))
+
+    def names(**params) -> List[str]:
+        response = client.get(f"/decks/{chemistry_deck.id}/cards", params=params)
+        assert response.status_code == 200
+        return sorted(card_ids[card["id"]] for card in response.json())
+
+    assert names(tags_all=["element"]) == ["gas", "metal"]
+    assert names(tags_any=["gas", "unknown"]) == ["gas"]
+    assert names(tags_none=["element"]) == ["untagged"]
+    assert names(tags_all=["element"], tags_none=["gas"]) == ["metal"]
+
+    # Changes to the tags of the cards are seen at once
+    metal_id = next(id for id, name in card_ids.items() if name == "metal")
+    response = client.put(f"/decks/{chemistry_deck.id}/cards/{metal_id}/tags/gas")
+    assert response.status_code == 200
+    assert names(tags_any=["gas"]) == ["gas", "metal"]
+
+    # Pagination follows the order of the cards
+    response = client.get(
+        f"/decks/{chemistry_deck.id}/cards", params={"tags_all": "element", "limit": 1}
+    )
+    first = response.json()
+    response = client.get(response.headers["Link"].split(">")[0].lstrip("<"))
+    assert "Link" not in response.headers
+    assert first[0]["id"] < response.json()[0]["id"]
+    assert {first[0]["id"], response.json()[0]["id"]} == {
+        id for id, name in card_ids.items() if name != "untagged"
+    }
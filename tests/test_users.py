@@ -0,0 +1,113 @@
+import uuid
+
+import pytest
+from fastapi_users.authentication.strategy import StrategyDestroyNotSupportedError
+
+from flashcards_server.database import User
+from flashcards_server.users import CachedJWTStrategy, UserManager, jwt_strategy
+
+
+class FakeUserManager:
+    """
+    Returns the users by ID and counts the lookups.
+    """
+
+    def __init__(self, *users: User):
+        self.users = {user.id: user for user in users}
+        self.lookups = 0
+
+    def parse_id(self, value):
+        return uuid.UUID(value)
+
+    async def get(self, user_id):
+        self.lookups += 1
+        return self.users[user_id]
+
+
+def make_user(**values) -> User:
+    return User(
+        id=uuid.uuid4(),
+        email=f"{uuid.uuid4().hex}@example.com",
+        hashed_password="aaa",
+        is_active=True,
+        is_verified=True,
+        is_superuser=False,
+        **values,
+    )
+
+
+def make_strategy(ttl: float = 60) -> CachedJWTStrategy:
+    return CachedJWTStrategy(
+        secret="secret", lifetime_seconds=3600, ttl=ttl, maxsize=100
+    )
+
+
+@pytest.mark.asyncio
+async def test_verified_tokens_are_cached():
+    strategy = make_strategy()
+    user = make_user()
+    manager = FakeUserManager(user)
+    token = await strategy.write_token(user)
+
+    first = await strategy.read_token(token, manager)
+    second = await strategy.read_token(token, manager)
+    assert first.id == second.id == user.id
+    assert second is not first
+    assert manager.lookups == 1
+    assert strategy.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_invalid_tokens_are_not_cached():
+    strategy = make_strategy()
+    manager = FakeUserManager()
+    assert await strategy.read_token("not a token", manager) is None
+    assert len(strategy.cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_deactivated_user_loses_access():
+    strategy = make_strategy()
+    user = make_user()
+    manager = FakeUserManager(user)
+    token = await strategy.write_token(user)
+    assert (await strategy.read_token(token, manager)).is_active
+
+    user.is_active = False
+    strategy.forget_user(user.id)
+    assert not (await strategy.read_token(token, manager)).is_active
+    assert manager.lookups == 2
+
+
+@pytest.mark.asyncio
+async def test_user_manager_hooks_forget_the_user():
+    user = make_user()
+    token = await jwt_strategy.write_token(user)
+    await jwt_strategy.read_token(token, FakeUserManager(user))
+    assert token in jwt_strategy.cache
+
+    await UserManager(None).on_after_update(user, {"is_active": False})
+    assert token not in jwt_strategy.cache
+
+
+@pytest.mark.asyncio
+async def test_logout_forgets_the_token():
+    strategy = make_strategy()
+    user = make_user()
+    token = await strategy.write_token(user)
+    await strategy.read_token(token, FakeUserManager(user))
+
+    with pytest.raises(StrategyDestroyNotSupportedError):
+        await strategy.destroy_token(token, user)
+    assert token not in strategy.cache
+
+
+@pytest.mark.asyncio
+async def test_disabled_cache():
+    strategy = make_strategy(ttl=0)
+    user = make_user()
+    manager = FakeUserManager(user)
+    token = await strategy.write_token(user)
+    await strategy.read_token(token, manager)
+    await strategy.read_token(token, manager)
+    assert manager.lookups == 2